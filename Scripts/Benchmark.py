@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+__author__ = 'Christian Velten'
+
+HAS_ROOT_LIB = True
+
+import LIB.AllanDeviation, LIB.Compression, LIB.File, LIB.Generator, LIB.SegmentedFFT, LIB.SoftwareLockIn
+from LIB.LockInNoise import LockInNoise
+import LIB.OsciUSB as OsciUSB
+try: import LIB.ROOT_IO
+except ImportError: HAS_ROOT_LIB = False
+
+import argparse
+import gc
+import multiprocessing
+import numpy as np
+import os, resource, shutil, sys, tempfile, time, timeit
+"""
+### --------------------------------------------------------------------------------------------------------------------
+"""
+# Define and parse command-line arguments
+parser = argparse.ArgumentParser(description="Benchmark the acquisition and conversion stages with synthetic data (throughput and peak memory).")
+parser.add_argument("--stages", nargs='+', help="stages to run (default: all)")
+parser.add_argument("--beginPower", type=int, help="smallest data size as power of 10 (default 3)", default=3, choices=xrange(1, 9))
+parser.add_argument("--endPower", type=int, help="largest data size as power of 10 (default 7)", default=7, choices=xrange(1, 9))
+parser.add_argument("-r", "--repeat", type=int, help="runs per stage and size, the fastest one is reported (default 3)", default=3)
+parser.add_argument("--columns", type=int, help="number of columns of the tables (default 4)", default=4)
+parser.add_argument("-d", "--directory", help="directory for the synthetic files (default: temporary directory)")
+parser.add_argument("-o", "--ofile", help="append the results to this tab separated file")
+parser.add_argument("--list", help="list the stages and exit", action="store_true")
+"""
+### Stages -------------------------------------------------------------------------------------------------------------
+Every stage has a prepare(directory, n) function creating its input on disk (in the parent process, before measuring),
+a load(filename, n) function loading it in the child process and a run(input) function, which is timed.
+Sizes are in points (rows for tables).
+"""
+
+
+def read_string(filename, n):
+	with open(filename, 'rb') as handle:
+		return handle.read()
+
+
+def prepare_generator(directory, n):
+	return None
+
+
+def load_generator(filename, n):
+	return n
+
+
+def prepare_table(directory, n):
+	return LIB.Generator.write_table(os.path.join(directory, "table_{0}.dat".format(n)), n, args.columns, header={'BENCHMARK': n})
+
+
+def prepare_table_gzip(directory, n):
+	return LIB.Generator.write_table(os.path.join(directory, "table_{0}.dat.gz".format(n)), n, args.columns, header={'BENCHMARK': n}, compress=True)
+
+
+def prepare_trca(directory, n):
+	return LIB.Generator.write_trca(os.path.join(directory, "trca_{0}.txt".format(n)), n)
+
+
+def prepare_curve(directory, n):
+	return LIB.Generator.write_curve(os.path.join(directory, "curve_{0}.bin".format(n)), n)
+
+
+def load_filename(filename, n):
+	return filename
+
+
+def load_two_tone(filename, n):
+	return LIB.Generator.two_tone(n)
+
+
+def load_columns(filename, n):
+	data = {'TIME': np.arange(n, dtype=np.float64)}
+	for i in range(1, args.columns):
+		data['CH{0}'.format(i)] = LIB.Generator.two_tone(n)
+	return data
+
+
+def run_curve(buf):
+	data = OsciUSB.decode_curve(buf, '<i2')
+	return OsciUSB.scale_curve(data, np.empty(len(data), dtype=np.float32), 0., 1E-3, 0.)
+
+
+def run_compress(buf):
+	compressor = LIB.Compression.Compressor()
+	try:
+		return compressor.compress(buf)
+	finally:
+		compressor.close()
+
+
+def run_segmented_fft(data):
+	fft = LIB.SegmentedFFT.SegmentedFFT(1E+6, 10., 'HANNING')
+	fft.add(data)
+	return fft.average_abs()
+
+
+def run_lockin_scan(data):
+	frequencies = LIB.SoftwareLockIn.scan_frequencies(len(data), 1E+6)
+	return LIB.SoftwareLockIn.scan([data], len(data), 1E+6, frequencies)
+
+
+def run_lockin_stream(data):
+	lockin = LIB.SoftwareLockIn.StreamingLockIn(1E+6, 1E+3, 1E-3, 24, 1E+3)
+	return lockin.add(data)
+
+
+def run_root(data):
+	filename = LIB.ROOT_IO.ROOT_IO.write_data(os.path.join(directory, "benchmark.root"), 'Benchmark', data)
+	os.remove(filename)
+
+
+STAGES = [
+	# (name, prepare, load, run, available)
+	('Generator.two_tone', prepare_generator, load_generator, LIB.Generator.two_tone, True),
+	('LockInNoise.get_data_from_string', prepare_trca, read_string, LockInNoise.get_data_from_string, True),
+	('OsciUSB.decode_curve', prepare_curve, read_string, run_curve, True),
+	('File.read_file', prepare_table, load_filename, LIB.File.read_file, True),
+	('File.read_file_columns', prepare_table, load_filename, LIB.File.read_file_columns, True),
+	('Compression.read_gzip_file', prepare_table_gzip, load_filename, LIB.Compression.read_gzip_file, True),
+	('Compression.read_gzip_table', prepare_table_gzip, load_filename, LIB.Compression.read_gzip_table, True),
+	('Compression.compress', prepare_curve, read_string, run_compress, True),
+	('AllanDeviation.oadev', prepare_generator, load_two_tone, LIB.AllanDeviation.oadev, True),
+	('AllanDeviation.mdev', prepare_generator, load_two_tone, LIB.AllanDeviation.mdev, True),
+	('SegmentedFFT.add', prepare_generator, load_two_tone, run_segmented_fft, True),
+	('SoftwareLockIn.scan', prepare_generator, load_two_tone, run_lockin_scan, True),
+	('SoftwareLockIn.StreamingLockIn', prepare_generator, load_two_tone, run_lockin_stream, True),
+	('ROOT_IO.write_data', prepare_generator, load_columns, run_root, HAS_ROOT_LIB)
+]
+"""
+### Measurement --------------------------------------------------------------------------------------------------------
+"""
+
+
+def get_rss():
+	"""
+	:return: current resident set size in bytes
+	"""
+	try:
+		with open('/proc/self/statm') as handle:
+			return int(handle.read().split()[1]) * resource.getpagesize()
+	except IOError:
+		return get_peak_rss()
+
+
+def get_peak_rss(who=resource.RUSAGE_SELF):
+	"""
+	:param who: RUSAGE_SELF or RUSAGE_CHILDREN (largest terminated child process, e.g. of a multiprocessing.Pool)
+	:return: peak resident set size in bytes (ru_maxrss is in kB on Linux, in bytes on OS X)
+	"""
+	peak = resource.getrusage(who).ru_maxrss
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(stage, filename, n, repeat, queue):
+	"""
+	Runs in a child process, so that the peak memory is the one of this stage only.
+	Puts (best time [s], input size [bytes], peak memory above the loaded input [bytes],
+	peak memory of the largest process started by the stage above the loaded input [bytes], 0 if none) into the queue.
+	The process peaks are not added: a stage with a pool of P workers needs up to about PEAK + P * CHILD_PEAK.
+	"""
+	try:
+		name, prepare, load, run, available = stage
+		data = load(filename, n)
+		if not filename is None: nbytes = os.path.getsize(filename)
+		elif isinstance(data, dict): nbytes = sum([data[key].nbytes for key in data.keys()])
+		else: nbytes = 8 * n
+		gc.collect()
+		rss = get_rss()
+		times = []
+		for i in range(repeat):
+			t0 = timeit.default_timer()
+			result = run(data)
+			times.append(timeit.default_timer() - t0)
+			del result
+		# forked children start with the pages of this process, the loaded input is subtracted from them as well
+		children = get_peak_rss(resource.RUSAGE_CHILDREN)
+		queue.put((min(times), nbytes, max(get_peak_rss() - rss, 0), max(children - rss, 0) if children else 0))
+	except Exception as e:
+		queue.put(e)
+
+
+def benchmark(stage, n, repeat):
+	filename = stage[1](directory, n)
+	queue = multiprocessing.Queue()
+	process = multiprocessing.Process(target=measure, args=(stage, filename, n, repeat, queue))
+	process.start()
+	result = None
+	while process.is_alive() and result is None:
+		try:
+			result = queue.get(timeout=1.0)
+		except Exception:
+			pass
+	process.join()
+	if result is None and not queue.empty():
+		result = queue.get()
+	if not filename is None: os.remove(filename)
+	if result is None:
+		return "killed (exit code {0})".format(process.exitcode)
+	return result
+
+
+"""
+### MAIN ---------------------------------------------------------------------------------------------------------------
+"""
+args = parser.parse_args()
+if args.list:
+	for stage in STAGES:
+		print stage[0] + ('' if stage[4] else ' (not available)')
+	sys.exit(0)
+
+stages = [stage for stage in STAGES if args.stages is None or stage[0] in args.stages or stage[0].split('.')[-1] in args.stages]
+sizes = [10**p for p in range(args.beginPower, args.endPower + 1)]
+directory = LIB.File.set_directory(args.directory, ask=False) if args.directory else tempfile.mkdtemp(prefix='Benchmark_')
+
+handle = None
+if args.ofile:
+	new = not os.path.exists(args.ofile)
+	handle = open(args.ofile, 'a')
+	if new:
+		handle.write("#DATE\tSTAGE\tN\tTIME\tPOINTS_PER_S\tMB_PER_S\tPEAK_MB\tCHILD_PEAK_MB\n")
+
+# PEAK: the measuring process, CHILD PEAK: its largest child process (e.g. a worker of the compression pool)
+print "{0:<34} {1:>10} {2:>12} {3:>14} {4:>10} {5:>10} {6:>15}".format("STAGE", "N", "TIME [s]", "POINTS/s", "MB/s", "PEAK [MB]", "CHILD PEAK [MB]")
+try:
+	for stage in stages:
+		if not stage[4]:
+			print "{0:<34} not available".format(stage[0])
+			continue
+		for n in sizes:
+			result = benchmark(stage, n, args.repeat)
+			if not isinstance(result, tuple):
+				print "{0:<34} {1:>10} {2}".format(stage[0], n, result)
+				continue
+			t, nbytes, peak, child_peak = result
+			print "{0:<34} {1:>10} {2:>12.6f} {3:>14.4e} {4:>10.2f} {5:>10.2f} {6:>15.2f}".format(stage[0], n, t, n / t, nbytes / t / 1E+6, peak / 1E+6, child_peak / 1E+6)
+			if not handle is None:
+				handle.write("{0}\t{1}\t{2}\t{3:.6e}\t{4:.6e}\t{5:.6e}\t{6:.6e}\t{7:.6e}\n".format(time.strftime("%Y-%m-%d_%H:%M:%S"), stage[0], n, t, n / t, nbytes / t / 1E+6, peak / 1E+6, child_peak / 1E+6))
+				handle.flush()
+			sys.stdout.flush()
+except KeyboardInterrupt:
+	pass
+finally:
+	if not handle is None: handle.close()
+	if not args.directory: shutil.rmtree(directory)
@@ -98,15 +98,9 @@ else:
 	TFile, T = LIB.ROOT_IO.ROOT_IO.get_tree(args.file, 'Waveform')
 	print TFile.ls()
 
-	_t, _V = np.zeros(1), np.zeros(1)
-	T.SetBranchAddress("TIME", _t)
-	T.SetBranchAddress("VOLTS", _V)
-	n = T.GetEntries()
-	t, V = np.empty(n), np.empty(n)
-	for i in range(n):
-		T.GetEntry(i)
-		t[i] = _t
-		V[i] = _V
+	data = LIB.ROOT_IO.read_tree(T, ["TIME", "VOLTS"])
+	t, V = data["TIME"], data["VOLTS"]
+	n = len(t)
 
 	group = 1000
 	tReduced, VReduced = t.reshape(-1, group).mean(axis=1), V.reshape(-1, group).mean(axis=1)
@@ -0,0 +1,109 @@
+__author__ = 'Christian Velten'
+
+import numpy as np
+
+"""
+Allan deviations of equally spaced samples y (e.g. PID_MEAS or DIFF of PI_Stability), computed from the phase
+x = cumsum(y) / rate, so every averaging time is a few vectorised differences of x:
+	second difference  d_i = x_{i+2m} - 2 x_{i+m} + x_i   (tau = m / rate)
+	ADEV   non-overlapping d_i (every m-th), OADEV all d_i
+	MDEV   sums of m consecutive d_i (differences of cumsum(d))
+	TDEV   tau / sqrt(3) * MDEV
+Every function returns (tau, deviation, error) with error = deviation / sqrt(number of independent averages).
+"""
+PER_DECADE = 10
+KINDS = ['adev', 'oadev', 'mdev', 'tdev']
+
+
+def get_averaging_factors(n, per_decade=PER_DECADE, maximum=None):
+	"""
+	:param n: number of samples
+	:param maximum: largest averaging factor (default: n // 2)
+	:return: log-spaced unique averaging factors m (int)
+	"""
+	maximum = n // 2 if maximum is None else min(maximum, n // 2)
+	if maximum < 1:
+		return np.empty(0, dtype=int)
+	m = np.logspace(0, np.log10(maximum), max(int(np.log10(maximum) * per_decade), 0) + 1)
+	return np.unique(np.round(m).astype(int))
+
+
+def get_phase(y, rate=1.):
+	"""
+	:param y: samples, the mean is removed (it does not change the deviations, but keeps cumsum precise)
+	:return: x (n + 1 values)
+	"""
+	y = np.asarray(y, dtype=np.float64)
+	x = np.empty(len(y) + 1)
+	x[0] = 0.
+	np.cumsum(y - y.mean(), out=x[1:])
+	x /= rate
+	return x
+
+
+def second_difference(x, m, out=None):
+	"""
+	:param out: buffer of at least len(x) - 2m values (avoids temporaries of the size of x)
+	:return: x_{i+2m} - 2 x_{i+m} + x_i
+	"""
+	n = len(x) - 2 * m
+	d = np.empty(n) if out is None else out[:n]
+	np.multiply(x[m:-m], -2., out=d)
+	d += x[2*m:]
+	d += x[:-2*m]
+	return d
+
+
+def deviation(y, rate=1., m=None, kind='oadev', per_decade=PER_DECADE):
+	"""
+	:param y: samples
+	:param rate: samples per second
+	:param m: averaging factors (default: log-spaced, see get_averaging_factors)
+	:param kind: 'adev', 'oadev', 'mdev' or 'tdev'
+	:return: tau, deviation, error (np.arrays, averaging factors without enough data are left out)
+	"""
+	if kind not in KINDS:
+		raise ValueError("unknown deviation '{0}'".format(kind))
+	x = get_phase(y, rate)
+	n = len(x)
+	if m is None:
+		m = get_averaging_factors(n - 1, per_decade, (n - 1) // 3 if kind in ['mdev', 'tdev'] else None)
+	m = np.asarray(m, dtype=int)
+	m = m[(m >= 1) & (n - (3 if kind in ['mdev', 'tdev'] else 2) * m >= 1)]
+
+	tau = m / float(rate)
+	dev = np.empty(len(m))
+	buffer, cumulative = np.empty(n), np.empty(n)
+	for i in range(len(m)):
+		if kind == 'adev':
+			d = np.diff(x[::m[i]], 2)
+			dev[i] = np.sqrt(np.dot(d, d) / (2. * tau[i]**2 * len(d)))
+			continue
+		d = second_difference(x, m[i], buffer)
+		if kind == 'oadev':
+			dev[i] = np.sqrt(np.dot(d, d) / (2. * tau[i]**2 * len(d)))
+		else:
+			s = cumulative[:len(d) + 1]
+			s[0] = 0.
+			np.cumsum(d, out=s[1:])
+			d = np.subtract(s[m[i]:], s[:-m[i]], out=buffer[:len(s) - m[i]])
+			dev[i] = np.sqrt(np.dot(d, d) / (2. * m[i]**2 * tau[i]**2 * len(d)))
+	if kind == 'tdev':
+		dev *= tau / np.sqrt(3.)
+	return tau, dev, dev / np.sqrt((n - 1) // m)
+
+
+def adev(y, rate=1., m=None):
+	return deviation(y, rate, m, 'adev')
+
+
+def oadev(y, rate=1., m=None):
+	return deviation(y, rate, m, 'oadev')
+
+
+def mdev(y, rate=1., m=None):
+	return deviation(y, rate, m, 'mdev')
+
+
+def tdev(y, rate=1., m=None):
+	return deviation(y, rate, m, 'tdev')
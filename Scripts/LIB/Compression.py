@@ -1,14 +1,164 @@
 import gzip
+import multiprocessing
+import numpy as np
+import os
+import signal
+import struct
+import zlib
 from array import array
+from collections import deque
 
+"""
+Compression writes multi-member gzip files (like pigz): the data are split into blocks of BLOCKSIZE bytes,
+every block is compressed independently (in a process pool if given) into a complete gzip member and the members
+are concatenated in order. gzip, zcat and zlib's gzopen read them like a single-member file.
+"""
+BLOCKSIZE = 1 << 20
+LEVEL = 6
+READSIZE = 1 << 22
 
-def gzip_file(filename):
-	f = open(filename, 'rb')
-	g = gzip.open(filename+'.gz', 'wb')
-	g.writelines(f)
-	g.close()
-	f.close()
-	return
+
+def compress_block(block, level=LEVEL):
+	"""
+	:param block: str
+	:return: block as complete gzip member (header, deflate stream, crc32 and size)
+	"""
+	compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+	return compressor.compress(block) + compressor.flush()
+
+
+def _ignore_sigint():
+	# the parent handles KeyboardInterrupt and closes the pool
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _to_block(data):
+	return data.tobytes() if isinstance(data, memoryview) else str(data)
+
+
+class GzipWriter(object):
+	"""
+	File-like object compressing while streaming: write() collects the data into blocks, full blocks are compressed
+	(asynchronously if a pool is given) and written in order. At most 'pending' blocks are in flight.
+	"""
+	def __init__(self, filename, level=LEVEL, blocksize=BLOCKSIZE, pool=None, pending=None):
+		"""
+		:param pool: multiprocessing.Pool, None to compress in the calling thread
+		:param pending: blocks in flight before write() blocks (default: twice the pool size)
+		"""
+		self.filename = filename
+		self.level, self.blocksize, self.pool = level, blocksize, pool
+		self.pending = pending if not pending is None else (2 * pool._processes if not pool is None else 1)
+		self.handle = open(filename, 'wb')
+		self.buf, self.nbuf = [], 0
+		self.queue = deque()
+		self.members = 0
+
+	def write(self, data):
+		"""
+		:param data: str or buffer (e.g. numpy.ndarray.data)
+		"""
+		start, n = 0, len(data)
+		while start < n:
+			stop = min(n, start + self.blocksize - self.nbuf)
+			self.buf.append(_to_block(data[start:stop]))
+			self.nbuf += stop - start
+			start = stop
+			if self.nbuf >= self.blocksize:
+				self.submit()
+
+	def submit(self):
+		block = ''.join(self.buf)
+		self.buf, self.nbuf = [], 0
+		if self.pool is None:
+			self.queue.append(compress_block(block, self.level))
+		else:
+			self.queue.append(self.pool.apply_async(compress_block, (block, self.level)))
+		while len(self.queue) > self.pending:
+			self.write_member()
+
+	def write_member(self):
+		member = self.queue.popleft()
+		self.handle.write(member if isinstance(member, str) else member.get())
+		self.members += 1
+
+	def flush(self):
+		"""
+		Compress the collected data and write all members (the file is valid gzip afterwards).
+		"""
+		if self.nbuf > 0 or self.members + len(self.queue) == 0:
+			self.submit()
+		while len(self.queue) > 0:
+			self.write_member()
+		self.handle.flush()
+
+	def close(self):
+		if self.handle.closed:
+			return
+		try:
+			self.flush()
+		finally:
+			self.handle.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+class Compressor(object):
+	"""
+	Process pool shared by the GzipWriters of e.g. a recorder, open() them from any thread.
+	"""
+	def __init__(self, processes=None, level=LEVEL, blocksize=BLOCKSIZE):
+		"""
+		:param processes: size of the pool (default: number of CPUs), 0 or 1 to compress in the calling thread
+		"""
+		self.level, self.blocksize = level, blocksize
+		if processes is None:
+			processes = multiprocessing.cpu_count()
+		self.pool = multiprocessing.Pool(processes, _ignore_sigint) if processes > 1 else None
+
+	def open(self, filename):
+		return GzipWriter(filename, self.level, self.blocksize, self.pool)
+
+	def compress(self, data):
+		"""
+		:return: data as multi-member gzip str
+		"""
+		blocks = [_to_block(data[start:start + self.blocksize]) for start in range(0, len(data), self.blocksize)] or ['']
+		if self.pool is None:
+			return ''.join([compress_block(block, self.level) for block in blocks])
+		return ''.join(self.pool.map(compress_block, blocks))
+
+	def close(self):
+		if not self.pool is None:
+			self.pool.close()
+			self.pool.join()
+			self.pool = None
+
+
+def gzip_file(filename, processes=1, level=LEVEL, remove=False):
+	"""
+	Compress filename to filename.gz, reading it in binary blocks.
+	:param processes: compress in a pool of this size (worth it for files of several BLOCKSIZE)
+	:param remove: delete filename afterwards
+	:return: name of the compressed file
+	"""
+	if processes > 1 and os.path.getsize(filename) <= BLOCKSIZE:
+		processes = 1
+	compressor = Compressor(processes, level)
+	try:
+		with open(filename, 'rb') as f:
+			with compressor.open(filename + '.gz') as g:
+				for block in iter(lambda: f.read(BLOCKSIZE), ''):
+					g.write(block)
+	finally:
+		compressor.close()
+	if remove:
+		os.remove(filename)
+	return filename + '.gz'
 
 
 def read_gzip_file(filename, separator = '\t', readmode = "rb", comment_char = '#'):
@@ -45,6 +195,79 @@ def read_gzip_file(filename, separator = '\t', readmode = "rb", comment_char = '
 	return header, lines, columns
 
 
+def parse_header_line(line, comment_char='#'):
+	"""
+	:return: ['KEY', 'value'] for '#KEY: value', ['TEXT'] for '#TEXT'
+	"""
+	tmp = line.replace(comment_char, '').split(':')
+	if len(tmp) == 1:
+		return [tmp[0].strip()]
+	return [tmp[0].strip(), tmp[1].strip()]
+
+
+def _parse_rows(text, ncols, separator, comment_char):
+	"""
+	:return: np.array (rows, ncols) of the complete lines in text
+	"""
+	values = np.fromstring(text if separator.isspace() else text.replace('\n', separator), sep=separator)
+	if values.size == text.count('\n') * ncols:
+		return values.reshape(-1, ncols)
+	# comment or empty lines between the data, parse line by line
+	lines = [line for line in text.split('\n') if line.strip() and not line.lstrip().startswith(comment_char)]
+	if not lines:
+		# only comment or empty lines (loadtxt would return shape (0, 1))
+		return np.empty((0, ncols))
+	return np.loadtxt(lines, delimiter=None if separator.isspace() else separator, comments=comment_char, ndmin=2)
+
+
+def read_gzip_table(filename, separator='\t', comment_char='#', readsize=READSIZE):
+	"""
+	Reads a gzipped table of floating point data like read_gzip_file, but streams the decompressed data in blocks of
+	readsize bytes and parses them vectorised into preallocated columns, i.e. the memory is bounded by the columns.
+	:return: header [['KEY', 'value'], ...], [np.array (float64) for every column]
+	"""
+	# ISIZE of the (last) member is the uncompressed size modulo 2**32, used to estimate the number of rows
+	with open(filename, 'rb') as f:
+		f.seek(-4, os.SEEK_END)
+		isize = struct.unpack('<I', f.read(4))[0]
+
+	handle = gzip.open(filename, 'rb')
+	try:
+		header, line = [], handle.readline()
+		while line and (not line.strip() or line.lstrip()[0] == comment_char):
+			if line.strip():
+				header.append(parse_header_line(line, comment_char))
+			line = handle.readline()
+		if not line:
+			return header, []
+		ncols = len(line.strip().split(separator) if not separator.isspace() else line.split())
+
+		columns = [np.empty(max(isize // len(line), 1), dtype=np.float64) for i in range(ncols)]
+		nrows, carry = 0, line
+		while True:
+			block = handle.read(readsize)
+			if not block:
+				text, carry = carry if carry.endswith('\n') or not carry.strip() else carry + '\n', ''
+			else:
+				block = carry + block
+				end = block.rfind('\n') + 1
+				text, carry = block[:end], block[end:]
+			if text:
+				rows = _parse_rows(text, ncols, separator, comment_char)
+				for i, column in enumerate(columns):
+					if nrows + len(rows) > len(column):
+						column.resize(max(nrows + len(rows), len(column) * 3 // 2), refcheck=False)
+					column[nrows:nrows + len(rows)] = rows[:, i]
+				nrows += len(rows)
+			if not block:
+				break
+	finally:
+		handle.close()
+	for column in columns:
+		column.resize(nrows, refcheck=False)
+	return header, columns
+
+
 def read_gzip_file_with_units(filename, separator = '\t', unitseparator=',', readmode = "rb", comment_char = '#'):
 	"""
 	Reads a gzipped file. We assume that it consists of rows and columns of floating point data.
@@ -16,10 +16,13 @@ class SocketTalkError(SocketException):
 
 
 #class USBException(usb.core.USBError):
-class USBException(object):
+class USBException(Exception):
 	pass
 
 
 class USBIOException(USBException):
 	pass
 
+
+class InstrumentUnavailable(Exception):
+	pass
@@ -1,6 +1,10 @@
+from LIB.Compression import parse_header_line
+
+import gzip
 import numpy
 import os
 import re
+import string
 import sys
 
 
@@ -164,18 +168,64 @@ def select_files(directory_list, all_folders = False):
 	return selected_all, selected_filenames
 
 
-def get_filename_filecount(dir, pattern_begin):
+FILECOUNT_DIGITS = 4
+# (directory, prefix): last number handed out by this process
+_filecounts = {}
+
+
+def scan_filecount(directory, prefix):
+	"""
+	One pass over the directory.
+	:return: highest number directly following prefix in a filename, 0 if there is none
+	"""
+	pattern = re.compile(re.escape(prefix) + r'(\d+)')
+	highest = 0
+	for f in os.listdir(directory):
+		match = pattern.match(f)
+		if match:
+			highest = max(highest, int(match.group(1)))
+	return highest
+
+
+def next_filecount(directory, prefix, index=False, rescan=False):
+	"""
+	Allocate the next file number (highest existing + 1, gaps are not refilled).
+	The directory is only scanned for the first file of a prefix, afterwards the number is counted up in the process
+	(get_filename_filecount rescans if another process took it in the meantime).
+	:param index: keep the last number in '.<prefix>count' in the directory (locked), for several processes sharing a prefix
+	:param rescan: ignore the number counted in the process (and the index) and scan the directory
+	:return: int
+	"""
+	key = (os.path.abspath(directory), prefix)
+	if not index:
+		number = _filecounts[key] + 1 if key in _filecounts and not rescan else scan_filecount(directory, prefix) + 1
+	else:
+		import fcntl  # not available on Windows, only needed here
+		with os.fdopen(os.open(os.path.join(directory, '.' + prefix + 'count'), os.O_RDWR | os.O_CREAT, 0644), 'r+') as handle:
+			fcntl.flock(handle, fcntl.LOCK_EX)
+			last = handle.read().strip()
+			last = int(last) if last else 0
+			number = (max(last, scan_filecount(directory, prefix)) if rescan or not last else last) + 1
+			handle.seek(0)
+			handle.truncate()
+			handle.write(str(number))
+	_filecounts[key] = number
+	return number
+
+
+def get_filename_filecount(dir, pattern_begin, suffix='.dat', index=False):
 	"""
 	CREATE A NEW FILE WITH INCREASING FILE COUNT
+	A taken number is never returned: if a file with the counted number (or a higher one) exists, whatever its suffix,
+	the directory is scanned again.
+	:param suffix: appended to the number, e.g. '_' + time + '.dat'
+	:param index: see next_filecount, use it if several processes write files with the same prefix
+	:return: pattern_begin + NNNN + suffix
 	"""
-	i = 1
-	while True:
-		files = [True for f in os.listdir(dir) if re.match(r'' + pattern_begin+("%0*d" % (4, i)) + '.*', f)]
-		if len(files) == 0:
-			break
-		i += 1
-	filename = pattern_begin + ("%0*d" % (4, i)) + '.dat'
-	return filename
+	number = next_filecount(dir, pattern_begin, index)
+	if number <= scan_filecount(dir, pattern_begin):
+		number = next_filecount(dir, pattern_begin, index, rescan=True)
+	return pattern_begin + ("%0*d" % (FILECOUNT_DIGITS, number)) + suffix
 
 
 def read_file(filename, separator='\t', inter_separator=',', channel_separator=':', readmode="r", comment_char='#'):
@@ -230,3 +280,103 @@ def read_file(filename, separator='\t', inter_separator=',', channel_separator='
 			"""
 
 	return header, lines, columns
+
+
+class TableReader(object):
+	"""
+	Reads a file like read_file (also gzipped) in blocks of typed numpy columns, the memory stays bounded by the block size.
+	The fields of a column may consist of several values, separated by inter_separator (x,y) and/or channel_separator
+	(channels, e.g. x1,y1:x2,y2). The layout is taken from the first data line, every column then is a block of shape
+	(rows, values of the field), or (rows,) for single values.
+	"""
+	def __init__(self, filename, separator='\t', inter_separator=',', channel_separator=':', comment_char='#',
+				usecols=None, max_rows=None, dtype=numpy.float64, blocksize=1 << 22):
+		"""
+		:param usecols: indices of the columns to return (default: all)
+		:param max_rows: stop after this number of rows
+		:param blocksize: bytes read at once
+		"""
+		self.filename = filename
+		self.separator, self.comment_char = separator, comment_char
+		self.max_rows, self.dtype, self.blocksize = max_rows, numpy.dtype(dtype), blocksize
+		self.handle = gzip.open(filename, 'rb') if filename.endswith('.gz') else open(filename, 'rb')
+		# all sub-separators (and the line ends) become the column separator, so a block is parsed in one go
+		subseparators = inter_separator + channel_separator + ('' if separator.isspace() else '\n')
+		self.table = string.maketrans(subseparators, separator * len(subseparators))
+
+		self.header, line = [], self.handle.readline()
+		while line and (not line.strip() or line.lstrip()[0] == comment_char):
+			if line.strip():
+				self.header.append(parse_header_line(line, comment_char))
+			line = self.handle.readline()
+		self.first = line
+		fields = line.strip().split(separator) if line.strip() else []
+		widths = [len(field.translate(self.table).split(separator)) for field in fields]
+		self.ncols, self.nvalues = len(fields), sum(widths)
+		offsets = numpy.cumsum([0] + widths)
+		self.usecols = range(self.ncols) if usecols is None else list(usecols)
+		self.slices = [slice(offsets[i], offsets[i + 1]) if widths[i] > 1 else offsets[i] for i in self.usecols]
+		self.nrows = 0
+
+	def parse(self, text):
+		"""
+		:param text: complete lines
+		:return: np.array (rows, values per row)
+		"""
+		values = numpy.fromstring(text.translate(self.table), dtype=self.dtype, sep=self.separator)
+		if values.size != text.count('\n') * self.nvalues:
+			# comment or empty lines between the data
+			text = ''.join([line for line in text.splitlines(True) if line.strip() and not line.lstrip()[0] == self.comment_char])
+			values = numpy.fromstring(text.translate(self.table), dtype=self.dtype, sep=self.separator)
+			if values.size != text.count('\n') * self.nvalues:
+				raise ValueError("{0}: rows do not match the layout of the first row ({1} values) after row {2}".format(self.filename, self.nvalues, self.nrows))
+		return values.reshape(-1, self.nvalues)
+
+	def __iter__(self):
+		"""
+		:return: generator of [block for every selected column]
+		"""
+		carry = self.first
+		while self.ncols > 0 and (self.max_rows is None or self.nrows < self.max_rows):
+			block = self.handle.read(self.blocksize)
+			if not block:
+				text, carry = carry + '\n' if carry.strip() and not carry.endswith('\n') else carry, ''
+			else:
+				block = carry + block
+				end = block.rfind('\n') + 1
+				text, carry = block[:end], block[end:]
+			rows = self.parse(text) if text else numpy.empty((0, self.nvalues), dtype=self.dtype)
+			if not self.max_rows is None:
+				rows = rows[:self.max_rows - self.nrows]
+			self.nrows += len(rows)
+			if len(rows) > 0:
+				yield [numpy.ascontiguousarray(rows[:, key]) for key in self.slices]
+			if not block:
+				break
+
+	def read(self):
+		"""
+		:return: [np.array for every selected column] of all (remaining) rows
+		"""
+		blocks = list(self)
+		if len(blocks) == 0:
+			return [numpy.empty((0,) if isinstance(key, int) else (0, key.stop - key.start), dtype=self.dtype) for key in self.slices]
+		return [numpy.concatenate([block[i] for block in blocks]) for i in range(len(self.slices))]
+
+	def close(self):
+		self.handle.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+def read_file_columns(filename, **kwargs):
+	"""
+	Read a whole file with TableReader.
+	:return: header, [np.array for every selected column]
+	"""
+	with TableReader(filename, **kwargs) as reader:
+		return reader.header, reader.read()
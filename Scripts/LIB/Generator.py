@@ -0,0 +1,102 @@
+__author__ = 'Christian Velten'
+
+import gzip
+import numpy as np
+
+"""
+Synthetic test data, the signal is the one of FFT-LockIn/Generator/main.c:
+two sines (2 Vrms @ 234.32432 Hz and 0.707 mVrms @ 2132.00000001 Hz) sampled at 10 kHz and quantised with 1 mV/LSB.
+"""
+FS = 10000.
+F1, AMP1 = 234.32432, 2.82842712474619
+F2, AMP2, PHASE2 = 2132.00000001, 5.0E-4 * np.sqrt(2.), 1.345
+ULSB = 1E-3
+
+CHUNKSIZE = 100000
+
+
+def two_tone(n, start=0, fs=FS, f1=F1, amp1=AMP1, f2=F2, amp2=AMP2, phase2=PHASE2, ulsb=ULSB):
+	"""
+	:param n: number of samples
+	:param start: index of the first sample (to generate long signals in chunks)
+	:param ulsb: value of one LSB, None for no quantisation
+	:return: np.array (float64)
+	"""
+	t = np.arange(start, start + n, dtype=np.float64) / fs
+	u = amp1 * np.sin(2. * np.pi * f1 * t)
+	u += amp2 * np.sin(2. * np.pi * f2 * t + phase2)
+	if ulsb:
+		u /= ulsb
+		u = np.floor(u + 0.5, out=u)
+		u *= ulsb
+	return u
+
+
+def chunks(n, chunksize=CHUNKSIZE, **kwargs):
+	"""
+	Generate the signal in chunks of chunksize samples.
+	:return: generator of (start index, np.array)
+	"""
+	for start in range(0, n, chunksize):
+		yield start, two_tone(min(chunksize, n - start), start, **kwargs)
+
+
+def write_bin(filename, n, **kwargs):
+	"""
+	Binary output like main.c (doubles, no header).
+	"""
+	with open(filename, 'wb') as handle:
+		for start, u in chunks(n, **kwargs):
+			u.tofile(handle)
+	return filename
+
+
+def write_table(filename, n, columns=4, header=None, compress=False, **kwargs):
+	"""
+	Tab separated table with '#KEY: value' header lines as written by the data loggers.
+	The first column is the time, the other columns are the signal with increasing phase offsets.
+	:param n: number of rows
+	:param columns: number of columns including the time
+	:param header: {KEY: value}
+	:param compress: write gzipped
+	"""
+	handle = gzip.open(filename, 'wb') if compress else open(filename, 'w')
+	try:
+		if not header is None:
+			for key in sorted(header.keys()):
+				handle.write("#{0}: {1}\n".format(key, header[key]))
+		for start, u in chunks(n, **kwargs):
+			block = np.empty((len(u), columns))
+			block[:, 0] = np.arange(start, start + len(u)) / kwargs.get('fs', FS)
+			for i in range(1, columns):
+				block[:, i] = np.roll(u, i - 1)
+			np.savetxt(handle, block, fmt='%.6e', delimiter='\t')
+	finally:
+		handle.close()
+	return filename
+
+
+def write_trca(filename, n, **kwargs):
+	"""
+	ASCII buffer transfer of the SR830 (TRCA?): 'value,value,...,value,'
+	"""
+	with open(filename, 'w') as handle:
+		for start, u in chunks(n, **kwargs):
+			np.savetxt(handle, u, fmt='%.6e', newline=',')
+	return filename
+
+
+def write_curve(filename, n, dtype='<i2', ymult=None, **kwargs):
+	"""
+	Binary CURVE? response of the oscilloscope (definite length block), e.g. DATA:ENCDG SRI and DATA:WIDTH 2.
+	:param ymult: volts per digitizer level, default: one LSB
+	"""
+	dtype = np.dtype(dtype)
+	if ymult is None: ymult = kwargs.get('ulsb', ULSB) or ULSB
+	length = str(n * dtype.itemsize)
+	with open(filename, 'wb') as handle:
+		handle.write('#' + str(len(length)) + length)
+		for start, u in chunks(n, **kwargs):
+			np.rint(u / ymult).astype(dtype).tofile(handle)
+		handle.write('\n')
+	return filename
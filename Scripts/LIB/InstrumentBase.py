@@ -1,5 +1,46 @@
 __author__ = 'Christian Velten'
 
+import re
+import threading
+
 
 class InstrumentBase(object):
-	pass
\ No newline at end of file
+	"""
+	Common functionality of the USBTMC, socket and serial instrument objects.
+	Derived classes have to provide cmd(), read() and cmd_and_return().
+	"""
+	# separator used to concatenate several queries into one message
+	query_separator = ';'
+
+	def __init__(self):
+		# serializes access if the instrument is shared between threads (see LIB.InstrumentManager)
+		self.lock = threading.RLock()
+
+	@staticmethod
+	def split_response(response):
+		"""
+		Split the response to a concatenated query. Depending on the instrument the single responses
+		are separated by ';' or are terminated individually.
+		:param response: raw response string
+		:return: list of stripped responses without quotes
+		"""
+		return [r.strip().replace('"', '') for r in re.split(r'[;\r\n]+', response.strip()) if r.strip() != ""]
+
+	def ask_many(self, queries, prefix=""):
+		"""
+		Send several queries in one message and return the responses as a dict.
+		:param queries: list of queries, e.g. ["MEASU:MEAS1:MEAN?", "MEASU:MEAS1:STDDEV?"]
+		:param prefix: common prefix of all queries, e.g. "CH1:" (not part of the keys)
+		:return: {query: response, ...}
+		"""
+		if len(queries) == 0:
+			return {}
+		message = self.query_separator.join([prefix + q if q.endswith('?') else prefix + q + '?' for q in queries])
+		values = InstrumentBase.split_response(self.cmd_and_return(message, check_for_return=True))
+		while len(values) < len(queries):
+			r = self.read()
+			if not r: break
+			values += InstrumentBase.split_response(r)
+		if len(values) != len(queries):
+			raise ValueError("Got {0} responses for {1} queries: '{2}'".format(len(values), len(queries), message))
+		return dict(zip(queries, values))
@@ -0,0 +1,230 @@
+__author__ = 'Christian Velten'
+
+from LIB.Exceptions import InstrumentUnavailable, SocketException, USBException
+
+import threading
+import time
+
+# errors after which an instrument is considered disconnected (socket.error and serial.SerialException are IOErrors)
+CONNECTION_ERRORS = (USBException, SocketException, IOError, OSError)
+
+
+def usbtmc(key):
+	"""
+	:param key: key of LIB.USBTMCInstrument.USBInstruments
+	:return: factory connecting to the instrument
+	"""
+	def factory():
+		from LIB.USBTMCInstrument import USBTMCObject, USBInstruments
+		return USBTMCObject(USBInstruments[key]['vendorID'], USBInstruments[key]['productID'], USBInstruments[key]['serialNo'])
+	return factory
+
+
+def socket(key, **kwargs):
+	"""
+	:param key: key of LIB.SocketInstrument.SocketInstruments
+	:return: factory connecting to the instrument
+	"""
+	def factory():
+		from LIB.SocketInstrument import SocketObject, SocketInstruments
+		return SocketObject(SocketInstruments[key]['IP'], SocketInstruments[key]['PORT'], **kwargs)
+	return factory
+
+
+def serial(key, **kwargs):
+	"""
+	:param key: key of LIB.SerialInstrument.SerialInstruments
+	:return: factory connecting to the instrument
+	"""
+	def factory():
+		from LIB.SerialInstrument import SerialObject, SerialInstruments
+		return SerialObject(SerialInstruments[key], **kwargs)
+	return factory
+
+
+class SharedInstrument(object):
+	"""
+	Proxy handed out by the InstrumentManager. Every call is serialized with the instrument's lock,
+	connection errors mark the instrument for a reconnect in the background and are re-raised.
+	While the instrument is disconnected, calls raise InstrumentUnavailable immediately.
+	"""
+	def __init__(self, manager, name):
+		self._manager = manager
+		self._name = name
+
+	def __getattr__(self, attr):
+		instrument = self._manager.instrument(self._name)
+		value = getattr(instrument, attr)
+		if not callable(value):
+			return value
+
+		def call(*args, **kwargs):
+			with instrument.lock:
+				try:
+					result = value(*args, **kwargs)
+				except CONNECTION_ERRORS:
+					self._manager.reconnect(self._name, instrument)
+					raise
+				# in use, no keepalive query between the commands of a transfer (e.g. cmd, read_raw)
+				self._manager.last_check[self._name] = time.time()
+				return result
+		return call
+
+
+class InstrumentManager(object):
+	"""
+	Opens every registered instrument once and shares it between the threads of a process
+	(separate scripts still need their own connection).
+	A background thread checks idle instruments every 'keepalive' seconds and reconnects
+	lost ones with an exponential backoff between 'backoff_min' and 'backoff_max' seconds.
+	"""
+	def __init__(self, keepalive=30., backoff_min=1., backoff_max=60.):
+		self.keepalive = keepalive
+		self.backoff_min, self.backoff_max = backoff_min, backoff_max
+		self.factories, self.instruments = {}, {}
+		self.available, self.last_check, self.next_try, self.backoff = {}, {}, {}, {}
+		self.lock = threading.Lock()
+		self.wakeup = threading.Event()
+		self.thread = None
+		self.running = False
+
+	def register(self, name, factory):
+		"""
+		:param name: name used to refer to the instrument
+		:param factory: callable returning a connected instrument object, e.g. InstrumentManager.usbtmc('LABOR')
+		"""
+		with self.lock:
+			self.factories[name] = factory
+			self.instruments[name] = None
+			self.available[name] = threading.Event()
+			self.last_check[name] = 0.
+			self.next_try[name] = 0.
+			self.backoff[name] = self.backoff_min
+
+	def open(self, name, block=True):
+		"""
+		Connect to the instrument if not done yet and return the shared proxy.
+		:param block: connect in the calling thread, otherwise leave it to the background thread
+		:return: SharedInstrument
+		"""
+		if not self.available[name].is_set():
+			if block:
+				self._connect(name)
+			else:
+				self.wakeup.set()
+		# keepalive and reconnects
+		self.start()
+		return SharedInstrument(self, name)
+
+	def get(self, name):
+		return SharedInstrument(self, name)
+
+	def instrument(self, name):
+		"""
+		:return: the connected instrument object
+		:raise InstrumentUnavailable: if the instrument is (re)connecting
+		"""
+		instrument = self.instruments[name]
+		if instrument is None or not self.available[name].is_set():
+			raise InstrumentUnavailable("Instrument '{0}' is not connected".format(name))
+		return instrument
+
+	def is_available(self, name):
+		return self.available[name].is_set()
+
+	def wait(self, name, timeout=None):
+		"""
+		Wait until the instrument is connected.
+		:return: True if connected, False on timeout
+		"""
+		self.available[name].wait(timeout)
+		return self.available[name].is_set()
+
+	def reconnect(self, name, instrument=None):
+		"""
+		Mark the instrument as disconnected and let the background thread reconnect it.
+		:param instrument: the failed instrument object, ignored if it has already been replaced
+		"""
+		with self.lock:
+			if not instrument is None and not instrument is self.instruments[name]:
+				return
+			self.available[name].clear()
+			self.next_try[name] = time.time()
+		self.start()
+		self.wakeup.set()
+
+	def _connect(self, name):
+		old = self.instruments[name]
+		if not old is None:
+			try:
+				old.close()
+			except Exception:
+				pass
+		instrument = self.factories[name]()
+		with self.lock:
+			self.instruments[name] = instrument
+			self.last_check[name] = time.time()
+			self.backoff[name] = self.backoff_min
+			self.available[name].set()
+		return instrument
+
+	def _check(self, name):
+		instrument = self.instruments[name]
+		# do not interfere with a running transfer, the instrument is obviously alive
+		if not instrument.lock.acquire(False):
+			return
+		try:
+			alive = instrument.is_open()
+		finally:
+			instrument.lock.release()
+		self.last_check[name] = time.time()
+		if not alive:
+			self.reconnect(name, instrument)
+
+	def _run(self):
+		while self.running:
+			# cleared before the checks: a set() from now on (reconnect, open, stop) ends the next wait
+			self.wakeup.clear()
+			now = time.time()
+			timeout = self.keepalive
+			for name in self.factories.keys():
+				if not self.available[name].is_set():
+					if now < self.next_try[name]:
+						timeout = min(timeout, self.next_try[name] - now)
+						continue
+					try:
+						self._connect(name)
+					except Exception as e:
+						print "reconnecting '{0}' failed ({1}), next try in {2:.0f}s".format(name, e, self.backoff[name])
+						self.next_try[name] = time.time() + self.backoff[name]
+						self.backoff[name] = min(2. * self.backoff[name], self.backoff_max)
+						timeout = min(timeout, self.backoff[name])
+				elif self.keepalive > 0 and now - self.last_check[name] >= self.keepalive:
+					self._check(name)
+			self.wakeup.wait(max(timeout, 0.01))
+
+	def start(self):
+		if not self.thread is None and self.thread.is_alive():
+			return
+		self.running = True
+		self.thread = threading.Thread(target=self._run, name="InstrumentManager")
+		self.thread.daemon = True
+		self.thread.start()
+
+	def stop(self):
+		self.running = False
+		self.wakeup.set()
+		if not self.thread is None:
+			self.thread.join()
+
+	def close(self):
+		self.stop()
+		for name in self.instruments.keys():
+			if self.instruments[name] is None:
+				continue
+			try:
+				self.instruments[name].close()
+			except Exception:
+				pass
+			self.instruments[name] = None
+			self.available[name].clear()
@@ -12,14 +12,27 @@ class LockInNoise(object):
 
 	input_coupling_ac = True
 
+	# buffer transfer: 'ASCII' (TRCA?), 'TRCB' (IEEE float) or 'TRCL' (non-normalized mantissa/exponent)
+	transfer = 'ASCII'
+	transfer_modes = ['ASCII', 'TRCB', 'TRCL']
+
 	index2timeconstant = [10E-6, 30E-6, 100E-6, 300E-6, 1E-3, 3E-3, 10E-3, 30E-3, 100E-3, 300E-3,
 	                      1., 3., 10., 30., 100., 300., 1E+3, 3E+3, 10E+3, 30E+3]
 	index2gain = [2E-9, 5E-9, 10E-9, 20E-9, 50E-9, 100E-9, 200E-9, 500E-9, 1E-6, 2E-6, 5E-6, 10E-6, 20E-6,
 				  50E-6, 100E-6, 200E-6, 500E-6, 1E-3, 2E-3, 5E-3, 10E-3, 20E-3, 50E-3, 100E-3, 200E-3, 500E-3, 1.0]
+	index2slope = [6, 12, 18, 24]  # dB/oct
+	# time constants the output filter needs to settle to 99% of a step (SR830 manual, per OFSL index)
+	index2settle = [5., 7., 9., 10.]
+	# data storage sample rates for SRAT 0..13 (62.5mHz..512Hz), SRAT 14 is 'trigger'
+	index2samplerate = [62.5E-3 * 2**i for i in range(14)]
+
+	# minimum and fallback (trigger mode) interval for polling the buffer
+	poll_min, poll_trigger = 0.05, 2.0
 	
-	def __init__(self, instrument, external=False):
+	def __init__(self, instrument, external=False, transfer='ASCII'):
 		self.instrument = instrument
 		self.external = external
+		self.set_transfer(transfer)
 		
 		if not instrument or not instrument.is_open():
 			raise ValueError("instrument not open!")
@@ -73,6 +86,19 @@ class LockInNoise(object):
 		d = np.array(data.split(','), dtype='float')
 		return d
 
+	@staticmethod
+	def get_data_from_binary(data, mode='TRCB'):
+		"""
+		Decode a binary buffer transfer. TRCB data is decoded without copying.
+		:param data: bytes/bytearray as returned by TRCB? or TRCL?
+		:param mode: 'TRCB' for little-endian IEEE floats, 'TRCL' for 2 byte mantissa + 2 byte exponent
+		:return: np.array
+		"""
+		if mode == 'TRCB':
+			return np.frombuffer(data, dtype='<f4')
+		d = np.frombuffer(data, dtype=[('m', '<i2'), ('e', '<i2')])
+		return d['m'] * np.exp2(d['e'] - 124.)
+
 	@staticmethod
 	def calculate_noise(dx, dy=None):
 		if dy is None:
@@ -89,6 +115,43 @@ class LockInNoise(object):
 		except ValueError:
 			return len(list) - 1
 
+	def set_transfer(self, mode):
+		if not mode in self.transfer_modes:
+			raise ValueError("Invalid transfer mode ('{0}') provided!".format(mode))
+		self.transfer = mode
+
+	def read_buffer_ascii(self, start, npoints):
+		xdata = self.instrument.cmd_and_return("TRCA? {_i},{_j},{_k}".format(_i=1, _j=start, _k=npoints))
+		ydata = self.instrument.cmd_and_return("TRCA? {_i},{_j},{_k}".format(_i=2, _j=start, _k=npoints))
+		# Extract np.arrays from string "value,value,value..."
+		return LockInNoise.get_data_from_string(xdata), LockInNoise.get_data_from_string(ydata)
+
+	def read_buffer_binary(self, start, npoints):
+		# both channels are requested in one message and arrive back to back (4 bytes per point)
+		self.instrument.cmd("{_m}? {_i},{_j},{_k};{_m}? {_l},{_j},{_k}".format(_m=self.transfer, _i=1, _l=2, _j=start, _k=npoints))
+		data = self.instrument.read_raw(8 * npoints)
+		if len(data) != 8 * npoints:
+			raise ValueError("Binary transfer incomplete ({0} of {1} bytes)".format(len(data), 8 * npoints))
+		d = LockInNoise.get_data_from_binary(data, self.transfer)
+		return d[:npoints], d[npoints:]
+
+	def read_buffer(self, start, npoints):
+		"""
+		Read npoints of both channels from the data buffer, starting at start.
+		Falls back to ASCII if a binary transfer is not supported or fails (incomplete, timed out, ...),
+		the rest of the binary reply is discarded before.
+		:return: (np.array X, np.array Y)
+		"""
+		if self.transfer != 'ASCII' and hasattr(self.instrument, 'read_raw'):
+			try:
+				return self.read_buffer_binary(start, npoints)
+			except (ValueError, IOError) as e:  # SocketTalkError and socket.timeout are IOErrors
+				print "{0}, falling back to ASCII transfer".format(e)
+				self.transfer = 'ASCII'
+				if hasattr(self.instrument, 'drain'):
+					self.instrument.drain()
+		return self.read_buffer_ascii(start, npoints)
+
 	def set_input(self, inp):
 		try: str = int(inp)
 		except ValueError:
@@ -117,6 +180,26 @@ class LockInNoise(object):
 		sens = int(self.instrument.cmd_and_return("SENS?"))
 		return LockInNoise.index2gain[sens]
 
+	@staticmethod
+	def settle_time(tc, slope):
+		"""
+		Time the output filter needs to settle after a step of the input.
+		:param tc: time constant in s
+		:param slope: filter slope in dB/oct (6, 12, 18 or 24)
+		:return: settle time in s
+		"""
+		return LockInNoise.index2settle[LockInNoise.get_index(LockInNoise.index2slope, slope)] * tc
+
+	def get_filter_state(self):
+		"""
+		Query time constant, slope and sample rate in one round trip.
+		:return: (time constant [s], slope [dB/oct], sample rate [Hz] or None if triggered)
+		"""
+		r = self.instrument.ask_many(["OFLT?", "OFSL?", "SRAT?"])
+		srat = int(r["SRAT?"])
+		return (LockInNoise.index2timeconstant[int(r["OFLT?"])], LockInNoise.index2slope[int(r["OFSL?"])],
+			LockInNoise.index2samplerate[srat] if srat < len(LockInNoise.index2samplerate) else None)
+
 	def set_frequency(self, f, sleep=0.0):
 		self.instrument.cmd("FREQ {_f}".format(_f=f))
 		time.sleep(sleep)
@@ -148,42 +231,42 @@ class LockInNoise(object):
 		if npoints is None:  # number of points from array
 			npoints = self.npoints
 
+		tc, slope, rate = self.get_filter_state()
 		if sleep is None:  # sleep is the minimum time to get nice averaging results
-			sleep = 10.0 * self.index2timeconstant[int(self.instrument.cmd_and_return("OFLT?"))]
+			sleep = LockInNoise.settle_time(tc, slope)
 
 		# if NOT external reference source
 		if not self.external:
 			# Set LockIn-ReferenceFreq:
 			self.instrument.cmd("FREQ {_f}".format(_f=frequency))
-			# Sleep for one period
-			time.sleep(1./frequency)
+			# Wait one period for the reference to lock
+			sleep += 1./frequency
 
 		# Reset data buffer
 		self.instrument.cmd("PAUS")
 		self.instrument.cmd("REST")
 		# Start DAQ
 		self.instrument.cmd("STRT")
-		# Sleep for useful data/calculation
+		# Sleep until the filter has settled
 		time.sleep(sleep)
 		# Get offset for data-points (bad calculated noise points)
 		n0 = int(self.instrument.cmd_and_return("SPTS?"))
-		# Sleep for 1s until there are enough points in buffer, there have been queries with other than SPTS literals!
+		# Poll until there are enough points in buffer, sleep for the time the missing points take at the sample rate
+		missing = npoints
 		while True:
+			time.sleep(max(missing / rate, self.poll_min) if rate else self.poll_trigger)
 			try:
-				if int(self.instrument.cmd_and_return("SPTS?").strip()) >= n0 + npoints: break
-				time.sleep(2.0)
+				missing = n0 + npoints - int(self.instrument.cmd_and_return("SPTS?").strip())
+				if missing <= 0: break
 			except ValueError: pass
 		# Pause DAQ
 		self.instrument.cmd("PAUS")
 		# Read Data:
 		blength = int(self.instrument.cmd_and_return("SPTS?").strip())
-		xdata = self.instrument.cmd_and_return("TRCA? {_i},{_j},{_k}".format(_i=1, _j=blength-npoints, _k=npoints))
-		ydata = self.instrument.cmd_and_return("TRCA? {_i},{_j},{_k}".format(_i=2, _j=blength-npoints, _k=npoints))
+		dx, dy = self.read_buffer(blength-npoints, npoints)
 
-		# Extract np.arrays from string "value,value,value..."
-		dx, dy = LockInNoise.get_data_from_string(xdata), LockInNoise.get_data_from_string(ydata)
-		dx = {'FREQ': frequency, 'MEAN': np.mean(dx), 'STD': np.std(dx), 'DATA': dx}
-		dy = {'FREQ': frequency, 'MEAN': np.mean(dy), 'STD': np.std(dy), 'DATA': dy}
+		dx = {'FREQ': frequency, 'MEAN': np.mean(dx, dtype=np.float64), 'STD': np.std(dx, dtype=np.float64), 'DATA': dx}
+		dy = {'FREQ': frequency, 'MEAN': np.mean(dy, dtype=np.float64), 'STD': np.std(dy, dtype=np.float64), 'DATA': dy}
 
 		self.dataX.append(dx)
 		self.dataY.append(dy)
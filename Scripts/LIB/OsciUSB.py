@@ -10,6 +10,8 @@ s.clear                            s.is_usb488                        s.pack_ven
 """
 from LIB.STD import is_power
 
+import numpy
+
 #
 # ----------------------------------------------------------------------------------------------------------------------------
 #
@@ -39,11 +41,8 @@ def dict2string(d, parseFull=True, filterset=None):
 
 
 def get_values(s, objstr, queries):
-	values = []
 	s.cmd("*WAI")
-	for query in queries:
-		values.append( (query, s.cmd_and_return(objstr+query+'?').strip().replace('"', '')) )
-	return dict(values)
+	return s.ask_many(queries, prefix=objstr)
 
 
 def set_values(s, objstr, queries, values):
@@ -102,3 +101,31 @@ def setup_acquire(s, mode='SAMPLE', num=2):
 #
 # ----------------------------------------------------------------------------------------------------------------------------
 #
+
+
+def decode_curve(buf, dtype='i2'):
+	"""
+	Get the data of a binary CURVE? response without copying it.
+	The response is a definite length block: '#', number of digits N, N digits with the length in bytes, data, '\n'.
+	:param buf: raw response
+	:param dtype: data type according to DATA:ENCDG and DATA:WIDTH, e.g. 'i2' for SRI and width 2
+	:return: numpy.array (read-only view of buf)
+	"""
+	n = int(buf[1:2])
+	nbytes = int(buf[2:2+n])
+	dtype = numpy.dtype(dtype)
+	return numpy.frombuffer(buf, dtype=dtype, count=nbytes // dtype.itemsize, offset=2+n)
+
+
+def scale_curve(data, out, yoffs, ymult, yzero):
+	"""
+	Convert digitizer levels to the vertical unit in place: out = (data - yoffs) * ymult + yzero
+	:param data: numpy.array as returned by decode_curve
+	:param out: preallocated float numpy.array of the same length
+	:return: out
+	"""
+	numpy.copyto(out, data, casting='unsafe')
+	out -= yoffs
+	out *= ymult
+	out += yzero
+	return out
@@ -0,0 +1,140 @@
+__author__ = 'Christian Velten'
+
+import numpy as np
+import Queue
+import sys
+import threading
+import time
+
+
+class AcquisitionThread(threading.Thread):
+	"""
+	Runs one acquisition function and keeps its result, any exception and the time stamps.
+	"""
+	def __init__(self, name, target, args=(), kwargs=None):
+		threading.Thread.__init__(self, name=name)
+		self.daemon = True
+		self.target = target
+		self.args = args
+		self.kwargs = kwargs if not kwargs is None else {}
+		self.result = None
+		self.exc_info = None
+		self.time_start, self.time_stop = None, None
+
+	def run(self):
+		self.time_start = time.time()
+		try:
+			self.result = self.target(*self.args, **self.kwargs)
+		except Exception:
+			self.exc_info = sys.exc_info()
+		self.time_stop = time.time()
+
+
+def acquire_parallel(tasks, poll=0.1):
+	"""
+	Run acquisitions on independent instruments at the same time, e.g. lock-in and oscilloscope.
+	The instruments must not share a transport, every task gets its own thread.
+	If a task raised an exception, it is re-raised here after all tasks have finished.
+	:param tasks: {'NAME': (callable, args, kwargs), ...}
+	:param poll: interval for joining the threads (keeps KeyboardInterrupt working)
+	:return: {'NAME': {'DATA': result, 'TIME_START': t0, 'TIME_STOP': t1}, ..., 'TIME_START': first t0, 'TIME_STOP': last t1}
+	"""
+	threads = []
+	for name in tasks.keys():
+		task = tasks[name]
+		threads.append(AcquisitionThread(name, task[0], task[1] if len(task) > 1 else (), task[2] if len(task) > 2 else None))
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		while thread.is_alive():
+			thread.join(poll)
+
+	for thread in threads:
+		if not thread.exc_info is None:
+			raise thread.exc_info[0], thread.exc_info[1], thread.exc_info[2]
+
+	records = {thread.name: {'DATA': thread.result, 'TIME_START': thread.time_start, 'TIME_STOP': thread.time_stop} for thread in threads}
+	records['TIME_START'] = min([thread.time_start for thread in threads])
+	records['TIME_STOP'] = max([thread.time_stop for thread in threads])
+	return records
+
+
+class BufferRing(object):
+	"""
+	Fixed set of preallocated buffers, taken by the workers of a Pipeline and returned after use.
+	"""
+	def __init__(self, size, shape, dtype):
+		self.free = Queue.Queue()
+		for i in range(size):
+			self.free.put(np.empty(shape, dtype=dtype))
+
+	def get(self):
+		return self.free.get()
+
+	def put(self, buf):
+		self.free.put(buf)
+
+
+class Pipeline(object):
+	"""
+	Producer/consumer pipeline: the producer (e.g. the acquisition loop) submits items and a pool of worker threads
+	calls target(item, buffer) with a buffer of the ring (None without ring).
+	At most 'depth' items wait in the queue, submit() blocks while the workers are behind.
+	The first exception of a worker is re-raised by the next submit() or by close().
+	"""
+	def __init__(self, target, workers=2, depth=2, ring=None, poll=0.1):
+		self.target = target
+		self.ring = ring
+		self.poll = poll
+		self.queue = Queue.Queue(maxsize=max(depth, 1))
+		self.exc_info = None
+		self.threads = [threading.Thread(target=self.run, name="Pipeline-{0}".format(i)) for i in range(workers)]
+		for thread in self.threads:
+			thread.daemon = True
+			thread.start()
+
+	def run(self):
+		while True:
+			item = self.queue.get()
+			if item is None:
+				return
+			buf = self.ring.get() if not self.ring is None else None
+			try:
+				self.target(item, buf)
+			except Exception:
+				if self.exc_info is None:
+					self.exc_info = sys.exc_info()
+			finally:
+				if not self.ring is None:
+					self.ring.put(buf)
+
+	def check(self):
+		if not self.exc_info is None:
+			exc_info, self.exc_info = self.exc_info, None
+			raise exc_info[0], exc_info[1], exc_info[2]
+
+	def _put(self, item, check=True):
+		# put with timeout keeps KeyboardInterrupt and signal handlers working
+		while True:
+			if check:
+				self.check()
+			try:
+				self.queue.put(item, timeout=self.poll)
+				return
+			except Queue.Full:
+				pass
+
+	def submit(self, item):
+		self._put(item)
+
+	def close(self):
+		"""
+		Process all submitted items and stop the workers, then re-raise the first exception of a worker (if any).
+		"""
+		# the workers keep running after an exception, so all of them get their stop item before anything is raised
+		for thread in self.threads:
+			self._put(None, check=False)
+		for thread in self.threads:
+			while thread.is_alive():
+				thread.join(self.poll)
+		self.check()
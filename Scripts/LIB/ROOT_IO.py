@@ -3,12 +3,173 @@ __author__ = 'Christian Velten'
 import numpy
 import ROOT
 import sys
+import time
 from LIB.STD import dictinvert
+import LIB.Storage
+
+HAS_ROOT_NUMPY = True
+try: import root_numpy
+except ImportError: HAS_ROOT_NUMPY = False
 
 
 COLORSET_DARK = [ROOT.kBlack, ROOT.kGray+2, ROOT.kRed+2, ROOT.kBlue+2, ROOT.kOrange+5, ROOT.kGreen+3, ROOT.kCyan+2, ROOT.kMagenta+2]
 COLORSET_LIGHT = [ROOT.kRed, ROOT.kBlue, ROOT.kOrange, ROOT.kGreen, ROOT.kCyan, ROOT.kMagenta]
 
+# numpy dtype -> type code of the leaf list
+LEAF_TYPES = {'f8': 'D', 'f4': 'F', 'i8': 'L', 'i4': 'I', 'i2': 'S', 'i1': 'B', 'u8': 'l', 'u4': 'i', 'u2': 's', 'u1': 'b', 'b1': 'O'}
+
+# fills a tree from contiguous columns, the branches point to one-element buffers (targets)
+FILL_COLUMNS = """
+#include <cstring>
+#include <vector>
+#include "TTree.h"
+void ROOT_IO_FillColumns(TTree* tree, Long64_t n, const std::vector<Long64_t>& sources, const std::vector<Long64_t>& targets, const std::vector<Long64_t>& sizes) {
+	for (Long64_t i = 0; i < n; ++i) {
+		for (size_t k = 0; k < sources.size(); ++k)
+			std::memcpy(reinterpret_cast<char*>(targets[k]), reinterpret_cast<const char*>(sources[k]) + i * sizes[k], sizes[k]);
+		tree->Fill();
+	}
+}
+"""
+HAS_FILL_COLUMNS = None
+
+
+def leaf_type(dtype):
+	"""
+	:return: key of LEAF_TYPES, e.g. 'f8'
+	"""
+	return dtype.kind + str(dtype.itemsize)
+
+
+def has_fill_columns():
+	"""
+	Compile ROOT_IO_FillColumns once (needs the cling interpreter of ROOT 6).
+	"""
+	global HAS_FILL_COLUMNS
+	if HAS_FILL_COLUMNS is None:
+		try:
+			HAS_FILL_COLUMNS = bool(ROOT.gInterpreter.Declare(FILL_COLUMNS))
+		except AttributeError:
+			HAS_FILL_COLUMNS = False
+	return HAS_FILL_COLUMNS
+
+
+def split_data(data):
+	"""
+	Separate the columns from the metadata of write_data.
+	Strings are metadata, lists are converted to float64 (the '/D' branches of before), numpy arrays keep their dtype.
+	:return: {'NAME': contiguous numpy.array}, {'NAME': str}, number of entries (the shortest column)
+	"""
+	columns, metadata = {}, {}
+	for key, value in data.items():
+		if isinstance(value, basestring):
+			metadata[key] = value
+			continue
+		column = numpy.asarray(value) if isinstance(value, numpy.ndarray) else numpy.asarray(value, dtype=numpy.float64)
+		if not leaf_type(column.dtype) in LEAF_TYPES:
+			column = column.astype(numpy.float64)
+		elif not column.dtype.isnative:
+			column = column.astype(column.dtype.newbyteorder('='))
+		columns[key] = column
+	n = min([len(column) for column in columns.values()]) if columns else 0
+	if any([len(column) != n for column in columns.values()]):
+		print "columns differ in length, writing the first {0} entries".format(n)
+	for key in columns.keys():
+		columns[key] = numpy.ascontiguousarray(columns[key][:n])
+	return columns, metadata, n
+
+
+def create_branches(tree, dtypes):
+	"""
+	:param dtypes: {'NAME': numpy.dtype}
+	:return: {'NAME': one-element numpy.array the branch points to}
+	"""
+	var = {key: numpy.zeros(1, dtype=dtypes[key]) for key in dtypes.keys()}
+	for key in sorted(dtypes.keys()):
+		tree.Branch(key, var[key], key + '/' + LEAF_TYPES[leaf_type(var[key].dtype)])
+	return var
+
+
+def fill_columns(tree, var, columns, n):
+	"""
+	Fill the first n entries of the contiguous columns into tree, in C++ if possible.
+	:param var: branch buffers of create_branches
+	:param columns: {'NAME': numpy.array} with the dtypes of var
+	"""
+	keys = sorted(var.keys())
+	if has_fill_columns():
+		sources, targets, sizes = [ROOT.std.vector('Long64_t')() for i in range(3)]
+		for key in keys:
+			sources.push_back(columns[key].ctypes.data)
+			targets.push_back(var[key].ctypes.data)
+			sizes.push_back(var[key].itemsize)
+		ROOT.ROOT_IO_FillColumns(tree, n, sources, targets, sizes)
+	else:
+		for i in range(n):
+			for key in keys:
+				var[key][0] = columns[key][i]
+			tree.Fill()
+
+
+class TreeWriter(object):
+	"""
+	Writes rows into an open tree: they are collected in preallocated buffers of basket_rows entries, which are filled into
+	the tree when full or after flush_seconds. Every flush is an AutoSave checkpoint, so the file is readable up to
+	the last flush if the process dies. The memory is bounded by the buffers.
+	"""
+	def __init__(self, filename, name, description='', mode='RECREATE', basket_rows=1000, flush_seconds=60., metadata=None):
+		"""
+		:param metadata: {'NAME': str}, stored as TNamed in the UserInfo of the tree
+		"""
+		if not filename[-5:] == '.root': filename += '.root'
+		self.filename = filename
+		self.basket_rows, self.flush_seconds = basket_rows, flush_seconds
+		self.file = ROOT.TFile(filename, mode)
+		self.tree = ROOT.TTree(name, description)
+		for key in sorted((metadata or {}).keys()):
+			self.tree.GetUserInfo().Add(ROOT.TNamed(key, str(metadata[key])))
+		self.var, self.columns = None, None
+		self.n, self.entries = 0, 0
+		self.last_flush = time.time()
+
+	def append(self, row):
+		"""
+		:param row: {'NAME': value}, the first row defines the branches: numpy scalars keep their dtype, other values are float64
+		"""
+		if self.var is None:
+			dtypes = {key: value.dtype if isinstance(value, numpy.generic) and leaf_type(value.dtype) in LEAF_TYPES else numpy.dtype(numpy.float64)
+				for key, value in row.items()}
+			self.var = create_branches(self.tree, dtypes)
+			self.columns = {key: numpy.empty(self.basket_rows, dtype=dtypes[key]) for key in dtypes.keys()}
+		for key in self.columns.keys():
+			self.columns[key][self.n] = row[key]
+		self.n += 1
+		if self.n == self.basket_rows or time.time() - self.last_flush >= self.flush_seconds:
+			self.flush()
+
+	def flush(self):
+		if self.n > 0:
+			fill_columns(self.tree, self.var, self.columns, self.n)
+			self.entries += self.n
+			self.n = 0
+		self.tree.AutoSave("SaveSelf")
+		self.last_flush = time.time()
+
+	def close(self):
+		if self.file is None:
+			return
+		self.flush()
+		self.file.cd()
+		self.tree.Write("", ROOT.TObject.kOverwrite)
+		self.file.Close()
+		self.file = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
 
 class ROOT_IO(object):
 	def __init__(self, filename, mode='RECREATE'):
@@ -42,35 +203,36 @@ class ROOT_IO(object):
 
 		:param filename:
 		:param name:
-		:param data: data in the format: {'NAME': [, , ... , ,], ... }
+		:param data: data in the format: {'NAME': [, , ... , ,], ... }, numpy arrays keep their dtype, strings are stored
+			as TNamed in the UserInfo of the tree
 		:param description:
 		:param mode:
 		:return:
 		"""
 		if not filename[-5:] == '.root': filename += '.root'
-		n = len(data[data.keys()[0]])
+		columns, metadata, n = split_data(data)
+		keys = sorted(columns.keys())
 
 		# Open ROOT-File
 		file = ROOT.TFile(filename, mode)
 
-		# Create Tree
-		tree = ROOT.TTree(name, description)
+		if HAS_ROOT_NUMPY:
+			# one structured array, converted in C++
+			records = numpy.empty(n, dtype=[(key, columns[key].dtype) for key in keys])
+			for key in keys:
+				records[key] = columns[key]
+			tree = root_numpy.array2tree(records, name=name)
+			tree.SetTitle(description)
+		else:
+			# Create Tree
+			tree = ROOT.TTree(name, description)
 
-		# Create variables and set the branches
-		var = {key: numpy.zeros(1, dtype=float) for key in data.keys()}
-		branches = []
-		
-		for key in data.keys():
-			branches.append(tree.Branch(key, var[key], key+'/D'))
+			# Create variables and set the branches
+			var = create_branches(tree, {key: columns[key].dtype for key in keys})
+			fill_columns(tree, var, columns, n)
 
-		for i in range(n):
-			for key in data.keys():
-				try:
-					var[key][0] = data[key][i]
-				except IndexError:
-					print "got IndexError, check last line?"
-					break
-			tree.Fill()
+		for key in sorted(metadata.keys()):
+			tree.GetUserInfo().Add(ROOT.TNamed(key, metadata[key]))
 
 		file.Write()
 		file.Save()
@@ -78,7 +240,48 @@ class ROOT_IO(object):
 		return filename
 
 
-def read_root_noise(rootfile, tree=None, verbose=True, raise_errors=False):
+def read_tree(tree, branches=None, first=0, last=None, time_window=None, time_key='TIME'):
+	"""
+	Read branches of a tree in bulk (root_numpy.tree2array, or TTree::Draw without graphics and GetV1..GetV4).
+	:param tree: TTree
+	:param branches: names of the branches (default: all)
+	:param first: first entry
+	:param last: entry after the last one (default: all)
+	:param time_window: (t0, t1), only entries with t0 <= time_key <= t1, None for an open side
+	:return: {'NAME': numpy.array}, float64 unless root_numpy keeps the type of the branch
+	"""
+	if branches is None:
+		branches = [str(branch.GetName()) for branch in tree.GetListOfBranches()]
+	n = tree.GetEntries()
+	last = n if last is None else min(last, n)
+	first = max(0, min(first, last))
+
+	conditions = []
+	if not time_window is None:
+		if not time_window[0] is None: conditions.append("{0} >= {1!r}".format(time_key, float(time_window[0])))
+		if not time_window[1] is None: conditions.append("{0} <= {1!r}".format(time_key, float(time_window[1])))
+	selection = " && ".join(conditions)
+
+	if HAS_ROOT_NUMPY:
+		records = root_numpy.tree2array(tree, branches=branches, selection=selection or None, start=first, stop=last)
+		return {key: numpy.ascontiguousarray(records[key]) for key in branches}
+
+	data = {}
+	tree.SetEstimate(last - first + 1)
+	for i in range(0, len(branches), 4):
+		group = branches[i:i + 4]
+		tree.Draw(":".join(group), selection, "goff", last - first, first)
+		rows = tree.GetSelectedRows()
+		for key, values in zip(group, [tree.GetV1(), tree.GetV2(), tree.GetV3(), tree.GetV4()]):
+			data[key] = numpy.frombuffer(values, dtype=numpy.float64, count=rows).copy() if rows > 0 else numpy.empty(0)
+	return data
+
+
+def open_tree(rootfile, tree, default, verbose=True, raise_errors=False):
+	"""
+	:param default: tree name proposed if tree is None
+	:return: TFile, TTree or False, None if rootfile is not a ROOT file
+	"""
 	#SETTING UP FILE HANDLE
 	if rootfile[-4:] == 'root':
 		TFile = ROOT.TFile(rootfile, 'READ')
@@ -86,171 +289,72 @@ def read_root_noise(rootfile, tree=None, verbose=True, raise_errors=False):
 		print "File is not a ROOT file!"
 		if raise_errors:
 			raise ValueError("File '"+rootfile+"' is not a ROOT file!")
-		return False
+		return False, None
 
 	if verbose:
 		TFile.ls()
 
 	if tree is None:
-		tree = raw_input("\nenter tree name [PowerBox_Characterize]: ")
-		if tree == "": tree = "PowerBox_Characterize"
-	T = TFile.Get(tree)
-
-	_t, _f, _N, _Nu = numpy.zeros(1), numpy.zeros(1), numpy.zeros(1), numpy.zeros(1)
-	_Vp, _Vm, _Vpu, _Vmu = numpy.zeros(1), numpy.zeros(1), numpy.zeros(1), numpy.zeros(1)
-	T.SetBranchAddress("TIME", _t)
-	T.SetBranchAddress("FREQUENCY", _f)
-	T.SetBranchAddress("NOISE", _N)
-	T.SetBranchAddress("NOISE_STDDEV", _Nu)
-	T.SetBranchAddress("Vp", _Vp)
-	T.SetBranchAddress("Vm", _Vm)
-	T.SetBranchAddress("Vp_STDDEV", _Vpu)
-	T.SetBranchAddress("Vm_STDDEV", _Vmu)
-
-	n = T.GetEntries()
-
-	t, f, N, Nu, Vp, Vm, Vpu, Vmu = numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n)
-
-	for i in range(n):
-		T.GetEntry(i)
-		t[i] = _t
-		f[i] = _f
-		N[i] = _N
-		Nu[i] = _Nu
-		Vp[i] = _Vp
-		Vm[i] = _Vm
-		Vpu[i] = _Vpu
-		Vmu[i] = _Vmu
-
-	VpVm = Vp + Vm
-	VpuVmu = numpy.sqrt(Vpu**2 + Vmu**2)
-	
-	return {'n': n, 't': t, 'f': f, 'N': N, 'Nu': Nu, 'Vp': Vp, 'Vm': Vm, 'Vpu': Vpu, 'Vmu': Vmu, 'VpVm': VpVm, 'VpuVmu': VpuVmu}
-
-
-def read_root_discharge(rootfile, tree=None, verbose=True, raise_errors=False):
-	#SETTING UP FILE HANDLE
-	if rootfile[-4:] == 'root':
-		TFile = ROOT.TFile(rootfile, 'READ')
-	else:
-		print "File is not a ROOT file!"
-		if raise_errors:
-			raise ValueError("File '"+rootfile+"' is not a ROOT file!")
-		return False
-
-	if verbose:
-		TFile.ls()
+		tree = raw_input("\nenter tree name [{0}]: ".format(default))
+		if tree == "": tree = default
+	return TFile, TFile.Get(tree)
 
-	if tree is None:
-		tree = raw_input("\nenter tree name [PowerBox_Discharge]: ")
-		if tree == "": tree = "PowerBox_Discharge"
-	T = TFile.Get(tree)
 
-	_t = numpy.zeros(1)
-	_Vp, _Vm, _Vpu, _Vmu = numpy.zeros(1), numpy.zeros(1), numpy.zeros(1), numpy.zeros(1)
-	T.SetBranchAddress("TIME", _t)
-	T.SetBranchAddress("Vp", _Vp)
-	T.SetBranchAddress("Vm", _Vm)
-	T.SetBranchAddress("Vp_STDDEV", _Vpu)
-	T.SetBranchAddress("Vm_STDDEV", _Vmu)
+def read_root_noise(rootfile, tree=None, verbose=True, raise_errors=False, **kwargs):
+	"""
+	:param kwargs: first, last, time_window of read_tree
+	"""
+	TFile, T = open_tree(rootfile, tree, "PowerBox_Characterize", verbose, raise_errors)
+	if not TFile:
+		return False
 
-	n = T.GetEntries()
+	return LIB.Storage.noise_data(read_tree(T, ["TIME", "FREQUENCY", "NOISE", "NOISE_STDDEV", "Vp", "Vm", "Vp_STDDEV", "Vm_STDDEV"], **kwargs))
 
-	t, Vp, Vm, Vpu, Vmu = numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n)
 
-	for i in range(n):
-		T.GetEntry(i)
-		t[i] = _t
-		Vp[i] = _Vp
-		Vm[i] = _Vm
-		Vpu[i] = _Vpu
-		Vmu[i] = _Vmu
+def read_root_discharge(rootfile, tree=None, verbose=True, raise_errors=False, **kwargs):
+	"""
+	:param kwargs: first, last, time_window of read_tree
+	"""
+	TFile, T = open_tree(rootfile, tree, "PowerBox_Discharge", verbose, raise_errors)
+	if not TFile:
+		return False
 
-	VpVm = Vp + Vm
-	VpuVmu = numpy.sqrt(Vpu**2 + Vmu**2)
-	
-	return {'n': n, 't': t, 'Vp': Vp, 'Vm': Vm, 'Vpu': Vpu, 'Vmu': Vmu, 'VpVm': VpVm, 'VpuVmu': VpuVmu}
+	return LIB.Storage.discharge_data(read_tree(T, ["TIME", "Vp", "Vm", "Vp_STDDEV", "Vm_STDDEV"], **kwargs))
 
 
-def read_root_channels(rootfile, tree=None, channels=[1], verbose=True, raise_errors=False, has_temp=False, has_voltage=False):
+def read_root_channels(rootfile, tree=None, channels=[1], verbose=True, raise_errors=False, has_temp=False, has_voltage=False, **kwargs):
+	"""
+	Branches which are not read (channels, has_temp, has_voltage) are returned as zeros.
+	:param kwargs: first, last, time_window of read_tree
+	"""
 	nchannels = len(channels)
-	#SETTING UP FILE HANDLE
-	if rootfile[-4:] == 'root':
-		TFile = ROOT.TFile(rootfile, 'READ')
-	else:
-		print "File is not a ROOT file!"
-		if raise_errors:
-			raise ValueError("File '"+rootfile+"' is not a ROOT file!")
-		return False
-	if 0 > nchannels > 3:
+	if not 0 < nchannels <= 3:
 		if raise_errors:
-		    raise ValueError("Invalid number of channels provided!")
+			raise ValueError("Invalid number of channels provided!")
 		else:
-		    return False
-
-	if verbose:
-		TFile.ls()
+			return False
+	TFile, T = open_tree(rootfile, tree, "Lab_ReadContinuous", verbose, raise_errors)
+	if not TFile:
+		return False
 
-	if tree is None:
-		tree = raw_input("\nenter tree name [Lab_ReadContinuous]: ")
-		if tree == "": tree = "Lab_ReadContinuous"
-	T = TFile.Get(tree)
-
-	_t, _tO = numpy.zeros(1), numpy.zeros(1)
-	_CH1, _CH1u, _CH2, _CH2u, _CH3, _CH3u = numpy.zeros(1), numpy.zeros(1), numpy.zeros(1), numpy.zeros(1), numpy.zeros(1), numpy.zeros(1)
-	_Up, _Um, _Upu, _Umu = numpy.zeros(1), numpy.zeros(1), numpy.zeros(1), numpy.zeros(1)
-	_TC, _TCu = numpy.zeros(1), numpy.zeros(1)
-	T.SetBranchAddress("TIME", _t)
-	T.SetBranchAddress("TIME_OFFSET", _tO)
-	if 1 in channels:
-		T.SetBranchAddress("CH1", _CH1)
-		T.SetBranchAddress("CH1u", _CH1u)
-	if 2 in channels:
-		T.SetBranchAddress("CH2", _CH2)
-		T.SetBranchAddress("CH2u", _CH2u)
-	if 3 in channels:
-		T.SetBranchAddress("CH3", _CH3)
-		T.SetBranchAddress("CH3u", _CH3u)
+	branches = ["TIME", "TIME_OFFSET"]
+	for channel in [1, 2, 3]:
+		if channel in channels:
+			branches += ["CH{0}".format(channel), "CH{0}u".format(channel)]
 	if has_voltage:
-		T.SetBranchAddress("Up", _Up)
-		T.SetBranchAddress("Um", _Um)
-		T.SetBranchAddress("Upu", _Upu)
-		T.SetBranchAddress("Umu", _Umu)
+		branches += ["Up", "Um", "Upu", "Umu"]
 	if has_temp:
-		T.SetBranchAddress("TC", _TC)
-		T.SetBranchAddress("TCu", _TCu)
-
-	n = T.GetEntries()
-
-	t, tO, Up, Um, Upu, Umu = numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n)
-	CH1, CH1u, CH2, CH2u, CH3, CH3u = numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n), numpy.empty(n)
-	TC, TCu = numpy.empty(n), numpy.empty(n)
-
-	for i in range(n):
-		T.GetEntry(i)
-		t[i] = _t
-		tO[i] = _tO
-		if 1 in channels:
-			CH1[i] = _CH1
-			CH1u[i] = _CH1u
-		if 2 in channels:
-			CH2[i] = _CH2u
-			CH2u[i] = _CH2u
-		if 3 in channels:
-			CH3[i] = _CH3
-			CH3u[i] = _CH3u
-		if has_voltage:
-			Up[i] = _Up
-			Um[i] = _Um
-			Upu[i] = _Upu
-			Umu[i] = _Umu
-		if has_temp:
-			TC[i] = _TC
-			TCu[i] = _TCu
-
-	UpUm = Up + Um
-	UpuUmu = numpy.sqrt(Upu**2 + Umu**2)
-	
-	return {'n': n, 't': t, 'TIME_OFFSET': tO, 'CH1': CH1, 'CH2': CH2, 'CH3': CH3, 'CH1u': CH1u, 'CH2u': CH2u, 'CH3u': CH3u,
-		'Up': Up, 'Um': Um, 'Upu': Upu, 'Umu': Umu, 'UpUm': UpUm, 'UpuUmu': UpuUmu, 'TC': TC, 'TCu': TCu}
+		branches += ["TC", "TCu"]
+	data = read_tree(T, branches, **kwargs)
+
+	n = len(data["TIME"])
+	for key in ["CH1", "CH1u", "CH2", "CH2u", "CH3", "CH3u", "Up", "Um", "Upu", "Umu", "TC", "TCu"]:
+		if not key in data:
+			data[key] = numpy.zeros(n)
+
+	UpUm = data["Up"] + data["Um"]
+	UpuUmu = numpy.sqrt(data["Upu"]**2 + data["Umu"]**2)
 
+	return {'n': n, 't': data["TIME"], 'TIME_OFFSET': data["TIME_OFFSET"], 'CH1': data["CH1"], 'CH2': data["CH2"], 'CH3': data["CH3"],
+		'CH1u': data["CH1u"], 'CH2u': data["CH2u"], 'CH3u': data["CH3u"], 'Up': data["Up"], 'Um': data["Um"], 'Upu': data["Upu"],
+		'Umu': data["Umu"], 'UpUm': UpUm, 'UpuUmu': UpuUmu, 'TC': data["TC"], 'TCu': data["TCu"]}
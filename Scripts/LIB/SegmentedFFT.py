@@ -0,0 +1,183 @@
+__author__ = 'Christian Velten'
+
+import LIB.Windows as Windows
+
+import numpy as np
+
+"""
+Python port of FFT-LockIn/SegmentizedFFT (CVcommon::SegmentedFFT): averaged spectra of windowed segments (Welch).
+	N = floor(fs / fr) points per segment (at most the data length), fr = fs / N
+	segments start every int(N * (1 - overlap)) points, overlap defaults to the ideal one of the window
+The segments are strided views of the data (no copies), a batch of them is windowed and transformed with one rfft.
+Data are added block by block (add), the end of a block which does not fill a segment is kept for the next one,
+so records larger than RAM are streamed from their memory map (see process_waveform).
+
+Output file (.bin.out, like SegmentedFFT<T>::ToByte, T = f4 as in the default build):
+	T[6]        fs, fr, S1, S2, NENBW, ENBW
+	T[N/2 + 1]  average of |rfft| of the windowed segments
+"""
+OUTPUT_HEADER = ['fs', 'fr', 'S1', 'S2', 'NENBW', 'ENBW']
+OUTPUT_EXTENSION = 'bin.out'
+OUTPUT_DTYPE = np.dtype('<f4')
+BATCH_POINTS = 1 << 22  # points per batched rfft
+
+
+def segment_count(n, N, step):
+	"""
+	:return: number of segments of N points starting every step points within n points
+	"""
+	return 0 if n < N else (n - N) // step + 1
+
+
+def segments(data, N, step, count=None):
+	"""
+	:return: read-only view (count, N) of data, row k is data[k*step:k*step+N]
+	"""
+	data = np.ascontiguousarray(data)
+	count = segment_count(len(data), N, step) if count is None else count
+	view = np.lib.stride_tricks.as_strided(data, shape=(count, N), strides=(step * data.strides[0], data.strides[0]))
+	view.flags.writeable = False
+	return view
+
+
+def output_filename(filename):
+	"""
+	:return: filename with its extension replaced by 'bin.out' (String::ReplaceExtension)
+	"""
+	return filename[:filename.rfind('.') + 1] + OUTPUT_EXTENSION
+
+
+class SegmentedFFT(object):
+	def __init__(self, fs, fr=None, window='HANNING', overlap=None, n=None, verbose=False):
+		"""
+		:param fs: sampling frequency
+		:param fr: frequency resolution (default: fs / n, i.e. one segment)
+		:param window: see Windows.WINDOW_TYPES
+		:param overlap: of the segments in [0, 1) (default: ideal overlap of the window)
+		:param n: number of points, if known (limits N)
+		"""
+		if fr is None and n is None:
+			raise ValueError("either the frequency resolution or the number of points is needed")
+		self.fs = float(fs)
+		self.N = int(np.floor(self.fs / fr)) if fr else int(n)
+		if n is not None:
+			self.N = min(self.N, int(n))
+		self.fr = self.fs / self.N
+		self.window = Windows.parse_window_type(window)
+		self.overlap = Windows.ideal_overlap(self.window) if overlap is None else float(overlap)
+		self.step = max(int(self.N * (1. - self.overlap)), 1)
+		self.w, self.S1, self.S2 = Windows.calculate_window(self.window, self.N)
+		self.NENBW, self.ENBW = Windows.noise_bandwidth(self.N, self.S1, self.S2, self.fr)
+
+		self.count = 0
+		self.sum_abs = np.zeros(self.N // 2 + 1)
+		self.sum_power = np.zeros(self.N // 2 + 1)
+		self.tail = np.empty(0)
+		if verbose:
+			print "N = {0} | fs = {1} | fr = {2} | window = {3} | overlap = {4}".format(self.N, self.fs, self.fr, self.window, self.overlap)
+			print "S1 = {0} | S2 = {1} | NENBW = {2} | ENBW = {3}".format(self.S1, self.S2, self.NENBW, self.ENBW)
+
+	def header(self):
+		return {key: getattr(self, key) for key in OUTPUT_HEADER}
+
+	def transform(self, data, count):
+		"""
+		Add the spectra of the first count segments of data, batch by batch.
+		"""
+		batch = max(BATCH_POINTS // self.N, 1)
+		view = segments(data, self.N, self.step, count)
+		for start in range(0, count, batch):
+			windowed = view[start:start + batch] * self.w
+			spectra = np.abs(np.fft.rfft(windowed, axis=1))
+			self.sum_abs += spectra.sum(axis=0)
+			spectra *= spectra
+			self.sum_power += spectra.sum(axis=0)
+		self.count += count
+
+	def add(self, data, offset=0.):
+		"""
+		:param data: next block of the data (segments continue across blocks)
+		:param offset: subtracted from the data (e.g. their mean, as the C++ tool does)
+		"""
+		data = np.asarray(data, dtype=np.float64)
+		if offset:
+			data = data - offset
+		if len(self.tail):
+			# segments starting in the kept end of the last block
+			head = np.concatenate((self.tail, data[:self.N - 1]))
+			count = min(segment_count(len(head), self.N, self.step), -(-len(self.tail) // self.step))
+			self.transform(head, count)
+			if count * self.step < len(self.tail):
+				self.tail = head[count * self.step:]
+				return
+			data = data[count * self.step - len(self.tail):]
+		count = segment_count(len(data), self.N, self.step)
+		self.transform(data, count)
+		self.tail = data[count * self.step:].copy()
+
+	def frequencies(self):
+		return np.fft.rfftfreq(self.N, 1. / self.fs)
+
+	def average_abs(self):
+		"""
+		:return: average |rfft| of the windowed segments (d_avg_abs of the C++ code)
+		"""
+		return self.sum_abs / max(self.count, 1)
+
+	def linear_spectrum(self):
+		"""
+		:return: amplitude spectrum [V rms], sqrt(2 * <|X|^2>) / S1
+		"""
+		return np.sqrt(2. * self.sum_power / max(self.count, 1)) / self.S1
+
+	def psd(self):
+		"""
+		:return: one-sided power spectral density [V^2/Hz], 2 <|X|^2> / (fs S2)
+		"""
+		return 2. * self.sum_power / max(self.count, 1) / (self.fs * self.S2)
+
+	def asd(self):
+		"""
+		:return: amplitude spectral density [V/sqrt(Hz)]
+		"""
+		return np.sqrt(self.psd())
+
+	def to_bytes(self, dtype=OUTPUT_DTYPE):
+		values = np.concatenate((np.array([getattr(self, key) for key in OUTPUT_HEADER]), self.average_abs()))
+		return values.astype(dtype).tostring()
+
+	def write(self, filename, dtype=OUTPUT_DTYPE):
+		with open(filename, 'wb') as handle:
+			handle.write(self.to_bytes(dtype))
+		return filename
+
+
+def read_output(filename, dtype=OUTPUT_DTYPE):
+	"""
+	:return: {'fs': ..., 'fr': ..., 'S1': ..., 'S2': ..., 'NENBW': ..., 'ENBW': ...}, frequencies, average |rfft|
+	"""
+	values = np.fromfile(filename, dtype=dtype)
+	header = {key: float(values[i]) for i, key in enumerate(OUTPUT_HEADER)}
+	data = values[len(OUTPUT_HEADER):].astype(np.float64)
+	return header, np.arange(len(data)) * header['fr'], data
+
+
+def process_waveform(record, fr=None, window='HANNING', overlap=None, subtract_mean=True, chunksize=1 << 24, verbose=False):
+	"""
+	Streams a WaveformBIN.Waveform chunk by chunk through a SegmentedFFT.
+	:param record: WaveformBIN.Waveform (memory mapped records need only one chunk of RAM)
+	:param fr: frequency resolution (default: one segment of the whole record)
+	:param subtract_mean: subtract the mean of the record (from the chunk table of containers)
+	:return: SegmentedFFT
+	"""
+	fft = SegmentedFFT(1. / record.xincr, fr, window, overlap, len(record), verbose)
+	mean = 0.
+	if subtract_mean and len(record):
+		if record.table is not None:
+			weights = np.minimum(record.chunksize, len(record) - record.chunksize * np.arange(len(record.table)))
+			mean = np.dot(record.table['mean'], weights) / float(len(record))
+		else:
+			mean = sum(np.sum(volts, dtype=np.float64) for volts in record.chunks(chunksize)) / len(record)
+	for volts in record.chunks(chunksize):
+		fft.add(volts, mean)
+	return fft
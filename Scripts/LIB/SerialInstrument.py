@@ -1,5 +1,7 @@
 __author__ = 'Christian Velten'
 
+from LIB.InstrumentBase import InstrumentBase
+
 import re
 import serial
 import sys
@@ -13,23 +15,34 @@ SerialInstruments = {
 	    'parity': serial.PARITY_NONE,
 	    'stopbits': serial.STOPBITS_ONE,
 	    'bytesize': serial.EIGHTBITS,
-	    'rtscts': True },
+	    'rtscts': True,
+	    'terminator': '\r\n',
+	    'timeout': 2.0 },
 	'LDC501': {
 		'address': '/dev/ttyUSB1',
 		'baudrate': 38400,
 		'parity': serial.PARITY_NONE,
 		'stopbits': serial.STOPBITS_ONE,
 		'bytesize': serial.EIGHTBITS,
-		'rtscts': False }
+		'rtscts': False,
+		'terminator': '\r\n',
+		'timeout': 2.0 }
 }
 
+DEFAULT_TERMINATOR = '\n'
+DEFAULT_TIMEOUT = 2.0
+
 
-class SerialObject(object):
+class SerialObject(InstrumentBase):
 	instrument = None
 
 	def __init__(self, instrument, wait=0.):
+		InstrumentBase.__init__(self)
 		self.wait = wait
 		self.instrument = instrument
+		self.terminator = instrument.get('terminator', DEFAULT_TERMINATOR)
+		self.timeout = instrument.get('timeout', DEFAULT_TIMEOUT)
+		self.rbuf = b""
 		self.connect(instrument)
 
 	def connect(self, instrument):
@@ -43,7 +56,8 @@ class SerialObject(object):
 			parity=instrument['parity'],
 			stopbits=instrument['stopbits'],
 			bytesize=instrument['bytesize'],
-			rtscts=instrument['rtscts'])
+			rtscts=instrument['rtscts'],
+			timeout=self.timeout)
 
 		if not self.s.isOpen():
 			self.s.open()
@@ -54,18 +68,38 @@ class SerialObject(object):
 		#time.sleep(1./self.instrument['baudrate'])
 		return
 
-	def read(self):
-		time.sleep(1)
-		astr = b""
-		while self.s.inWaiting() > 0:
-			astr += self.s.read(1)
+	def read(self, lines=1):
+		"""
+		Read from the port until 'lines' terminators have arrived or the timeout is hit.
+		Reads everything waiting in the port buffer at once, surplus bytes are kept for the next read.
+		:param lines: number of terminated responses to wait for (e.g. 3 for "MMON?;EMON?;OMON?")
+		:return: the responses including their terminators
+		"""
+		while self.rbuf.count(self.terminator) < lines:
+			n = self.s.inWaiting()
+			r = self.s.read(n if n > 0 else 1)
+			if not r: break  # timeout
+			self.rbuf += r
+		end = 0
+		for i in range(lines):
+			pos = self.rbuf.find(self.terminator, end)
+			if pos == -1:
+				end = len(self.rbuf)
+				break
+			end = pos + len(self.terminator)
+		astr, self.rbuf = self.rbuf[:end], self.rbuf[end:]
 		return astr
 
+	def readline(self):
+		return self.read(1).strip()
+
 	def cmd_and_return(self, cmd, check_for_return=False):
+		self.rbuf = b""
+		self.s.flushInput()
 		self.cmd(cmd)
 		if not (check_for_return or cmd.find("?") != -1):
 			return ""
-		return self.read()
+		return self.read(max(1, cmd.count("?")))
 
 	def ask(self, cmd, check_for_return=False):
 		s = self.cmd_and_return(cmd, check_for_return)
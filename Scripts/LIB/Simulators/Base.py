@@ -0,0 +1,257 @@
+__author__ = 'Christian Velten'
+
+import numpy as np
+import os
+import re
+import select
+import socket
+import SocketServer
+import threading
+import time
+import tty
+
+
+class Raw(str):
+	"""
+	Binary response (e.g. TRCB? or a CURVE? block), sent as is without separator and terminator.
+	"""
+	pass
+
+
+def compile_header(pattern):
+	"""
+	Compile a SCPI header in mixed case notation into a regex accepting the short and the long form,
+	e.g. 'MEASUrement:MEAS<n>:MEAN' matches 'MEASU:MEAS1:MEAN' and 'MEASUREMENT:MEAS1:MEAN'.
+	:param pattern: header, upper case letters are mandatory, '<n>' is a numeric suffix
+	:return: compiled regex, the numeric suffixes are its groups
+	"""
+	parts = []
+	for node in pattern.split(':'):
+		suffix = node.endswith('<n>')
+		if suffix: node = node[:-3]
+		short = re.match(r'[^a-z]*', node).group(0)
+		optional = node[len(short):].upper()
+		# nest the optional letters: MEASU(?:R(?:E(?:M...)?)?)?
+		regex, tail = re.escape(short), ''
+		for c in reversed(optional):
+			tail = '(?:' + re.escape(c) + tail + ')?'
+		regex += tail
+		if suffix: regex += r'(\d*)'
+		parts.append(regex)
+	return re.compile('^' + ':'.join(parts) + '$', re.IGNORECASE)
+
+
+class SimulatedInstrument(object):
+	"""
+	Base class of the instrument simulators. A message is split into its commands, every command is
+	matched against 'commands' (list of (header, method name or None)) and handled by the method, which
+	gets (query, arguments, *numeric suffixes) and returns the response or None.
+	Headers without a method are plain settings stored in 'settings' under their long form, 'defaults'
+	are keyed by the header as given in 'commands'. The header of the running command is 'self.pattern'.
+	:param latency: time to wait before a response is sent (s)
+	:param bandwidth: transfer rate of responses (bytes/s), None for unlimited
+	:param noise: scale of the synthetic noise added to measured values
+	:param seed: seed of the random number generator
+	"""
+	idn = "SIMULATED,INSTRUMENT,0,0"
+	terminator = '\n'
+	separator = ';'
+	commands = []
+	defaults = {}
+
+	def __init__(self, latency=0., bandwidth=None, noise=1E-3, seed=None):
+		self.latency = latency
+		self.bandwidth = bandwidth
+		self.noise = noise
+		self.random = np.random.RandomState(seed)
+		self.settings = dict(self.defaults)
+		self.unknown = set()
+		self.lock = threading.Lock()
+		self.time_start = time.time()
+		self.pattern = None
+		self.table = [(compile_header(h), h, m) for h, m in self.commands]
+
+	@staticmethod
+	def canonical(pattern, suffixes):
+		"""
+		:return: long form of the header with the numeric suffixes filled in, e.g. 'MEASUREMENT:MEAS1:MEAN'
+		"""
+		suffixes = list(suffixes)
+		nodes = []
+		for node in pattern.upper().split(':'):
+			if node.endswith('<N>'):
+				node = node[:-3] + (suffixes.pop(0) if suffixes else '')
+			nodes.append(node)
+		return ':'.join(nodes)
+
+	def split(self, message):
+		return [c.strip().lstrip(':') for c in message.split(';') if c.strip().lstrip(':') != '']
+
+	def execute(self, command):
+		header, _, args = command.partition(' ')
+		query = header.endswith('?')
+		header = header.rstrip('?')
+		args = args.strip()
+		for regex, pattern, method in self.table:
+			match = regex.match(header)
+			if match is None: continue
+			if method is None:
+				key = SimulatedInstrument.canonical(pattern, match.groups())
+				if query: return self.format(pattern, match.groups(), self.setting(key, pattern))
+				self.settings[key] = args
+				return None
+			self.pattern = pattern
+			response = getattr(self, method)(query, args, *match.groups())
+			if response is None or isinstance(response, Raw):
+				return response
+			return self.format(pattern, match.groups(), response)
+		# unknown command: store settings, answer queries with what has been set (or 0)
+		if header.upper() not in self.unknown:
+			self.unknown.add(header.upper())
+			print "{0}: unknown command '{1}'".format(self.__class__.__name__, command)
+		if query: return self.settings.get(header.upper(), '0')
+		self.settings[header.upper()] = args
+		return None
+
+	def setting(self, key, pattern=None):
+		"""
+		:return: value of a plain setting, the default of its pattern (e.g. 'CH<n>:SCAle') or '0'
+		"""
+		if key in self.settings: return self.settings[key]
+		return self.settings.get(pattern, '0')
+
+	def format(self, pattern, suffixes, response):
+		return str(response)
+
+	def process(self, message):
+		"""
+		Handle one message (one line received from the client).
+		:return: response including the terminator, '' if nothing has to be sent
+		"""
+		out, pending = '', False
+		with self.lock:
+			for command in self.split(message):
+				r = self.execute(command)
+				if r is None: continue
+				if isinstance(r, Raw):
+					out += r
+					continue
+				out += (self.separator if pending else '') + r
+				pending = True
+		return out + self.terminator if pending else out
+
+	def delay(self, response):
+		"""
+		Time the response takes to arrive at the client.
+		"""
+		return self.latency + (len(response) / float(self.bandwidth) if self.bandwidth else 0.)
+
+	def elapsed(self):
+		return time.time() - self.time_start
+
+	def gauss(self, size=None):
+		return self.noise * self.random.standard_normal(size)
+
+	def cmd_idn(self, query, args):
+		return self.idn if query else None
+
+	def cmd_none(self, query, args):
+		return None
+
+
+class _Handler(SocketServer.BaseRequestHandler):
+	def handle(self):
+		serve(self.server.instrument, self.request.recv, self.request.sendall)
+
+
+def serve(instrument, recv, send):
+	"""
+	Answer messages until the client has gone, every message is terminated by '\\n'.
+	:param recv: function returning received data, '' if closed
+	:param send: function sending all data
+	"""
+	buf = ''
+	while True:
+		try:
+			r = recv(4096)
+		except (socket.error, OSError):
+			return
+		if not r: return
+		buf += r
+		while '\n' in buf:
+			message, buf = buf.split('\n', 1)
+			response = instrument.process(message.strip('\r'))
+			if not response: continue
+			time.sleep(instrument.delay(response))
+			try:
+				send(response)
+			except (socket.error, OSError):
+				return
+
+
+class SimulatorSocketServer(SocketServer.ThreadingTCPServer):
+	"""
+	Serves a simulated instrument on a local TCP port (like the serial-to-ethernet adapters), use
+	SocketObject(*server.server_address) to connect. Port 0 picks a free port.
+	"""
+	allow_reuse_address = True
+	daemon_threads = True
+
+	def __init__(self, instrument, host='127.0.0.1', port=0):
+		SocketServer.ThreadingTCPServer.__init__(self, (host, port), _Handler)
+		self.instrument = instrument
+		self.thread = None
+
+	def address(self):
+		return "{0}:{1}".format(*self.server_address)
+
+	def start(self):
+		self.thread = threading.Thread(target=self.serve_forever, name=self.instrument.__class__.__name__)
+		self.thread.daemon = True
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.shutdown()
+		self.server_close()
+
+
+class SimulatorPtyServer(object):
+	"""
+	Serves a simulated instrument on a pseudo terminal, use the path of the slave (server.port)
+	as 'address' of a SerialObject instrument.
+	"""
+	def __init__(self, instrument):
+		self.instrument = instrument
+		self.master, self.slave = os.openpty()
+		tty.setraw(self.slave)
+		self.port = os.ttyname(self.slave)
+		self.running = False
+		self.thread = None
+
+	def address(self):
+		return self.port
+
+	def recv(self, n):
+		while self.running:
+			if select.select([self.master], [], [], 0.1)[0]:
+				return os.read(self.master, n)
+		return ''
+
+	def send(self, data):
+		while data:
+			data = data[os.write(self.master, data):]
+
+	def start(self):
+		self.running = True
+		self.thread = threading.Thread(target=serve, args=(self.instrument, self.recv, self.send), name=self.instrument.__class__.__name__)
+		self.thread.daemon = True
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.running = False
+		if not self.thread is None:
+			self.thread.join()
+		os.close(self.master)
+		os.close(self.slave)
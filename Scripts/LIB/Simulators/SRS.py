@@ -0,0 +1,242 @@
+__author__ = 'Christian Velten'
+
+from LIB.Simulators.Base import SimulatedInstrument, Raw
+
+import numpy as np
+import time
+
+
+class SRSInstrument(SimulatedInstrument):
+	"""
+	Stanford Research Systems instruments: four letter commands, every response is terminated on its own.
+	"""
+	terminator = '\r\n'
+	separator = '\r\n'
+
+	@staticmethod
+	def on(value):
+		return value.strip().upper() in ['1', 'ON', 'PID', 'POS']
+
+	def number(self, key):
+		try:
+			return float(self.setting(key).rstrip('VPMSRHZ').strip())
+		except ValueError:
+			return 0.
+
+	def cmd_indexed(self, query, args):
+		"""
+		Settings with an index as first parameter, e.g. 'DDEF 1,2' and 'DDEF? 1'.
+		"""
+		if query: return self.settings.get(self.pattern + args.strip(), '0')
+		index, _, value = args.partition(',')
+		self.settings[self.pattern + index.strip()] = value.strip()
+		return None
+
+
+class SR830(SRSInstrument):
+	"""
+	SR830 lock-in amplifier including the data storage buffer (SRAT, STRT, PAUS, REST, SPTS?, TRCA?/TRCB?/TRCL?).
+	The displays CH1/CH2 show 'outputs' = (X, Y) plus white noise of scale 'noise'.
+	"""
+	idn = "Stanford_Research_Systems,SR830,s/n00001,ver1.07"
+	terminator = '\r'
+	separator = '\r'
+
+	buffer_size = 16383
+	index2samplerate = [62.5E-3 * 2**i for i in range(14)]
+	outputs = (1E-6, 0.)
+
+	commands = [
+		('*IDN', 'cmd_idn'), ('*CLS', 'cmd_none'), ('*RST', 'cmd_none'), ('*WAI', 'cmd_none'),
+		('FMOD', None), ('FREQ', None), ('PHAS', None), ('HARM', None), ('SLVL', None), ('RSLP', None),
+		('ISRC', None), ('IGND', None), ('ICPL', None), ('ILIN', None), ('SENS', None), ('RMOD', None),
+		('OFLT', None), ('OFSL', None), ('SYNC', None), ('DDEF', 'cmd_indexed'), ('FPOP', 'cmd_indexed'),
+		('SRAT', None), ('SEND', None), ('TSTR', None),
+		('TRIG', 'cmd_trigger'), ('STRT', 'cmd_start'), ('PAUS', 'cmd_pause'), ('REST', 'cmd_reset'),
+		('SPTS', 'cmd_points'), ('TRCA', 'cmd_trace'), ('TRCB', 'cmd_trace'), ('TRCL', 'cmd_trace'),
+		('OUTP', 'cmd_output'), ('OUTR', 'cmd_output'), ('SNAP', 'cmd_snap')
+	]
+	defaults = {
+		'FMOD': '1', 'FREQ': '1000.000', 'PHAS': '0.00', 'HARM': '1', 'SLVL': '1.000', 'RSLP': '0',
+		'ISRC': '0', 'IGND': '0', 'ICPL': '0', 'ILIN': '0', 'SENS': '22', 'RMOD': '1',
+		'OFLT': '8', 'OFSL': '1', 'SYNC': '0', 'SRAT': '13', 'SEND': '1', 'TSTR': '0'
+	}
+
+	def __init__(self, latency=0., bandwidth=None, noise=1E-3, seed=None, outputs=None):
+		SRSInstrument.__init__(self, latency, bandwidth, noise, seed)
+		if not outputs is None:
+			self.outputs = outputs
+		self.running, self.run_time, self.run_start, self.triggers = False, 0., None, 0
+		self.buffer = None
+		self.cmd_reset(False, '')
+
+	def points(self):
+		srat = int(self.setting('SRAT'))
+		if srat >= len(self.index2samplerate):
+			return min(self.triggers, self.buffer_size)
+		run_time = self.run_time + (time.time() - self.run_start if self.running else 0.)
+		return min(int(run_time * self.index2samplerate[srat]), self.buffer_size)
+
+	def cmd_reset(self, query, args):
+		self.running, self.run_time, self.triggers = False, 0., 0
+		# noise is drawn once per buffer, the buffer fills with the sample rate while running
+		self.buffer = np.array([o + self.gauss(self.buffer_size) for o in self.outputs], dtype=np.float32)
+		return None
+
+	def cmd_start(self, query, args):
+		if not self.running:
+			self.running, self.run_start = True, time.time()
+		return None
+
+	def cmd_pause(self, query, args):
+		if self.running:
+			self.run_time += time.time() - self.run_start
+			self.running = False
+		return None
+
+	def cmd_trigger(self, query, args):
+		if self.running: self.triggers += 1
+		return None
+
+	def cmd_points(self, query, args):
+		return str(self.points()) if query else None
+
+	def cmd_trace(self, query, args):
+		"""
+		TRCA? i,j,k (ASCII), TRCB? i,j,k (IEEE float) and TRCL? i,j,k (mantissa, exponent) of display i.
+		"""
+		if not query: return None
+		i, j, k = [int(a) for a in args.split(',')]
+		j = min(j, self.points())
+		data = self.buffer[i - 1][j:min(j + k, self.points())]
+		if self.pattern == 'TRCA':
+			return ''.join(["{0:.6e},".format(d) for d in data])
+		if self.pattern == 'TRCB':
+			return Raw(data.astype('<f4').tostring())
+		mantissa, exponent = np.frexp(data)
+		d = np.empty(len(data), dtype=[('m', '<i2'), ('e', '<i2')])
+		d['m'] = np.rint(mantissa * 2.**14)
+		d['e'] = np.where(d['m'] != 0, exponent + 110, 0)
+		return Raw(d.tostring())
+
+	def output(self, i):
+		x, y = self.outputs[0] + self.gauss(), self.outputs[1] + self.gauss()
+		return [x, y, np.hypot(x, y), np.degrees(np.arctan2(y, x)), float(self.setting('FREQ'))][i - 1]
+
+	def cmd_output(self, query, args):
+		return "{0:.6e}".format(self.output(int(args))) if query else None
+
+	def cmd_snap(self, query, args):
+		return ','.join(["{0:.6e}".format(self.output(int(i))) for i in args.split(',')]) if query else None
+
+
+class DS345(SRSInstrument):
+	"""
+	DS345 function generator, all settings are kept and returned on queries.
+	"""
+	idn = "StanfordResearchSystems,DS345,00001,1.05"
+
+	commands = [
+		('*IDN', 'cmd_idn'), ('*CLS', 'cmd_none'), ('*RST', 'cmd_none'), ('*WAI', 'cmd_none'),
+		('FREQ', None), ('AMPL', None), ('OFFS', None), ('PHSE', None), ('FUNC', None), ('INVT', None),
+		('TSRC', None), ('MENA', None), ('MODU', None), ('MTYP', None), ('RATE', None), ('SPAN', None)
+	]
+	defaults = {
+		'FREQ': '1000.0', 'AMPL': '1.00VP', 'OFFS': '0.00', 'PHSE': '0.000', 'FUNC': '0', 'INVT': '0',
+		'TSRC': '0', 'MENA': '0', 'MODU': '0', 'MTYP': '1', 'RATE': '1.0', 'SPAN': '0.0'
+	}
+
+
+class SIM960(SRSInstrument):
+	"""
+	SIM960 analog PID controller in a closed loop with a first order plant: the measure input follows
+	'plant_gain' * output with the time constant 'plant_tau'. MMON?/EMON?/OMON? return the loop state.
+	"""
+	idn = "Stanford_Research_Systems,SIM960,s/n00001,ver2.17"
+
+	plant_gain, plant_tau = 1., 0.1
+	step = 1E-3
+	max_steps = 10000
+
+	commands = [
+		('*IDN', 'cmd_idn'), ('*CLS', 'cmd_none'), ('*RST', 'cmd_none'), ('*WAI', 'cmd_none'),
+		('TOKN', None), ('CONS', None), ('INPT', None), ('SETP', None), ('RAMP', None), ('AMAN', None),
+		('MOUT', None), ('ULIM', None), ('LLIM', None), ('APOL', None), ('GAIN', None), ('INTG', None),
+		('DERV', None), ('OFST', None), ('PCTL', None), ('ICTL', None), ('DCTL', None), ('OCTL', None),
+		('DISP', None), ('SOUT', 'cmd_none'), ('FPLC', None), ('LCME', None),
+		('MMON', 'cmd_monitor'), ('EMON', 'cmd_monitor'), ('OMON', 'cmd_monitor')
+	]
+	defaults = {
+		'TOKN': 'OFF', 'CONS': 'OFF', 'INPT': 'INT', 'SETP': '0.0', 'RAMP': 'OFF', 'AMAN': 'PID', 'MOUT': '0.0',
+		'ULIM': '10.0', 'LLIM': '-10.0', 'APOL': 'POS', 'GAIN': '1.0', 'INTG': '1.0', 'DERV': '0.0', 'OFST': '0.0',
+		'PCTL': 'ON', 'ICTL': 'ON', 'DCTL': 'OFF', 'OCTL': 'OFF', 'DISP': 'OUT', 'FPLC': '60', 'LCME': '0'
+	}
+
+	def __init__(self, latency=0., bandwidth=None, noise=1E-3, seed=None):
+		SRSInstrument.__init__(self, latency, bandwidth, noise, seed)
+		self.measure, self.integral, self.out = 0., 0., 0.
+		self.time_update = time.time()
+
+	def update(self):
+		"""
+		Advance the loop to now.
+		"""
+		now = time.time()
+		steps = min(int((now - self.time_update) / self.step), self.max_steps)
+		if steps == 0: return
+		dt = (now - self.time_update) / steps
+		self.time_update = now
+		gain = self.number('GAIN') * (1. if self.setting('APOL').upper() in ['1', 'POS'] else -1.)
+		intg, offset = self.number('INTG'), self.number('OFST')
+		ulim, llim = self.number('ULIM'), self.number('LLIM')
+		manual = not self.on(self.setting('AMAN'))
+		p, i, o = self.on(self.setting('PCTL')), self.on(self.setting('ICTL')), self.on(self.setting('OCTL'))
+		for n in range(steps):
+			error = self.number('SETP') - self.measure
+			if manual:
+				self.out = self.number('MOUT')
+			else:
+				self.integral += error * dt if i else 0.
+				self.out = gain * ((error if p else 0.) + intg * self.integral) + (offset if o else 0.)
+			self.out = min(max(self.out, llim), ulim)
+			self.measure += (self.plant_gain * self.out - self.measure) * dt / self.plant_tau
+
+	def cmd_monitor(self, query, args):
+		if not query: return None
+		self.update()
+		measure = self.measure + self.gauss()
+		value = {'MMON': measure, 'EMON': self.number('SETP') - measure, 'OMON': self.out}[self.pattern]
+		return "{0:+.6E}".format(value)
+
+
+class LDC501(SRSInstrument):
+	"""
+	LDC501 laser diode controller, RILD? returns the set current (SILD) while the laser is on,
+	TTRD? the TEC temperature, both with white noise.
+	"""
+	idn = "Stanford_Research_Systems,LDC501,s/n00001,ver1.01"
+	temperature = 25.
+
+	commands = [
+		('*IDN', 'cmd_idn'), ('*CLS', 'cmd_none'), ('*RST', 'cmd_none'), ('*WAI', 'cmd_none'),
+		('TOKN', None), ('LDON', None), ('MODU', None), ('RNGE', None), ('SMOD', None), ('SIBW', None),
+		('SYND', None), ('SILD', None), ('SILM', None), ('SVLM', None), ('SCAN', None), ('TEON', None), ('TEMP', None),
+		('RILD', 'cmd_current'), ('RVLD', 'cmd_voltage'), ('TTRD', 'cmd_temperature')
+	]
+	defaults = {
+		'TOKN': 'OFF', 'LDON': 'OFF', 'MODU': 'OFF', 'RNGE': 'LOW', 'SMOD': 'CC', 'SIBW': 'LOW', 'SYND': '0',
+		'SILD': '0.0', 'SILM': '100.0', 'SVLM': '5.0', 'SCAN': '0,0,0', 'TEON': 'ON', 'TEMP': '25.0'
+	}
+
+	def cmd_current(self, query, args):
+		if not query: return None
+		current = min(self.number('SILD'), self.number('SILM')) if self.on(self.setting('LDON')) else 0.
+		return "{0:.4f}".format(current + self.gauss())
+
+	def cmd_voltage(self, query, args):
+		if not query: return None
+		return "{0:.4f}".format(1.5 + 0.01 * self.number('SILD') if self.on(self.setting('LDON')) else 0.)
+
+	def cmd_temperature(self, query, args):
+		if not query: return None
+		return "{0:.4f}".format(self.number('TEMP') + self.gauss())
@@ -0,0 +1,192 @@
+__author__ = 'Christian Velten'
+
+from LIB.Simulators.Base import SimulatedInstrument, Raw
+
+import numpy as np
+import time
+
+
+class Tektronix(SimulatedInstrument):
+	"""
+	Tektronix DPO4104/MSO2xxx: waveform transfer (WFMOutpre, DATa, CURVe), acquisition control
+	and the MEASUrement subsystem. Every channel carries level + amplitude * sin(2 pi frequency t)
+	plus white noise; 'signals' = {channel: (level, amplitude, frequency)}.
+	"""
+	idn = "TEKTRONIX,DPO4104,SIM0001,CF:91.1CT FV:v2.0"
+	terminator = '\n'
+	separator = ';'
+
+	signals = {1: (0.0, 0.0, 50.), 2: (0.5, 0.1, 50.), 3: (1.0, 0.0, 50.), 4: (0.0, 0.0, 50.)}
+	divisions = 10
+	# digitizing levels per vertical division for 1 and 2 byte data
+	levels_per_division = {1: 25., 2: 6400.}
+
+	commands = [
+		('*IDN', 'cmd_idn'), ('*WAI', 'cmd_none'), ('*CLS', 'cmd_none'), ('*RST', 'cmd_none'),
+		('HEADer', None), ('VERBose', None),
+		('HORizontal:SCAle', None), ('HORizontal:RECOrdlength', None),
+		('ACQuire:MODe', None), ('ACQuire:NUMAVg', None), ('ACQuire:STOPAfter', None),
+		('ACQuire:STATE', 'cmd_acquire_state'), ('ACQuire:MAXSamplerate', 'cmd_max_samplerate'),
+		('DATa:SOUrce', None), ('DATa:STARt', None), ('DATa:STOP', None), ('DATa:ENCdg', None), ('DATa:WIDth', None),
+		('CURVe', 'cmd_curve'),
+		('WFMOutpre', 'cmd_wfm'), ('WFMPre', 'cmd_wfm'),
+		('WFMOutpre:NR_Pt', 'cmd_wfm'), ('WFMOutpre:XZEro', 'cmd_wfm'), ('WFMOutpre:XINcr', 'cmd_wfm'),
+		('WFMOutpre:XUNit', 'cmd_wfm'), ('WFMOutpre:YZEro', 'cmd_wfm'), ('WFMOutpre:YOFf', 'cmd_wfm'),
+		('WFMOutpre:YMUlt', 'cmd_wfm'), ('WFMOutpre:YUNit', 'cmd_wfm'), ('WFMOutpre:BYT_Nr', 'cmd_wfm'),
+		('WFMOutpre:ENCdg', 'cmd_wfm'), ('WFMOutpre:BN_Fmt', 'cmd_wfm'), ('WFMOutpre:BYT_Or', 'cmd_wfm'),
+		('WFMPre:NR_Pt', 'cmd_wfm'), ('WFMPre:XZEro', 'cmd_wfm'), ('WFMPre:XINcr', 'cmd_wfm'),
+		('WFMPre:XUNit', 'cmd_wfm'), ('WFMPre:YZEro', 'cmd_wfm'), ('WFMPre:YOFf', 'cmd_wfm'),
+		('WFMPre:YMUlt', 'cmd_wfm'), ('WFMPre:YUNit', 'cmd_wfm'),
+		('MEASUrement:STATIstics:MODe', None), ('MEASUrement:STATIstics:WEIghting', None),
+		('MEASUrement:STATIstics', 'cmd_none'), ('MEASUrement:GATing', None),
+		('MEASUrement:MEAS<n>:SOUrce<n>', None), ('MEASUrement:MEAS<n>:TYPe', None), ('MEASUrement:MEAS<n>:STATE', None),
+		('MEASUrement:MEAS<n>:VALue', 'cmd_measurement'), ('MEASUrement:MEAS<n>:MEAN', 'cmd_measurement'),
+		('MEASUrement:MEAS<n>:MINImum', 'cmd_measurement'), ('MEASUrement:MEAS<n>:MAXimum', 'cmd_measurement'),
+		('MEASUrement:MEAS<n>:STDdev', 'cmd_measurement'), ('MEASUrement:MEAS<n>:COUNt', 'cmd_measurement'),
+		('MEASUrement:MEAS<n>:UNIts', 'cmd_measurement'),
+		('MEASUrement:IMMed:SOUrce<n>', None), ('MEASUrement:IMMed:TYPe', None),
+		('MEASUrement:IMMed:VALue', 'cmd_measurement'), ('MEASUrement:IMMed:UNIts', 'cmd_measurement'),
+		('CH<n>:BANdwidth', None), ('CH<n>:INVert', None), ('CH<n>:LABel', None), ('CH<n>:OFFSet', None),
+		('CH<n>:POSition', None), ('CH<n>:SCAle', None), ('CH<n>:TERmination', None), ('CH<n>:YUNits', None)
+	]
+	defaults = {
+		'HEADer': '0', 'VERBose': '1',
+		'HORizontal:SCAle': '4.0E-4', 'HORizontal:RECOrdlength': '10000',
+		'ACQuire:MODe': 'SAMPLE', 'ACQuire:NUMAVg': '16', 'ACQuire:STOPAfter': 'RUNSTOP',
+		'DATa:SOUrce': 'CH1', 'DATa:STARt': '1', 'DATa:STOP': '10000', 'DATa:ENCdg': 'RIBINARY', 'DATa:WIDth': '1',
+		'MEASUrement:STATIstics:MODe': 'OFF', 'MEASUrement:STATIstics:WEIghting': '32', 'MEASUrement:GATing': 'SCREEN',
+		'MEASUrement:MEAS<n>:SOUrce<n>': 'CH1', 'MEASUrement:MEAS<n>:TYPe': 'MEAN', 'MEASUrement:MEAS<n>:STATE': '0',
+		'MEASUrement:IMMed:SOUrce<n>': 'CH1', 'MEASUrement:IMMed:TYPe': 'MEAN',
+		'CH<n>:BANdwidth': '5.0E+8', 'CH<n>:INVert': '0', 'CH<n>:LABel': '""', 'CH<n>:OFFSet': '0.0E+0',
+		'CH<n>:POSition': '0.0E+0', 'CH<n>:SCAle': '2.5E-1', 'CH<n>:TERmination': '1.0E+6', 'CH<n>:YUNits': '"V"'
+	}
+
+	def __init__(self, latency=0., bandwidth=None, noise=1E-3, seed=None, signals=None):
+		SimulatedInstrument.__init__(self, latency, bandwidth, noise, seed)
+		if not signals is None:
+			self.signals = signals
+		self.acquisition_start, self.acquisition_stop = time.time(), None
+
+	@staticmethod
+	def on(value):
+		return value.strip().upper() in ['1', 'ON', 'RUN']
+
+	def format(self, pattern, suffixes, response):
+		if self.on(self.setting('HEADER', 'HEADer')):
+			return ':' + SimulatedInstrument.canonical(pattern, suffixes) + ' ' + str(response)
+		return str(response)
+
+	def channel(self, source):
+		return int(source.strip().upper().replace('CH', ''))
+
+	def signal(self, channel, t):
+		level, amplitude, frequency = self.signals.get(channel, (0., 0., 0.))
+		return level + amplitude * np.sin(2. * np.pi * frequency * t) + self.gauss(np.shape(t))
+
+	def cmd_acquire_state(self, query, args):
+		now = time.time()
+		sequence = self.setting('ACQUIRE:STOPAFTER', 'ACQuire:STOPAfter').upper().startswith('SEQ')
+		# a single sequence is finished after one screen
+		if sequence and self.acquisition_stop is None and now - self.acquisition_start > self.duration():
+			self.acquisition_stop = self.acquisition_start + self.duration()
+		if query:
+			return '0' if not self.acquisition_stop is None else '1'
+		if self.on(args):
+			self.acquisition_start, self.acquisition_stop = now, None
+		else:
+			self.acquisition_stop = now
+		return None
+
+	def cmd_max_samplerate(self, query, args):
+		return "2.5000E+9" if query else None
+
+	def duration(self):
+		return float(self.setting('HORIZONTAL:SCALE', 'HORizontal:SCAle')) * self.divisions
+
+	def preamble(self):
+		width = int(self.setting('DATA:WIDTH', 'DATa:WIDth'))
+		encoding = self.setting('DATA:ENCDG', 'DATa:ENCdg').upper()
+		channel = self.channel(self.setting('DATA:SOURCE', 'DATa:SOUrce'))
+		scale = float(self.setting('CH{0}:SCALE'.format(channel), 'CH<n>:SCAle'))
+		npoints = int(self.setting('HORIZONTAL:RECORDLENGTH', 'HORizontal:RECOrdlength'))
+		start = max(int(self.setting('DATA:START', 'DATa:STARt')), 1)
+		stop = min(int(self.setting('DATA:STOP', 'DATa:STOP')), npoints)
+		xincr = self.duration() / npoints
+		unsigned = encoding.startswith('RP') or encoding.startswith('SRP')
+		return {
+			'BYT_NR': width, 'BIT_NR': 8 * width,
+			'ENCDG': 'ASC' if encoding.startswith('ASC') else 'BIN',
+			'BN_FMT': 'RP' if unsigned else 'RI',
+			'BYT_OR': 'LSB' if encoding.startswith('SR') else 'MSB',
+			'NR_PT': max(stop - start + 1, 0),
+			'WFID': '"Ch{0}, DC coupling, {1:.1E}V/div, {2:.1E}s/div, {3} points, Sample mode"'.format(channel, scale, xincr * npoints / self.divisions, npoints),
+			'PT_FMT': 'Y', 'XUNIT': '"s"', 'XINCR': xincr, 'XZERO': -0.5 * xincr * npoints + (start - 1) * xincr, 'PT_OFF': 0,
+			'YUNIT': '"V"', 'YMULT': scale / self.levels_per_division.get(width, 25.),
+			'YOFF': 2.**(8 * width - 1) if unsigned else 0., 'YZERO': 0.,
+			'CHANNEL': channel, 'START': start, 'STOP': stop, 'ENCODING': encoding
+		}
+
+	def cmd_wfm(self, query, args):
+		if not query: return None
+		p = self.preamble()
+		item = self.pattern.split(':')[-1].upper()
+		if item in ['WFMOUTPRE', 'WFMPRE']:
+			return ';'.join([str(p[k]) if not isinstance(p[k], float) else "{0:.4E}".format(p[k]) for k in
+				['BYT_NR', 'BIT_NR', 'ENCDG', 'BN_FMT', 'BYT_OR', 'NR_PT', 'WFID', 'PT_FMT', 'XUNIT', 'XINCR', 'XZERO', 'PT_OFF', 'YUNIT', 'YMULT', 'YOFF', 'YZERO']])
+		value = p[item]
+		return "{0:.4E}".format(value) if isinstance(value, float) else str(value)
+
+	def cmd_curve(self, query, args):
+		"""
+		CURVe? of the DATa:SOUrce channel between DATa:STARt and DATa:STOP as definite length block or ASCII.
+		"""
+		if not query: return None
+		p = self.preamble()
+		t = p['XZERO'] + p['XINCR'] * np.arange(p['NR_PT']) + self.acquisition_start
+		width = p['BYT_NR']
+		adc = np.rint(self.signal(p['CHANNEL'], t) / p['YMULT'] + p['YOFF'])
+		if p['BN_FMT'] == 'RP':
+			adc = np.clip(adc, 0, 2**(8 * width) - 1)
+		else:
+			adc = np.clip(adc, -2**(8 * width - 1), 2**(8 * width - 1) - 1)
+		if p['ENCDG'] == 'ASC':
+			return ','.join(adc.astype(int).astype(str))
+		dtype = ('<' if p['BYT_OR'] == 'LSB' else '>') + ('u' if p['BN_FMT'] == 'RP' else 'i') + str(width)
+		data = adc.astype(dtype).tostring()
+		length = str(len(data))
+		return Raw('#' + str(len(length)) + length + data + '\n')
+
+	def measure(self, key, item):
+		"""
+		:param key: 'MEAS<n>' or 'IMMED'
+		:param item: VALUE, MEAN, MINIMUM, MAXIMUM, STDDEV, COUNT or UNITS
+		"""
+		base = 'MEASUREMENT:' + key
+		source = self.settings.get(base + ':SOURCE', self.setting(base + ':SOURCE1', 'MEASUrement:MEAS<n>:SOUrce<n>'))
+		mtype = self.setting(base + ':TYPE', 'MEASUrement:MEAS<n>:TYPe').upper()
+		level, amplitude, frequency = self.signals.get(self.channel(source), (0., 0., 0.))
+		if mtype.startswith('AMP') or mtype.startswith('PK2'):
+			value, unit = 2. * amplitude, '"V"'
+		elif mtype.startswith('FREQ'):
+			value, unit = frequency, '"Hz"'
+		elif mtype.startswith('PHA'):
+			value, unit = 0., '"degrees"'
+		elif mtype.startswith('RMS'):
+			value, unit = np.sqrt(level**2 + amplitude**2 / 2.), '"V"'
+		else:
+			value, unit = level, '"V"'
+		weighting = float(self.setting('MEASUREMENT:STATISTICS:WEIGHTING', 'MEASUrement:STATIstics:WEIghting'))
+		if item == 'UNITS': return unit
+		if item == 'COUNT': return "{0:.4E}".format(int(self.elapsed() * 10.))
+		if item == 'STDDEV': return "{0:.4E}".format(abs(self.noise * (1. + self.gauss() / np.sqrt(weighting))))
+		if item == 'MEAN': value += self.gauss() / np.sqrt(weighting)
+		elif item == 'MINIMUM': value -= 3. * self.noise
+		elif item == 'MAXIMUM': value += 3. * self.noise
+		else: value += self.gauss()
+		return "{0:.4E}".format(value)
+
+	def cmd_measurement(self, query, args, *suffixes):
+		if not query: return None
+		key = 'MEAS' + suffixes[0] if suffixes else 'IMMED'
+		item = SimulatedInstrument.canonical(self.pattern, suffixes).split(':')[-1]
+		return self.measure(key, item)
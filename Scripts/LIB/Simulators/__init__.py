@@ -0,0 +1,26 @@
+from LIB.Simulators.Base import SimulatedInstrument, SimulatorSocketServer, SimulatorPtyServer, Raw
+from LIB.Simulators.Tektronix import Tektronix
+from LIB.Simulators.SRS import SR830, DS345, SIM960, LDC501
+
+Simulators = {
+	'DPO4104': Tektronix,
+	'MSO2XXX': Tektronix,
+	'SR830': SR830,
+	'DS345': DS345,
+	'SIM960': SIM960,
+	'LDC501': LDC501
+}
+
+
+def start(name, pty=False, host='127.0.0.1', port=0, **kwargs):
+	"""
+	Start a simulator in the background.
+	:param name: key of Simulators
+	:param pty: serve on a pseudo terminal (SerialObject) instead of a TCP port (SocketObject)
+	:param kwargs: passed to the simulator, e.g. latency, bandwidth, noise, seed
+	:return: the running server, server.address() is 'host:port' or the pty path
+	"""
+	instrument = Simulators[name](**kwargs)
+	if pty:
+		return SimulatorPtyServer(instrument).start()
+	return SimulatorSocketServer(instrument, host, port).start()
@@ -1,4 +1,5 @@
 from LIB.Exceptions import SocketConnectionException, SocketTalkError
+from LIB.InstrumentBase import InstrumentBase
 import socket
 
 SocketInstruments = {
@@ -9,10 +10,11 @@ SocketInstruments = {
 }
 
 
-class SocketObject(object):
+class SocketObject(InstrumentBase):
 	Address, Port = None, None
 
 	def __init__(self, address, port, buffer=4*1024, timeout=10, blocking=0, no_query=False):
+		InstrumentBase.__init__(self)
 		self.s = None
 		self.timeout = timeout
 		self.Address = address
@@ -63,6 +65,46 @@ class SocketObject(object):
 			astr += r
 		return astr.strip()
 
+	def read_raw(self, nbytes):
+		"""
+		Read exactly nbytes of binary data (no terminator) into a preallocated buffer.
+		:param nbytes: number of bytes to read
+		:return: bytearray, shorter than nbytes if the connection was closed
+		"""
+		buf = bytearray(nbytes)
+		view = memoryview(buf)
+		n = 0
+		while n < nbytes:
+			try:
+				r = self.s.recv_into(view[n:], nbytes - n)
+			except socket.error, e:
+				raise SocketTalkError(e)
+			if not r: break
+			n += r
+		return buf if n == nbytes else buf[:n]
+
+	def drain(self, quiet=0.5):
+		"""
+		Discard pending input (e.g. the rest of a failed binary transfer) until nothing arrives for quiet seconds.
+		Reconnects if the connection was closed or broke.
+		:return: number of discarded bytes
+		"""
+		n = 0
+		timeout = self.s.gettimeout()
+		try:
+			self.s.settimeout(quiet)
+			while True:
+				r = self.s.recv(self.buffer)
+				if not r:
+					raise socket.error("connection closed")
+				n += len(r)
+		except socket.timeout:
+			self.s.settimeout(timeout)
+		except socket.error:
+			self.close()
+			self.connect(no_query=True)
+		return n
+
 	def cmd_and_return(self, cmd, check_for_return=False):
 		self.cmd(cmd)
 		if not (check_for_return or cmd.find("?") != -1):
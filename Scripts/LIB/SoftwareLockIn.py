@@ -0,0 +1,331 @@
+__author__ = 'Christian Velten'
+
+HAS_SCIPY = True
+
+from LIB.LockInNoise import LockInNoise
+import LIB.Windows as Windows
+
+import numpy as np
+try: import scipy.signal
+except ImportError: HAS_SCIPY = False
+
+"""
+Python port of the software lock-in of FFT-LockIn (CVcommon/LockIn.h, LockIn-Scan, LockIn-PostProc).
+
+LockIn<T>::CalculateLock mixes the data with 2 sin / 2 cos, low-pass filters both with the FFT of a windowed sinc
+(Filters<T>::LowPass, |W(f)| / sqrt(2)) and averages the filtered data. The average only sees the DC bin of the
+filter, so for every lock-in frequency fl
+	Xavg = sqrt(2) G (-Im S), Yavg = sqrt(2) G Re S,  S = sum_n x_n exp(-2 pi i fl n / fs),  G = |sum(sinc * window)|
+The scan evaluates S for all frequencies of the linear grid at once with chirp-z transforms (Bluestein), the data are
+processed in chunks (and the frequencies in blocks), so memory is bounded by the chunk size.
+
+Output file (.bin.lock, T = f4 as in the default build):
+	T[n] lock-in frequencies, T[n] Ravg / N, T[n] phase (atan2(Yavg, Xavg))
+
+StreamingLockIn demodulates blocks as they are acquired (e.g. CURVE? records of RecordWaveformBIN.py) like an SR830:
+the mixer output of the reference (sin for X, cos for Y) passes 1-4 cascaded first-order low-pass stages with the
+time constant (6/12/18/24 dB/oct) and X, Y, R (rms) and THETA are emitted every 'decimation' points.
+Consecutive blocks of add() are one continuous stream. Blocks with gaps in between (separately triggered records) are
+not: reset(t0) before every such block anchors the reference to the time t0 of its first point (relative to the
+trigger) and restarts the filter, its outputs are SETTLED only after settle_time() from the start of the block.
+The stages use scipy.signal.lfilter if available, else exponential_filter (vectorised, same result).
+"""
+LOCK_EXTENSION = 'bin.lock'
+LOCK_DTYPE = np.dtype('<f4')
+FILTER_WINDOW = 'HAMMING'
+FTRANS_SCAN = 0.1  # Hz, LockIn-Scan
+FTRANS_POSTPROC = 0.001  # Hz, LockIn-PostProc
+CHUNKSIZE = 1 << 18  # points per chirp-z transform (also bounds the chirp phases k**2)
+SLOPES = LockInNoise.index2slope  # dB/oct, 6 per first-order stage
+FILTER_RANGE = 30.  # exponential_filter: largest decay exp(FILTER_RANGE) within one block
+
+
+def crop(data, group=1):
+	"""
+	:return: means of 'group' consecutive points (CropData), an incomplete last group is dropped
+	"""
+	data = np.asarray(data)
+	if group <= 1:
+		return data
+	n = len(data) // group
+	return data[:n * group].reshape(n, group).mean(axis=1)
+
+
+def lowpass_kernel(N, ft, fs, window=FILTER_WINDOW, start=0, stop=None):
+	"""
+	:param start, stop: only compute the values start..stop-1 (default: all N)
+	:return: sinc of the transmission frequency ft times the window, N points (Filters<T>::SINC1, LOW_PASS)
+	"""
+	ft = float(ft) / fs
+	d = np.arange(start, N if stop is None else stop) - 0.5 * (N - 1)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		sinc = np.where(d == 0, 2. * ft, np.sin(2. * np.pi * ft * d) / (np.pi * d))
+	if N * np.dtype(np.float64).itemsize <= Windows.cache.nbytes:
+		w = Windows.get_window(window, N).values[start:stop]
+	else:
+		w = Windows.window_values(window, N, start=start, stop=stop)
+	return sinc * w
+
+
+def lowpass_gain(N, ft, fs, window=FILTER_WINDOW, chunksize=CHUNKSIZE):
+	"""
+	:return: G = |sum of the low-pass kernel|, its DC gain (summed chunk by chunk)
+	"""
+	return abs(sum(np.sum(lowpass_kernel(N, ft, fs, window, start, min(start + chunksize, N))) for start in range(0, N, chunksize)))
+
+
+def scan_frequencies(N, fs, low=None, high=None, resolution=None, group=1):
+	"""
+	Defaults of LockIn-Scan (N and fs after cropping by group).
+	:return: np.array of the lock-in frequencies
+	"""
+	fn = fs / 2.
+	resolution = fn / N * 100 * group if resolution is None or resolution <= 0 else resolution
+	low = fs / N if low is None or low < 0 else low
+	high = fn if high is None or high < 0 else high
+	return low + resolution * np.arange(int((high - low) / resolution) + 1)
+
+
+def next_power_of_two(n):
+	return 1 << int(np.ceil(np.log2(max(n, 1))))
+
+
+class DFTBank(object):
+	"""
+	S_k = sum_n x_n exp(-2 pi i f_k n / fs) for the frequencies f_k = f0 + k df, k < M, fed chunk by chunk.
+	Every chunk and block of frequencies is one chirp-z transform (three FFTs of next_power_of_two(chunksize + block)).
+	"""
+	def __init__(self, fs, f0, df, M, chunksize=CHUNKSIZE, block=CHUNKSIZE):
+		self.fs, self.f0, self.df, self.M = float(fs), float(f0), float(df), int(M)
+		self.L, self.B = int(chunksize), int(min(block, self.M))
+		self.P = next_power_of_two(self.L + self.B - 1)
+		self.n = 0
+		self.S = np.zeros(self.M, dtype=np.complex128)
+		self.tail = np.empty(0)
+
+		# chirps exp(i pi r j**2), r = df/fs, j from -(L-1) to B-1 (the convolution kernel, its FFT is shared by all blocks)
+		r = self.df / self.fs
+		m = np.arange(self.L, dtype=np.float64)
+		k = np.arange(self.B, dtype=np.float64)
+		self.chirp_m = np.exp(-1j * np.pi * np.fmod(r * m * m, 2.))
+		self.chirp_k = np.exp(-1j * np.pi * np.fmod(r * k * k, 2.))
+		kernel = np.zeros(self.P, dtype=np.complex128)
+		kernel[:self.B] = np.conj(self.chirp_k)
+		kernel[self.P - self.L + 1:] = np.conj(self.chirp_m[1:][::-1])
+		self.kernel = np.fft.fft(kernel)
+
+	def frequencies(self):
+		return self.f0 + self.df * np.arange(self.M)
+
+	def transform(self, chunk):
+		"""
+		Add a chunk of at most L points starting at self.n.
+		"""
+		chunk = np.asarray(chunk, dtype=np.float64)
+		L = len(chunk)
+		m = np.arange(L, dtype=np.float64)
+		for start in range(0, self.M, self.B):
+			B = min(self.B, self.M - start)
+			f = self.f0 + self.df * start
+			a = np.zeros(self.P, dtype=np.complex128)
+			a[:L] = chunk * self.chirp_m[:L] * np.exp(-2j * np.pi * np.fmod(f / self.fs * m, 1.))
+			conv = np.fft.ifft(np.fft.fft(a) * self.kernel)[:B]
+			# shift of the chunk: exp(-2 pi i f_k n) for the frequencies of the block
+			shift = np.exp(-2j * np.pi * np.fmod((f + self.df * np.arange(B)) / self.fs * self.n, 1.))
+			self.S[start:start + B] += conv * self.chirp_k[:B] * shift
+		self.n += L
+
+	def add(self, data):
+		"""
+		:param data: next block of the data, of any length
+		"""
+		data = np.asarray(data, dtype=np.float64)
+		if len(self.tail):
+			data = np.concatenate((self.tail, data))
+		full = len(data) // self.L * self.L
+		for start in range(0, full, self.L):
+			self.transform(data[start:start + self.L])
+		self.tail = data[full:].copy()
+
+	def result(self):
+		"""
+		:return: S (the pending points of the last add are transformed)
+		"""
+		if len(self.tail):
+			self.transform(self.tail)
+			self.tail = np.empty(0)
+		return self.S
+
+
+def lock(S, N, gain):
+	"""
+	:param S: result of DFTBank
+	:param gain: lowpass_gain
+	:return: Xavg, Yavg, Ravg / N, phase (as the C++ code)
+	"""
+	X, Y = np.sqrt(2.) * gain * -S.imag, np.sqrt(2.) * gain * S.real
+	return X, Y, np.hypot(X, Y) / N, np.arctan2(Y, X)
+
+
+def scan(chunks, N, fs, frequencies, ft=FTRANS_SCAN, chunksize=CHUNKSIZE, window=FILTER_WINDOW):
+	"""
+	:param chunks: iterable of data blocks (N points in total), e.g. Waveform.chunks()
+	:param frequencies: linear grid, see scan_frequencies
+	:return: frequencies, Ravg / N, phase
+	"""
+	frequencies = np.asarray(frequencies, dtype=np.float64)
+	df = frequencies[1] - frequencies[0] if len(frequencies) > 1 else 0.
+	bank = DFTBank(fs, frequencies[0], df, len(frequencies), chunksize)
+	for data in chunks:
+		bank.add(data)
+	X, Y, R, phase = lock(bank.result(), N, lowpass_gain(N, ft, fs, window, chunksize))
+	return bank.frequencies(), R, phase
+
+
+def scan_waveform(record, fs=None, low=None, high=None, resolution=None, group=1, ft=FTRANS_SCAN, chunksize=CHUNKSIZE):
+	"""
+	LockIn-Scan of a WaveformBIN.Waveform, streamed chunk by chunk from its memory map.
+	:param fs: sampling frequency (default: 1/XINCR)
+	:param group: crop_group, points averaged before the scan
+	:return: frequencies, Ravg / N, phase
+	"""
+	fs = (1. / record.xincr if fs is None else float(fs)) / group
+	N = len(record) // group
+	chunks = (crop(volts, group) for volts in record.chunks(chunksize * group))
+	return scan(chunks, N, fs, scan_frequencies(N, fs, low, high, resolution, group), ft, chunksize)
+
+
+def lock_filename(filename):
+	return filename[:filename.rfind('.') + 1] + LOCK_EXTENSION
+
+
+def write_lock(filename, frequencies, R, phase, dtype=LOCK_DTYPE):
+	with open(filename, 'wb') as handle:
+		handle.write(np.concatenate((frequencies, R, phase)).astype(dtype).tostring())
+	return filename
+
+
+def read_lock(filename, dtype=LOCK_DTYPE):
+	"""
+	:return: frequencies, Ravg / N, phase
+	"""
+	values = np.fromfile(filename, dtype=dtype).astype(np.float64)
+	n = len(values) // 3
+	return values[:n], values[n:2*n], values[2*n:3*n]
+
+
+def exponential_filter(x, beta, state=0.):
+	"""
+	First-order low-pass y[n] = beta y[n-1] + (1 - beta) x[n] (RC stage), vectorised:
+	within blocks of s points y is a cumulative sum weighted with beta**-j (at most exp(FILTER_RANGE)),
+	the carry from the preceding blocks decays with beta**s (a few blocks are enough for double precision).
+	:param x: np.array (float or complex)
+	:param beta: exp(-1 / (fs * time constant)), in (0, 1)
+	:param state: y[-1]
+	:return: y, y[-1] of this call (the state of the next one)
+	"""
+	n = len(x)
+	if n == 0:
+		return np.array(x), state
+	if HAS_SCIPY:
+		y = scipy.signal.lfilter([1. - beta], [1., -beta], x, zi=np.array([beta * state]))[0]
+		return y, y[-1]
+	decay = -np.log(beta)
+	s = int(min(n, max(1, FILTER_RANGE // decay)))
+	m = -(-n // s)
+	blocks = np.zeros(m * s, dtype=np.result_type(x, state, np.float64))
+	blocks[:n] = x
+	blocks = blocks.reshape(m, s)
+	j = np.arange(s)
+	# response of every block with zero initial state
+	y = np.cumsum(blocks * np.exp(decay * j), axis=1)
+	y *= (1. - beta) * np.exp(-decay * j)
+	# carry into every block: c_b = y_{b-1}[s-1] + beta**s c_{b-1}, c_0 = state
+	gamma = np.exp(-decay * s)
+	ends = y[:-1, -1]
+	carry = np.zeros(m, dtype=y.dtype)
+	if m > 1:
+		carry[1:] = ends
+		for i in range(1, int(np.ceil(40. / (decay * s))) + 1):
+			if i >= m - 1:
+				break
+			carry[1 + i:] += gamma**i * ends[:-i]
+	with np.errstate(under='ignore'):
+		carry += np.exp(-decay * s * np.arange(m)) * state
+		y += np.exp(-decay * (j + 1))[np.newaxis, :] * carry[:, np.newaxis]
+	y = y.ravel()[:n]
+	return y, y[-1]
+
+
+class StreamingLockIn(object):
+	"""
+	Software lock-in on a stream of blocks, see above. add() returns the decimated outputs of every block.
+	"""
+	def __init__(self, fs, frequency, time_constant, slope=24, rate=None, phase=0., chunksize=CHUNKSIZE):
+		"""
+		:param fs: sampling frequency
+		:param frequency: reference frequency
+		:param time_constant: of every filter stage in s
+		:param slope: 6, 12, 18 or 24 dB/oct
+		:param rate: output rate in Hz (default: every point)
+		:param phase: reference phase in degrees
+		:param chunksize: points demodulated at once (bounds the memory for large blocks)
+		"""
+		if slope not in SLOPES:
+			raise ValueError("slope has to be one of {0} dB/oct".format(SLOPES))
+		self.fs, self.frequency, self.time_constant, self.slope = float(fs), float(frequency), float(time_constant), slope
+		self.stages = SLOPES.index(slope) + 1
+		self.beta = np.exp(-1. / (self.fs * self.time_constant))
+		self.decimation = max(int(round(self.fs / rate)), 1) if rate else 1
+		self.phase = np.radians(phase)
+		self.chunksize = int(chunksize)
+		self.settle_points = int(np.ceil(self.settle_time() * self.fs))
+		self.reset()
+
+	def reset(self, t0=0.):
+		"""
+		Start a new stream: zero filter state, reference phase 2 pi f t0 (+ phase) at its first point.
+		:param t0: time of the first point of the next block in s (e.g. XZERO of a record, relative to the trigger)
+		"""
+		self.state = np.zeros(self.stages, dtype=np.complex128)
+		self.cycle = np.fmod(self.frequency * t0, 1.)  # reference cycles (fraction) at the next point
+		self.n = 0  # points since the start of the stream
+		self.skip = self.decimation - 1  # index of the next output within the next block
+
+	def settle_time(self):
+		"""
+		:return: time to settle to 99% of a step (SR830 manual)
+		"""
+		return LockInNoise.index2settle[self.stages - 1] * self.time_constant
+
+	def demodulate(self, data):
+		"""
+		:return: filtered X + iY (rms) of every point of data
+		"""
+		data = np.asarray(data, dtype=np.float64)
+		z = 2. * np.pi * (self.cycle + self.frequency / self.fs * np.arange(len(data))) + self.phase
+		self.cycle = np.fmod(self.cycle + self.frequency / self.fs * len(data), 1.)
+		mixed = np.sqrt(2.) * data * (np.sin(z) + 1j * np.cos(z))
+		for i in range(self.stages):
+			mixed, self.state[i] = exponential_filter(mixed, self.beta, self.state[i])
+		return mixed
+
+	def add(self, data):
+		"""
+		:param data: next block (volts), continues the stream (see reset)
+		:return: {'INDEX': point of every output since reset, 'TIME': INDEX / fs, 'X': ..., 'Y': ..., 'R': ..., 'THETA': degrees,
+			'SETTLED': bool, settle_time() passed since reset}
+		"""
+		index, outputs = [], []
+		for start in range(0, len(data), self.chunksize):
+			chunk = data[start:start + self.chunksize]
+			filtered = self.demodulate(chunk)
+			points = np.arange(self.skip, len(chunk), self.decimation)
+			self.skip = (self.skip - len(chunk)) % self.decimation
+			index.append(self.n + points)
+			outputs.append(filtered[points])
+			self.n += len(chunk)
+		index = np.concatenate(index) if index else np.empty(0, dtype=int)
+		outputs = np.concatenate(outputs) if outputs else np.empty(0, dtype=np.complex128)
+		return {'INDEX': index, 'TIME': index / self.fs, 'X': outputs.real, 'Y': outputs.imag, 'R': np.abs(outputs),
+			'THETA': np.degrees(np.angle(outputs)), 'SETTLED': index >= self.settle_points}
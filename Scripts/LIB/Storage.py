@@ -0,0 +1,279 @@
+__author__ = 'Christian Velten'
+
+from collections import deque
+import json
+import numpy as np
+import os
+import struct
+
+"""
+Binary storage of the loggers besides their text file, chosen with --storage:
+	root  ROOT tree in filename.root, written in baskets with AutoSave checkpoints (needs PyROOT)
+	npy   directory filename.npy/ with one .npy file per column and metadata.json, appended row by row;
+	      read with read_npy (memory mapped, no ROOT needed) or numpy.load
+	none  only the text file
+"""
+NPY_SUFFIX = '.npy'
+NPY_MAGIC = '\x93NUMPY\x01\x00'
+NPY_HEADER_LENGTH = 128  # fixed, so the shape can be rewritten in place
+METADATA_FILENAME = 'metadata.json'
+
+
+class Storage(object):
+	"""
+	Backend 'none', base class of the others.
+	"""
+	def __init__(self, filename, name, metadata=None):
+		"""
+		:param filename: file of the logger, the backends append their suffix
+		:param name: name of the data set (tree name)
+		:param metadata: {'KEY': str}
+		"""
+		self.filename, self.name = filename, name
+		self.metadata = dict(metadata) if metadata else {}
+
+	def append(self, row):
+		"""
+		:param row: {'KEY': value}, every row has the keys of the first one
+		"""
+		pass
+
+	def flush(self):
+		pass
+
+	def close(self):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+class RootStorage(Storage):
+	"""
+	Writes the rows into filename.root with ROOT_IO.TreeWriter (flushed in baskets, AutoSave checkpoints).
+	"""
+	def __init__(self, filename, name, metadata=None):
+		Storage.__init__(self, filename, name, metadata)
+		import LIB.ROOT_IO
+		self.writer = LIB.ROOT_IO.TreeWriter(filename, name, metadata=self.metadata)
+
+	def append(self, row):
+		self.writer.append(row)
+
+	def flush(self):
+		self.writer.flush()
+
+	def close(self):
+		if self.writer.file is None:
+			return
+		self.writer.close()
+		print "created ROOT file from data ('" + self.writer.filename + "')"
+
+
+class NpyColumn(object):
+	"""
+	One column as .npy file: the data are appended behind a header of fixed length, whose shape is updated by flush().
+	"""
+	def __init__(self, filename, dtype):
+		self.filename = filename
+		self.dtype = np.dtype(dtype)
+		self.n = 0
+		self.handle = open(filename, 'w+b')
+		self.write_header()
+
+	def write_header(self):
+		header = "{{'descr': {0!r}, 'fortran_order': False, 'shape': ({1},), }}".format(self.dtype.str, self.n)
+		header = header.ljust(NPY_HEADER_LENGTH - len(NPY_MAGIC) - 3) + '\n'
+		self.handle.seek(0)
+		self.handle.write(NPY_MAGIC + struct.pack('<H', len(header)) + header)
+		self.handle.seek(0, os.SEEK_END)
+
+	def append(self, values):
+		values = np.asarray(values, dtype=self.dtype)
+		self.handle.write(values.tostring())
+		self.n += values.size
+
+	def flush(self):
+		self.write_header()
+		self.handle.flush()
+
+	def close(self):
+		if self.handle.closed:
+			return
+		self.flush()
+		self.handle.close()
+
+
+def column_dtype(value):
+	"""
+	:param value: first value (or all values) of a column
+	:return: float64 for numbers (bool, int, float), else the dtype of value
+	"""
+	dtype = np.asarray(value).dtype
+	return np.dtype(np.float64) if dtype.kind in 'biuf' else dtype
+
+
+class NpyStorage(Storage):
+	"""
+	Writes every row at once into one NpyColumn per key. Numeric columns are float64 (as the branches of the ROOT
+	backend), so an int as first value does not truncate the later ones; other columns keep the dtype of their first value.
+	"""
+	def __init__(self, filename, name, metadata=None, flush_rows=100):
+		"""
+		:param flush_rows: rewrite the headers every this many rows
+		"""
+		Storage.__init__(self, filename, name, metadata)
+		self.directory = filename + NPY_SUFFIX
+		if not os.path.isdir(self.directory):
+			os.makedirs(self.directory)
+		self.flush_rows = flush_rows
+		self.columns = None
+		self.nrows = 0
+
+	def write_metadata(self):
+		with open(os.path.join(self.directory, METADATA_FILENAME), 'w') as handle:
+			json.dump({'NAME': self.name, 'KEYS': sorted(self.columns.keys()) if self.columns else [], 'ROWS': self.nrows,
+				'METADATA': self.metadata}, handle, indent=1, sort_keys=True)
+
+	def append(self, row):
+		if self.columns is None:
+			self.columns = {key: NpyColumn(os.path.join(self.directory, key + NPY_SUFFIX), column_dtype(value)) for key, value in row.items()}
+			self.write_metadata()
+		elif len(row) != len(self.columns):
+			raise ValueError("row keys {0} do not match the columns {1}".format(sorted(row.keys()), sorted(self.columns.keys())))
+		for key, value in row.items():
+			self.columns[key].append(value)
+		self.nrows += 1
+		if self.nrows % self.flush_rows == 0:
+			self.flush()
+
+	def flush(self):
+		for column in (self.columns or {}).values():
+			column.flush()
+
+	def close(self):
+		for column in (self.columns or {}).values():
+			column.close()
+		self.write_metadata()
+		print "created npy columns from data ('" + self.directory + "')"
+
+
+Storages = {
+	'none': Storage,
+	'root': RootStorage,
+	'npy': NpyStorage
+}
+
+
+def last_values(keys):
+	"""
+	The loggers keep only the last row in RAM (data[key][-1]), all rows go to the storage.
+	:return: {'KEY': deque of length 1}
+	"""
+	return {key: deque(maxlen=1) for key in keys}
+
+
+def open_storage(kind, filename, name, metadata=None):
+	"""
+	:param kind: key of Storages
+	:return: Storage
+	"""
+	return Storages[kind](filename, name, metadata)
+
+
+def read_npy_column(filename, mmap=True):
+	"""
+	The length is taken from the file size, so columns of a logger which did not close its storage can be read, too.
+	:return: np.memmap (read-only) or np.array
+	"""
+	with open(filename, 'rb') as handle:
+		version = np.lib.format.read_magic(handle)
+		shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(handle) if version == (1, 0) else np.lib.format.read_array_header_2_0(handle)
+		offset = handle.tell()
+		n = (os.path.getsize(filename) - offset) // dtype.itemsize
+		if not mmap or n == 0:
+			return np.fromfile(handle, dtype=dtype, count=n)
+	return np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=(n,))
+
+
+def read_npy(directory, keys=None, mmap=True, time_window=None, time_key='TIME'):
+	"""
+	:param directory: written by NpyStorage (filename.npy)
+	:param keys: columns to read (default: all)
+	:param time_window: (t0, t1), only rows with t0 <= time_key <= t1, None for an open side (as ROOT_IO.read_tree)
+	:return: metadata {'NAME': ..., 'KEYS': ..., 'ROWS': ..., 'METADATA': {...}}, {'KEY': np.array}
+	"""
+	with open(os.path.join(directory, METADATA_FILENAME)) as handle:
+		metadata = json.load(handle)
+	keys = [str(key) for key in (metadata['KEYS'] if keys is None else keys)]
+	data = {key: read_npy_column(os.path.join(directory, key + NPY_SUFFIX), mmap) for key in keys}
+	# columns of a logger which did not close its storage can differ by the row being written
+	n = min([len(column) for column in data.values()]) if data else 0
+	data = {key: column[:n] for key, column in data.items()}
+	if not time_window is None:
+		t = read_npy_column(os.path.join(directory, time_key + NPY_SUFFIX), mmap)[:n]
+		selection = np.ones(n, dtype=bool)
+		if not time_window[0] is None: selection &= t >= time_window[0]
+		if not time_window[1] is None: selection &= t <= time_window[1]
+		data = {key: column[selection] for key, column in data.items()}
+	return metadata, data
+
+
+def write_npy(filename, name, data, metadata=None):
+	"""
+	Write whole columns like NpyStorage (e.g. a cut of read_npy).
+	:param data: {'KEY': np.array}, all of the same length
+	:return: directory (filename.npy)
+	"""
+	storage = NpyStorage(filename, name, metadata)
+	storage.columns = {key: NpyColumn(os.path.join(storage.directory, key + NPY_SUFFIX), column_dtype(values))
+		for key, values in data.items()}
+	for key, values in data.items():
+		storage.columns[key].append(values)
+	storage.nrows = min([len(values) for values in data.values()]) if data else 0
+	storage.close()
+	return storage.directory
+
+
+def is_npy(filename):
+	"""
+	:return: True if filename is a directory written by NpyStorage
+	"""
+	return os.path.isfile(os.path.join(filename, METADATA_FILENAME))
+
+
+def noise_data(data):
+	"""
+	:param data: {'KEY': np.array} of the noise loggers (tree/storage 'PowerBox_Characterize')
+	:return: {'n', 't', 'f', 'N', 'Nu', 'Vp', 'Vm', 'Vpu', 'Vmu', 'VpVm', 'VpuVmu'} (see ROOT_IO.read_root_noise)
+	"""
+	t, f, N, Nu = data["TIME"], data["FREQUENCY"], data["NOISE"], data["NOISE_STDDEV"]
+	Vp, Vm, Vpu, Vmu = data["Vp"], data["Vm"], data["Vp_STDDEV"], data["Vm_STDDEV"]
+	return {'n': len(t), 't': t, 'f': f, 'N': N, 'Nu': Nu, 'Vp': Vp, 'Vm': Vm, 'Vpu': Vpu, 'Vmu': Vmu,
+		'VpVm': Vp + Vm, 'VpuVmu': np.sqrt(Vpu**2 + Vmu**2)}
+
+
+def discharge_data(data):
+	"""
+	:param data: {'KEY': np.array} of PowerBox_Discharge
+	:return: {'n', 't', 'Vp', 'Vm', 'Vpu', 'Vmu', 'VpVm', 'VpuVmu'} (see ROOT_IO.read_root_discharge)
+	"""
+	t, Vp, Vm, Vpu, Vmu = data["TIME"], data["Vp"], data["Vm"], data["Vp_STDDEV"], data["Vm_STDDEV"]
+	return {'n': len(t), 't': t, 'Vp': Vp, 'Vm': Vm, 'Vpu': Vpu, 'Vmu': Vmu, 'VpVm': Vp + Vm, 'VpuVmu': np.sqrt(Vpu**2 + Vmu**2)}
+
+
+def read_npy_noise(directory, **kwargs):
+	"""
+	:param kwargs: mmap, time_window of read_npy
+	"""
+	return noise_data(read_npy(directory, ["TIME", "FREQUENCY", "NOISE", "NOISE_STDDEV", "Vp", "Vm", "Vp_STDDEV", "Vm_STDDEV"], **kwargs)[1])
+
+
+def read_npy_discharge(directory, **kwargs):
+	"""
+	:param kwargs: mmap, time_window of read_npy
+	"""
+	return discharge_data(read_npy(directory, ["TIME", "Vp", "Vm", "Vp_STDDEV", "Vm_STDDEV"], **kwargs)[1])
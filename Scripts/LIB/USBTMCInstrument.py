@@ -1,6 +1,7 @@
 __author__ = 'Christian Velten'
 
 from LIB.Exceptions import USBException, USBIOException
+from LIB.InstrumentBase import InstrumentBase
 
 import usbtmc
 from usb.core import USBError
@@ -24,10 +25,13 @@ queriesMeasuFull = ["TYPE", "SOURCE", "COUNT", "VALUE", "MEAN", "MINIMUM", "MAXI
 queriesChannelInfo = ["BANDWIDTH", "INVERT", "LABEL", "OFFSET", "POSITION", "SCALE", "TERMINATION", "YUNITS"]
 
 
-class USBTMCObject(object):
+class USBTMCObject(InstrumentBase):
 	vendorID, productID, serialNumber = None, None, None
+	# Tektronix: concatenated queries with different headers need a leading colon
+	query_separator = ';:'
 
 	def __init__(self, vendorID=None, productID=None, serialNumber=None, cstr="", term_character="\n", buffer=4*1024, timeout=10):
+		InstrumentBase.__init__(self)
 		self.s = None
 		self.timeout = timeout
 		self.vendorID = vendorID
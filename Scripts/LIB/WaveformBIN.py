@@ -0,0 +1,281 @@
+__author__ = 'Christian Velten'
+
+from datetime import datetime
+import gzip
+import numpy as np
+import os
+import re
+
+"""
+Container (version 1) written by RecordWaveformBIN.py and RunRecorder.py, all little-endian:
+	CONTAINER_HEADER   fixed size header, see below ('magic' is 'WVFM')
+	char[units_length] xunit + yunit
+	CHUNK_DTYPE[nchunks] min, max and mean (in volts) of every 'chunksize' points
+	D[n]               data at 'data_offset' (D = f4/f8 volts for precision 4/8, i2 digitizer levels for precision 2)
+
+Legacy records (version 0, RecordWaveformBIN.py --legacy, read by the C++ tools of FFT-LockIn):
+	i4[6]     date and time (Y, m, d, H, M, S)
+	u1        precision: 4 or 8 for data in volts as f4/f8, 2 for raw digitizer levels (i2)
+	u4        N
+	T[5]      xzero, xincr, yzero, yoffs, ymult (T = f4/f8 by precision, f8 for raw records)
+	char[]    xunit + yunit
+	D[N]      data
+"""
+MAGIC = 'WVFM'
+VERSION = 1
+CONTAINER_HEADER = np.dtype([
+	('magic', 'S4'), ('version', '<u2'), ('precision', 'u1'), ('reserved', 'u1'),
+	('time', '<i4', (7,)),  # Y, m, d, H, M, S, us
+	('n', '<u8'), ('xzero', '<f8'), ('xincr', '<f8'), ('yzero', '<f8'), ('yoffs', '<f8'), ('ymult', '<f8'),
+	('chunksize', '<u4'), ('nchunks', '<u4'), ('units_length', '<u2'), ('reserved2', '<u2', (3,)), ('data_offset', '<u8')
+])
+CHUNK_DTYPE = np.dtype([('min', '<f8'), ('max', '<f8'), ('mean', '<f8')])
+CHUNKSIZE = 65536
+
+PRECISION_RAW = 2
+HEADER_START = 29  # legacy: bytes before the floats (time, precision, N)
+FILEPREFIX = 'RecWvfm_'
+
+
+def header_dtype(precision):
+	return np.dtype('f8') if int(precision) == PRECISION_RAW else np.dtype('f' + str(precision))
+
+
+def data_dtype(precision):
+	return np.dtype('<i2') if int(precision) == PRECISION_RAW else np.dtype('<f' + str(precision))
+
+
+def scale(levels, yoffs, ymult, yzero, dtype=np.float64):
+	"""
+	:return: (levels - yoffs) * ymult + yzero as new array
+	"""
+	volts = np.array(levels, dtype=dtype)
+	volts -= yoffs
+	volts *= ymult
+	volts += yzero
+	return volts
+
+
+def chunk_statistics(data, chunksize=CHUNKSIZE):
+	"""
+	:param data: np.array
+	:return: np.array of CHUNK_DTYPE with min, max and mean of every chunk (in the units of data)
+	"""
+	n = len(data)
+	nfull, nchunks = n // chunksize, (n + chunksize - 1) // chunksize
+	table = np.empty(nchunks, dtype=CHUNK_DTYPE)
+	if nfull > 0:
+		full = data[:nfull * chunksize].reshape(nfull, chunksize)
+		table['min'][:nfull] = full.min(axis=1)
+		table['max'][:nfull] = full.max(axis=1)
+		table['mean'][:nfull] = full.mean(axis=1, dtype=np.float64)
+	if nchunks > nfull:
+		tail = data[nfull * chunksize:]
+		table[nfull] = (tail.min(), tail.max(), tail.mean(dtype=np.float64))
+	return table
+
+
+def write(handle, today, precision, data, xzero, xincr, yzero, yoffs, ymult, units, chunksize=CHUNKSIZE):
+	"""
+	Write a record as container.
+	:param handle: file or gzip handle
+	:param today: datetime of the record
+	:param precision: 2 for raw digitizer levels, 4 or 8 for volts as f4/f8
+	:param data: np.array (levels or volts)
+	:param units: xunit + yunit
+	"""
+	precision = int(precision)
+	data = np.ascontiguousarray(data, dtype=data_dtype(precision))
+	table = chunk_statistics(data, chunksize)
+	if precision == PRECISION_RAW:
+		lower, upper = scale(table['min'], yoffs, ymult, yzero), scale(table['max'], yoffs, ymult, yzero)
+		table['min'], table['max'] = np.minimum(lower, upper), np.maximum(lower, upper)
+		table['mean'] = scale(table['mean'], yoffs, ymult, yzero)
+	units = units.encode()
+
+	header = np.zeros(1, dtype=CONTAINER_HEADER)
+	header['magic'], header['version'], header['precision'] = MAGIC, VERSION, precision
+	header['time'] = [today.year, today.month, today.day, today.hour, today.minute, today.second, today.microsecond]
+	header['n'], header['chunksize'], header['nchunks'], header['units_length'] = len(data), chunksize, len(table), len(units)
+	header['xzero'], header['xincr'], header['yzero'], header['yoffs'], header['ymult'] = xzero, xincr, yzero, yoffs, ymult
+	header['data_offset'] = CONTAINER_HEADER.itemsize + len(units) + table.nbytes
+
+	handle.write(header.tostring())
+	handle.write(units)
+	handle.write(table.tostring())
+	handle.write(data.data)
+
+
+def write_legacy_header(handle, today, precision, n, xzero, xincr, yzero, yoffs, ymult, units):
+	"""
+	Write everything but the data in the legacy layout.
+	:param handle: file or gzip handle
+	:param today: datetime of the record
+	:param n: number of points
+	:param units: xunit + yunit
+	"""
+	handle.write(np.array([today.strftime('%Y,%m,%d,%H,%M,%S').split(',')], dtype=np.dtype('i4')).tostring())
+	handle.write(np.array([precision], dtype=np.dtype('u1')).tostring())
+	handle.write(np.array([n], dtype=np.dtype('u4')).tostring())
+	handle.write(np.array([xzero, xincr, yzero, yoffs, ymult], dtype=header_dtype(precision)).tostring())
+	handle.write(units.encode())
+
+
+class Waveform(object):
+	"""
+	One record, container or legacy layout. Uncompressed records are memory mapped, the data are only read where accessed.
+	Indexing returns volts: raw records are scaled on access, i.e. only the requested part is converted.
+	The chunk table of containers gives overviews and time windows without scanning the data.
+	"""
+	def __init__(self, filename, mmap=True):
+		self.filename = filename
+		self.version, self.chunksize, self.table = 0, None, None
+		compressed = filename.endswith('.gz')
+		mmap = mmap and not compressed
+		handle = gzip.open(filename, 'rb') if compressed else open(filename, 'rb')
+		try:
+			buf = handle.read(CONTAINER_HEADER.itemsize) if mmap else handle.read()
+			if buf[:4] == MAGIC:
+				buf = self.read_container(buf, handle)
+			else:
+				buf = self.read_legacy(buf, handle, os.path.getsize(filename) if mmap else len(buf))
+		finally:
+			handle.close()
+
+		if mmap:
+			self.raw = np.memmap(filename, dtype=self.dtype, mode='r', offset=self.offset, shape=(self.N,))
+		else:
+			self.raw = np.frombuffer(buf, dtype=self.dtype, count=self.N, offset=self.offset)
+
+	def read_container(self, buf, handle):
+		"""
+		:return: buf, extended to at least the data offset
+		"""
+		header = np.frombuffer(buf[:CONTAINER_HEADER.itemsize], dtype=CONTAINER_HEADER)[0]
+		if header['version'] > VERSION:
+			raise ValueError("{0}: container version {1} is not supported".format(self.filename, header['version']))
+		self.version, self.precision, self.N = int(header['version']), int(header['precision']), int(header['n'])
+		self.time = datetime(*[int(v) for v in header['time']])
+		self.xzero, self.xincr, self.yzero, self.yoffs, self.ymult = [float(header[key]) for key in ['xzero', 'xincr', 'yzero', 'yoffs', 'ymult']]
+		self.dtype, self.offset, self.chunksize = data_dtype(self.precision), int(header['data_offset']), int(header['chunksize'])
+		if len(buf) < self.offset:
+			buf += handle.read(self.offset - len(buf))
+		units_end = CONTAINER_HEADER.itemsize + int(header['units_length'])
+		self.units = buf[CONTAINER_HEADER.itemsize:units_end]
+		self.table = np.frombuffer(buf, dtype=CHUNK_DTYPE, count=int(header['nchunks']), offset=units_end).copy()
+		return buf
+
+	def read_legacy(self, buf, handle, size):
+		"""
+		:param size: size of the (uncompressed) file
+		:return: buf, extended to at least the data offset
+		"""
+		self.time = datetime(*[int(v) for v in np.frombuffer(buf[:24], dtype=np.dtype('i4'))])
+		self.precision = int(np.frombuffer(buf[24:25], dtype=np.dtype('u1'))[0])
+		self.N = int(np.frombuffer(buf[25:HEADER_START], dtype=np.dtype('u4'))[0])
+		hdtype, self.dtype = header_dtype(self.precision), data_dtype(self.precision)
+		units_start = HEADER_START + 5 * hdtype.itemsize
+		# the units have no length field, the data fill the end of the file
+		self.offset = size - self.N * self.dtype.itemsize
+		if len(buf) < self.offset:
+			buf += handle.read(self.offset - len(buf))
+		self.xzero, self.xincr, self.yzero, self.yoffs, self.ymult = [float(v) for v in np.frombuffer(buf[HEADER_START:units_start], dtype=hdtype)]
+		self.units = buf[units_start:self.offset]
+		return buf
+
+	def header(self):
+		return {'TIME': self.time, 'VERSION': self.version, 'PRECISION': self.precision, 'N': self.N, 'XZERO': self.xzero,
+			'XINCR': self.xincr, 'YZERO': self.yzero, 'YOFFS': self.yoffs, 'YMULT': self.ymult, 'UNITS': self.units,
+			'CHUNKSIZE': self.chunksize}
+
+	def close(self):
+		"""
+		Release the memory map (or buffer) of the data.
+		"""
+		self.raw = None
+
+	def is_raw(self):
+		return self.precision == PRECISION_RAW
+
+	def __len__(self):
+		return self.N
+
+	def __getitem__(self, key):
+		return self.scale(self.raw[key])
+
+	def scale(self, levels, dtype=np.float64):
+		"""
+		:param levels: part of self.raw
+		:return: volts, levels itself if the record is not raw
+		"""
+		if not self.is_raw():
+			return levels
+		return scale(levels, self.yoffs, self.ymult, self.yzero, dtype)
+
+	def volts(self):
+		return self[:]
+
+	def times(self, key=slice(None)):
+		"""
+		:return: time axis of self[key]
+		"""
+		index = np.arange(*key.indices(self.N), dtype=np.float64) if isinstance(key, slice) else np.asarray(key, dtype=np.float64)
+		return self.xzero + self.xincr * index
+
+	def index(self, t):
+		"""
+		:return: index of the first point at or after time t, clipped to [0, N]
+		"""
+		# rounded first: t on a sample must not give the next one (float32 XINCR of legacy headers)
+		return int(min(max(np.ceil(round((t - self.xzero) / self.xincr, 6)), 0), self.N))
+
+	def window(self, t0, t1):
+		"""
+		Only the points between t0 and t1 are read (and scaled).
+		:return: (times, volts)
+		"""
+		key = slice(self.index(t0), self.index(t1))
+		return self.times(key), self[key]
+
+	def overview(self, chunksize=CHUNKSIZE):
+		"""
+		Envelope of the record, e.g. for plots. Containers use their chunk table (and chunk size),
+		for legacy records it is computed chunk by chunk.
+		:return: (start time of every chunk, min, max, mean)
+		"""
+		table = self.table
+		if table is None:
+			table = np.empty(0, dtype=CHUNK_DTYPE) if self.N == 0 else np.concatenate([chunk_statistics(volts, chunksize) for volts in self.chunks(chunksize)])
+		else:
+			chunksize = self.chunksize
+		return self.times(slice(0, self.N, chunksize)), table['min'], table['max'], table['mean']
+
+	def chunks(self, size=1000000):
+		"""
+		Iterate over the record in scaled chunks of 'size' points.
+		"""
+		for start in range(0, self.N, size):
+			yield self[start:start + size]
+
+
+def get_filenames(directory, day=None, prefix=FILEPREFIX):
+	"""
+	:param day: datetime.date or 'YYYY-MM-DD' to select the records of one day, None for all
+	:return: filenames of the records (RecWvfm_YYYY-MM-DD_NNNN.bin[.gz]) in directory, sorted by day and number
+		(the number is not limited to four digits, 10000 follows 9999)
+	"""
+	if not day is None and not isinstance(day, str):
+		day = day.strftime('%Y-%m-%d')
+	pattern = re.compile(re.escape(prefix) + '(' + (re.escape(day) if day else r'\d{4}-\d{2}-\d{2}') + r')_(\d+)\.bin(\.gz)?$')
+	matches = [(match.group(1), int(match.group(2)), f) for match, f in ((pattern.match(f), f) for f in os.listdir(directory)) if match]
+	return [os.path.join(directory, match[2]) for match in sorted(matches)]
+
+
+def records(directory, day=None, prefix=FILEPREFIX, mmap=True):
+	"""
+	Iterate over the records of a directory in the order they were taken.
+	Every record is only opened (mapped) when it is reached.
+	:return: generator of Waveform
+	"""
+	for filename in get_filenames(directory, day, prefix):
+		yield Waveform(filename, mmap)
@@ -0,0 +1,166 @@
+__author__ = 'Christian Velten'
+
+from collections import namedtuple, OrderedDict
+import numpy as np
+import threading
+
+"""
+Window functions of FFT-LockIn/CVcommon/Windows.h (same names, values and ideal overlaps), computed vectorised:
+	w_i = f(i, N), i = 0..N-1 (periodic windows, as the C++ code)
+	S1 = sum(w), S2 = sum(w**2), NENBW = N * S2 / S1**2, ENBW = NENBW * fr
+Unknown names give the rectangular window, like Windows<T>::ParseWindowType.
+
+get_window memoises the windows with S1, S2, NENBW and ENBW by (name, N, dtype) in an LRU cache bounded by the number
+of entries and their bytes (windows larger than the byte limit are computed, but not kept). The cached values are
+read-only and shared by all callers (SegmentedFFT, SoftwareLockIn), so sweeps over many records of the same length
+compute every window once.
+"""
+RECTANGULAR = 'RECTANGULAR'
+# cosine sums: w = sum_k a_k cos(k z), z = 2 pi i / N
+COSINE_COEFFICIENTS = {
+	'HANNING': [0.5, -0.5],
+	'HAMMING': [0.54, -0.46],
+	'NUTTALL3': [0.375, -0.5, 0.125],
+	'NUTTALL3A': [0.40897, -0.5, 0.09103],
+	'NUTTALL3B': [0.4243801, -0.4973406, 0.0782793],
+	'NUTTALL4': [0.3125, -0.46875, 0.1875, -0.03125],
+	'NUTTALL4A': [0.338946, -0.481973, 0.161054, -0.018027],
+	'NUTTALL4B': [0.355768, -0.487396, 0.144232, -0.012604],
+	'NUTTALL4C': [0.3635819, -0.4891775, 0.1365995, -0.0106411],
+	'HFT116D': [1., -1.9575375, 1.4780705, -0.6367431, 0.1228389, -0.0066288],
+	'HFT248D': [1., -1.985844164102, 1.791176438506, -1.282075284005, 0.667777530266, -0.240160796576,
+		0.056656381764, -0.008134974479, 0.000624544650, -0.000019808998, 0.000000132974]
+}
+KAISER_ALPHA = {'KAISER{0:d}'.format(int(10 * alpha)): alpha for alpha in np.arange(2., 7.01, 0.5)}
+IDEAL_OVERLAP = {
+	'BARTLETT': 0.5, 'WELCH': 0.293, 'HANNING': 0.5, 'HAMMING': 0.5,
+	'NUTTALL3': 0.647, 'NUTTALL3A': 0.612, 'NUTTALL3B': 0.598,
+	'NUTTALL4': 0.705, 'NUTTALL4A': 0.68, 'NUTTALL4B': 0.663, 'NUTTALL4C': 0.656,
+	'KAISER20': 0.534, 'KAISER25': 0.583, 'KAISER30': 0.619, 'KAISER35': 0.647, 'KAISER40': 0.67, 'KAISER45': 0.689,
+	'KAISER50': 0.705, 'KAISER55': 0.719, 'KAISER60': 0.731, 'KAISER65': 0.741, 'KAISER70': 0.751,
+	'HFT116D': 0.782, 'HFT248D': 0.841, RECTANGULAR: 0.
+}
+WINDOW_TYPES = sorted(IDEAL_OVERLAP.keys())
+CACHE_ENTRIES = 32
+CACHE_BYTES = 256 * 1024**2
+
+# values: read-only np.array, ENBW in units of fs (NENBW / N, times fs gives Hz)
+Window = namedtuple('Window', ['values', 'S1', 'S2', 'NENBW', 'ENBW'])
+
+
+def parse_window_type(window):
+	"""
+	:return: upper case name of the window, RECTANGULAR if unknown
+	"""
+	window = str(window).upper()
+	return window if window in IDEAL_OVERLAP else RECTANGULAR
+
+
+def ideal_overlap(window):
+	return IDEAL_OVERLAP[parse_window_type(window)]
+
+
+def window_values(window, N, dtype=np.float64, start=0, stop=None):
+	"""
+	:param window: name of the window (see WINDOW_TYPES)
+	:param N: length
+	:param start, stop: only compute the values start..stop-1 (default: all N)
+	:return: np.array of the window values
+	"""
+	window = parse_window_type(window)
+	i = np.arange(start, N if stop is None else stop, dtype=np.float64)
+	if window in COSINE_COEFFICIENTS:
+		z = 2. * np.pi / N * i
+		w = np.zeros(len(i))
+		for k, a in enumerate(COSINE_COEFFICIENTS[window]):
+			w += a * np.cos(k * z)
+	elif window in KAISER_ALPHA:
+		z = 2. / N * i - 1.
+		alpha = KAISER_ALPHA[window]
+		w = np.i0(np.pi * alpha * np.sqrt(1. - z * z)).reshape(len(i)) / np.i0(np.pi * alpha)  # i0 squeezes single values
+	elif window == 'BARTLETT':
+		z = 2. / N * i
+		w = np.where(z <= 1., z, 2. - z)
+	elif window == 'WELCH':
+		z = 2. / N * i - 1.
+		w = 1. - z * z
+	else:
+		w = np.ones(len(i))
+	return w.astype(dtype, copy=False)
+
+
+def compute_window(window, N, dtype=np.float64):
+	"""
+	:return: Window (not cached, sums in double precision)
+	"""
+	w = window_values(window, N, dtype)
+	w64 = w.astype(np.float64, copy=False)
+	S1, S2 = float(np.sum(w64)), float(np.dot(w64, w64))
+	NENBW = noise_bandwidth(N, S1, S2)[0]
+	w.flags.writeable = False
+	return Window(w, S1, S2, NENBW, NENBW / N)
+
+
+class WindowCache(object):
+	"""
+	LRU cache of Window by (name, N, dtype), bounded by entries and bytes, thread-safe (recorder workers).
+	"""
+	def __init__(self, entries=CACHE_ENTRIES, nbytes=CACHE_BYTES):
+		self.entries, self.nbytes = entries, nbytes
+		self.windows = OrderedDict()
+		self.size = 0
+		self.hits, self.misses = 0, 0
+		self.lock = threading.Lock()
+
+	def get(self, window, N, dtype=np.float64):
+		key = (parse_window_type(window), int(N), np.dtype(dtype).str)
+		with self.lock:
+			entry = self.windows.pop(key, None)
+			if entry is not None:
+				self.windows[key] = entry
+				self.hits += 1
+				return entry
+			self.misses += 1
+		entry = compute_window(key[0], key[1], key[2])
+		if entry.values.nbytes <= self.nbytes:
+			with self.lock:
+				if key not in self.windows:
+					self.windows[key] = entry
+					self.size += entry.values.nbytes
+				while len(self.windows) > self.entries or self.size > self.nbytes:
+					self.size -= self.windows.popitem(last=False)[1].values.nbytes
+		return entry
+
+	def clear(self):
+		with self.lock:
+			self.windows.clear()
+			self.size = 0
+
+	def info(self):
+		return {'ENTRIES': len(self.windows), 'BYTES': self.size, 'HITS': self.hits, 'MISSES': self.misses}
+
+
+cache = WindowCache()
+
+
+def get_window(window, N, dtype=np.float64):
+	"""
+	:return: Window of the shared cache, the values must not be modified (read-only)
+	"""
+	return cache.get(window, N, dtype)
+
+
+def calculate_window(window, N, dtype=np.float64):
+	"""
+	:return: w (read-only), S1, S2 (cached, see get_window)
+	"""
+	entry = get_window(window, N, dtype)
+	return entry.values, entry.S1, entry.S2
+
+
+def noise_bandwidth(N, S1, S2, fr=1.):
+	"""
+	:return: NENBW [bins], ENBW [Hz]
+	"""
+	NENBW = N * S2 / (S1 * S1)
+	return NENBW, NENBW * fr
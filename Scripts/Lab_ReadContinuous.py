@@ -7,9 +7,10 @@ HAS_ROOT_LIB = True
 import LIB.Exceptions
 import LIB.File
 import LIB.Compression
-from LIB.USBTMCInstrument import USBTMCObject, USBInstruments
+import LIB.InstrumentManager as InstrumentManager
 import LIB.OsciUSB as OsciUSB
 from LIB.GPIOSensor import GPIOSensor, GPIOSensors
+import LIB.Storage
 try: import LIB.ROOT_IO
 except ImportError: HAS_ROOT_LIB = False
 
@@ -36,6 +37,8 @@ parser.add_argument("--samples", help="how many samples should be acquired when
 parser.add_argument("--pattern", help="filename pattern")
 parser.add_argument("--stepsleep", type=float, help="sleep how long (minimum/offset) after setting a new frequency", default=1.0)
 parser.add_argument("--compress", help="compress data files after they have been written", action="store_true")
+parser.add_argument("--storage", help="binary storage besides the text file: root, npy (memory mappable columns, no ROOT needed) or none (default: root if PyROOT is available, else npy)",
+	choices=sorted(LIB.Storage.Storages.keys()), default='root' if HAS_ROOT_LIB else 'npy')
 # parse
 args = parser.parse_args()
 if args.log:
@@ -82,13 +85,10 @@ def signal_SIGTERM_handler(signal, frame):
 
 def get_osci_mean_data(instrument):
 	instrument.cmd("*WAI")
-	ch1 = float(instrument.cmd_and_return("MEASUREMENT:MEAS1:MEAN?").strip().replace('"', ''))
-	ch1u = float(instrument.cmd_and_return("MEASUREMENT:MEAS1:STDDEV?").strip().replace('"', ''))
-	ch2 = float(instrument.cmd_and_return("MEASUREMENT:MEAS2:MEAN?").strip().replace('"', ''))
-	ch2u = float(instrument.cmd_and_return("MEASUREMENT:MEAS2:STDDEV?").strip().replace('"', ''))
-	ch3 = float(instrument.cmd_and_return("MEASUREMENT:MEAS3:MEAN?").strip().replace('"', ''))
-	ch3u = float(instrument.cmd_and_return("MEASUREMENT:MEAS3:STDDEV?").strip().replace('"', ''))
-	return {'CH1': ch1, 'CH1u': ch1u, 'CH2': ch2, 'CH2u': ch2u, 'CH3': ch3, 'CH3u': ch3u}
+	r = instrument.ask_many(["MEAS1:MEAN", "MEAS1:STDDEV", "MEAS2:MEAN", "MEAS2:STDDEV", "MEAS3:MEAN", "MEAS3:STDDEV"], prefix="MEASUREMENT:")
+	return {'CH1': float(r["MEAS1:MEAN"]), 'CH1u': float(r["MEAS1:STDDEV"]),
+		'CH2': float(r["MEAS2:MEAN"]), 'CH2u': float(r["MEAS2:STDDEV"]),
+		'CH3': float(r["MEAS3:MEAN"]), 'CH3u': float(r["MEAS3:STDDEV"])}
 
 
 def get_battery_status():
@@ -124,10 +124,12 @@ if args.stepsleep and args.stepsleep >= 0:
 """
 	Initialize oscilloscope for battery measurement
 """
+manager = InstrumentManager.InstrumentManager()
+manager.register('OSCI', InstrumentManager.usbtmc('LABOR'))
 while True:
 	try:
 		print "\n", "initializing USB instrument..."
-		sOsci = USBTMCObject(USBInstruments['LABOR']['vendorID'], USBInstruments['LABOR']['productID'], USBInstruments['LABOR']['serialNo'])
+		sOsci = manager.open('OSCI')
 		print "\tInstrument: " + str(sOsci.cmd_and_return("*IDN?"))
 		OsciUSB.setup_acquire(sOsci, mode=args.acquire, num=args.samples)
 		OsciUSB.setup_measurement_mean(sOsci, channels=[1, 2, 3], statistics=True, statistics_samples=10)
@@ -192,18 +194,12 @@ while not SIGTERM:
 	handle.write("#TIMESTAMP==" + strftime + '\n')
 	handle.write("#Keys==TIME\tUp\tUpu\tUm\tUmu\tCH1\tCH1u\tCH2\tCH2u\tCH3\tCH3u\tTC\tTCu" + '\n')
 
+	storage = LIB.Storage.open_storage(args.storage, data_directory + filename, "Lab_ReadContinuous", {'TIMESTAMP': strftime})
+
 	"""
-	DATA STORAGE IN RAM
+	DATA STORAGE IN RAM: only the last row, the rows are written by the storage
 	"""
-	data = {
-		'TIME': [], 'TIME_OFFSET': [],
-		'CH1': [], 'CH1u': [],
-		'CH2': [], 'CH2u': [],
-		'CH3': [], 'CH3u': [],
-		'Up': [], 'Upu': [],
-		'Um': [], 'Umu': [],
-		'TC': [], 'TCu': []
-	}
+	data = LIB.Storage.last_values(['TIME', 'TIME_OFFSET', 'CH1', 'CH1u', 'CH2', 'CH2u', 'CH3', 'CH3u', 'Up', 'Upu', 'Um', 'Umu', 'TC', 'TCu'])
 
 	while not SIGTERM:
 		try:
@@ -215,10 +211,11 @@ while not SIGTERM:
 			meas_time = int((meas_time_stop+meas_time_start)/2.-starttime)
 
 			data['TIME'].append(meas_time)
-			data['TIME'].append(time.time())
+			data['TIME_OFFSET'].append(time.time())
 			for key in data_Osci.keys(): data[key].append(data_Osci[key])
 			for key in data_Batt.keys(): data[key].append(data_Batt[key])
 			for key in data_Temp.keys(): data[key].append(data_Temp[key])
+			storage.append({key: data[key][-1] for key in data.keys()})
 
 			handle.write("{_t}".format(_t=meas_time))
 			handle.write("\t{Up}\t{Upu}\t{Um}\t{Umu}".format(Up=data['Up'][-1], Upu=data['Upu'][-1], Um=data['Um'][-1], Umu=data['Umu'][-1]))
@@ -243,10 +240,9 @@ while not SIGTERM:
 				handle.flush()
 				os.fsync(handle.fileno())
 			time.sleep(args.stepsleep)
-		except LIB.Exceptions.USBException:
-			logger.error("(USBError): trying to reconnect to our devices if necessary...")
-			if not sOsci.is_open():
-				sOsci.connect()
+		except (LIB.Exceptions.USBException, LIB.Exceptions.InstrumentUnavailable):
+			logger.error("(USBError): waiting for the oscilloscope to be reconnected...")
+			manager.wait('OSCI', args.stepsleep)
 			continue
 		except KeyboardInterrupt:
 			SIGTERM = True
@@ -264,10 +260,8 @@ while not SIGTERM:
 		print "wrote data to '" + data_directory + filename + ".gz'"
 	else:
 		print "wrote data to '" + data_directory + filename + "'"
-	# If ROOT libraries have been loaded -> create a root file with tree
-	if HAS_ROOT_LIB:
-		LIB.ROOT_IO.ROOT_IO.write_data(data_directory + filename, "Lab_ReadContinuous", data)
-		print "created ROOT file from data ('" + data_directory + filename + ".root')"
+	# Binary storage of the data (e.g. the ROOT tree)
+	storage.close()
 #end while-not-SIGTERM
 #
 logger.info("#### END OF PROGRAM ####")
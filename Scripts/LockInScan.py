@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+__author__ = 'Christian Velten'
+
+import LIB.SoftwareLockIn
+import LIB.WaveformBIN
+
+import argparse
+import os
+import sys
+import time
+
+parser = argparse.ArgumentParser(description="Python script to scan waveform records (RecWvfm_*.bin[.gz]) with a software lock-in "
+	"over a range of frequencies. Writes the .bin.lock files (f, Ravg, phase) of the C++ LockIn-Scan.")
+parser.add_argument("files", nargs='+', help="records to process")
+parser.add_argument("--fs", type=float, help="sampling frequency in Hz (default: 1/XINCR of the record)")
+parser.add_argument("--low", type=float, help="lowest lock-in frequency in Hz (default: fs/N)")
+parser.add_argument("--high", type=float, help="highest lock-in frequency in Hz (default: fs/2)")
+parser.add_argument("--resolution", type=float, help="step of the lock-in frequencies in Hz (default: 100 fs/2N)")
+parser.add_argument("--crop", type=int, help="average this many points before the scan (default 1)", default=1)
+parser.add_argument("--ft", type=float, help="transmission frequency of the low-pass filter in Hz (default {0})".format(LIB.SoftwareLockIn.FTRANS_SCAN),
+	default=LIB.SoftwareLockIn.FTRANS_SCAN)
+parser.add_argument("--double", help="write the output as f8 instead of f4", action="store_true")
+args = parser.parse_args()
+
+dtype = '<f8' if args.double else LIB.SoftwareLockIn.LOCK_DTYPE
+for filename in args.files:
+	if not os.path.isfile(filename):
+		print "File does not exist: '" + filename + "'"
+		sys.exit(1)
+	start = time.time()
+	record = LIB.WaveformBIN.Waveform(filename)
+	frequencies, R, phase = LIB.SoftwareLockIn.scan_waveform(record, args.fs, args.low, args.high, args.resolution, max(args.crop, 1), args.ft)
+	record.close()
+	ofile = LIB.SoftwareLockIn.write_lock(LIB.SoftwareLockIn.lock_filename(filename[:-3] if filename.endswith('.gz') else filename), frequencies, R, phase, dtype)
+	print "scanned {0} frequencies from {1} Hz to {2} Hz in {3:.1f} s, wrote '{4}'".format(len(frequencies), frequencies[0], frequencies[-1], time.time() - start, ofile)
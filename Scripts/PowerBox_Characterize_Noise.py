@@ -7,9 +7,10 @@ import LIB.Exceptions
 import LIB.File
 import LIB.Compression
 from LIB.LockInNoise import LockInNoise
-from LIB.USBTMCInstrument import USBTMCObject, USBInstruments
-from LIB.SocketInstrument import SocketObject, SocketInstruments
+import LIB.InstrumentManager as InstrumentManager
 import LIB.OsciUSB as OsciUSB
+import LIB.ParallelAcquisition as ParallelAcquisition
+import LIB.Storage
 try: import LIB.ROOT_IO
 except ImportError: HAS_ROOT_LIB = False
 
@@ -41,6 +42,10 @@ parser.add_argument("--beginPower", type=int, help="begin at which power of 10 (
 parser.add_argument("--endPower", type=int, help="end at which power of 10 (default 5, must be <=6)", default=5, choices=xrange(0, 7))
 parser.add_argument("--stepsleep", type=float, help="sleep how long (minimum/offset) after setting a new frequency", default=1.0)
 parser.add_argument("--compress", help="compress data files after they have been written", action="store_true")
+parser.add_argument("--storage", help="binary storage besides the text file: root, npy (memory mappable columns, no ROOT needed) or none (default: root if PyROOT is available, else npy)",
+	choices=sorted(LIB.Storage.Storages.keys()), default='root' if HAS_ROOT_LIB else 'npy')
+parser.add_argument("--settlefactor", type=float, help="wait this many time constants after a frequency step (default: settle time of the filter slope)")
+parser.add_argument("--transfer", help="lock-in buffer transfer mode (binary transfers fall back to ASCII)", choices=LockInNoise.transfer_modes, default='ASCII')
 # parse
 args = parser.parse_args()
 if args.log:
@@ -86,8 +91,9 @@ def get_osci_mean_data(instrument, samples=10):
 	meanVp, meanVm = np.empty(samples), np.empty(samples)
 	instrument.cmd("*WAI")
 	while count < samples:
-		meanVp[count] = float(instrument.cmd_and_return("MEASU:MEAS1:VAL?").strip().replace('"', ''))
-		meanVm[count] = float(instrument.cmd_and_return("MEASU:MEAS2:VAL?").strip().replace('"', ''))
+		r = instrument.ask_many(["MEAS1:VAL", "MEAS2:VAL"], prefix="MEASU:")
+		meanVp[count] = float(r["MEAS1:VAL"])
+		meanVm[count] = float(r["MEAS2:VAL"])
 		count += 1
 	return {'Vp': np.mean(meanVp), 'Vm': np.mean(meanVm), 'Vp_STDDEV': np.std(meanVp), 'Vm_STDDEV': np.std(meanVm)}
 
@@ -137,7 +143,7 @@ filename_pattern_begin = 'PowerBox_Characterization_'
 frequencies_list = np.logspace(frequencies_beginPower, frequencies_endPower, frequencies_number)
 
 lock_in_time_constant = 10E-3
-lock_in_sleeping_factor = 100  #80
+lock_in_sleeping_factor = None  # None: settle time from filter slope and time constant
 if args.timeconstant:
 	try:
 		LockInNoise.get_index(LockInNoise.index2timeconstant, args.timeconstant)
@@ -158,6 +164,8 @@ sleep_time_frequency_step = 1.0  # seconds
 """ ARGPARSE """
 if args.stepsleep and args.stepsleep >= 0:
 	sleep_time_frequency_step = args.stepsleep
+if args.settlefactor and args.settlefactor > 0:
+	lock_in_sleeping_factor = args.settlefactor
 
 logger.info("nfreq = " + str(frequencies_number))
 logger.info("beginPower = " + str(frequencies_beginPower))
@@ -167,10 +175,14 @@ logger.info("endPower = " + str(frequencies_endPower))
 """
 	Initialize oscilloscope for battery measurement
 """
+manager = InstrumentManager.InstrumentManager()
+manager.register('OSCI', InstrumentManager.usbtmc('HALLE'))
+manager.register('FUNCGEN', InstrumentManager.socket('DS345_Fred'))
+manager.register('LOCKIN', InstrumentManager.socket('SR830_Michi'))
 while True:
 	try:
 		print "\n", "initializing USB instrument..."
-		sOsci = USBTMCObject(USBInstruments['HALLE']['vendorID'], USBInstruments['HALLE']['productID'], USBInstruments['HALLE']['serialNo'])
+		sOsci = manager.open('OSCI')
 		print "\tInstrument: " + str(sOsci.cmd_and_return("*IDN?"))
 		OsciUSB.setup_measurement_mean(sOsci, channels=[1, 2], statistics=False, statistics_samples=-1)
 		print ""
@@ -186,7 +198,7 @@ while True:
 while args.external:
 	try:
 		print "\n", "initializing FUNC-GEN via socket..."
-		sFuncGen = SocketObject(SocketInstruments['DS345_Fred']['IP'], SocketInstruments['DS345_Fred']['PORT'])
+		sFuncGen = manager.open('FUNCGEN')
 		print "\tInstrument: " + str(sFuncGen.cmd_and_return("*IDN?"))
 		sFuncGen.cmd("OFFS 0.0")
 		sFuncGen.cmd("FREQ " + str(frequencies_list[0]))
@@ -204,11 +216,11 @@ while args.external:
 while True:
 	try:
 		print "\n", "initializing LOCK-IN via socket..."
-		sLockIn = SocketObject(SocketInstruments['SR830_Michi']['IP'], SocketInstruments['SR830_Michi']['PORT'])
+		sLockIn = manager.open('LOCKIN')
 		print "\tInstrument: " + str(sLockIn.cmd_and_return("*IDN?"))
 		sLockIn.cmd_and_return("SENS?")
 		#
-		LockInNoiseObj = LockInNoise(sLockIn, external=True if args.external else False)  # NEW
+		LockInNoiseObj = LockInNoise(sLockIn, external=True if args.external else False, transfer=args.transfer)  # NEW
 		LockInNoiseObj.set_input('A')
 		LockInNoiseObj.set_time_constant(lock_in_time_constant)
 		LockInNoiseObj.set_gain(lock_in_gain)
@@ -246,13 +258,8 @@ while not SIGTERM:
 	"""
 	CREATE A NEW FILE WITH INCREASING FILE COUNT
 	"""
-	i = 1
-	while True:
-		files = [True for f in os.listdir(data_directory) if re.match(r'' + filename_pattern_begin+("%0*d" % (4, i)) + '.*', f)]
-		if len(files) == 0:
-			break
-		i += 1
-	filename = filename_pattern_begin + ("%0*d" % (4, i)) + '.dat'
+	# the noise loggers share directory and prefix: locked on-disk counter
+	filename = LIB.File.get_filename_filecount(data_directory, filename_pattern_begin, index=True)
 
 	handle = open(data_directory + filename, 'w')
 	logger.info("File opened: '" + data_directory + filename + "'")
@@ -263,7 +270,8 @@ while not SIGTERM:
 	try:
 		handle.write("#Osci_CH1==" + OsciUSB.dict2string(OsciUSB.get_values_channel(sOsci, 1, OsciUSB.queriesChannelInfo)) + '\n')
 		handle.write("#Osci_CH2==" + OsciUSB.dict2string(OsciUSB.get_values_channel(sOsci, 2, OsciUSB.queriesChannelInfo)) + '\n')
-	except LIB.Exceptions.USBException:
+	except (LIB.Exceptions.USBException, LIB.Exceptions.InstrumentUnavailable):
+		manager.wait('OSCI', sleep_time_frequency_step)
 		handle.close()
 		os.remove(data_directory + filename)
 		continue
@@ -278,7 +286,8 @@ while not SIGTERM:
 		handle.write("ACCOUPLING:" + str(LockInNoiseObj.get_input_coupling_ac()) + "\t")
 		handle.write("FILTER:" + str(LockInNoiseObj.get_filter()) + "\t")
 		handle.write("\n")
-	except LIB.Exceptions.SocketException:
+	except (LIB.Exceptions.SocketException, LIB.Exceptions.InstrumentUnavailable):
+		manager.wait('LOCKIN', sleep_time_frequency_step)
 		handle.close()
 		os.remove(data_directory + filename)
 		continue
@@ -292,15 +301,12 @@ while not SIGTERM:
 	else:
 		handle.write("#Keys==TIME\tFREQUENCY\tPowerBox_Vp_MEAN\tPowerBox_Vp_STDDEV\tPowerBox_Vm_MEAN\tPowerBox_Vm_STDDEV\tNOISE\tNOISE_STDDEV\n")
 
+	storage = LIB.Storage.open_storage(args.storage, data_directory + filename, "PowerBox_Characterize", {'TIMESTAMP': strftime})
+
 	"""
-	DATA STORAGE IN RAM
+	DATA STORAGE IN RAM: only the last row, the rows are written by the storage
 	"""
-	data = {
-		'TIME': [], 'FREQUENCY': [],
-		'Vp': [], 'Vm': [], 'Vp_STDDEV': [], 'Vm_STDDEV': [],
-		'XNOISE': [], 'YNOISE': [], 'XNOISE_STDDEV': [], 'YNOISE_STDDEV': [],
-		'NOISE': [], 'NOISE_STDDEV': []
-	}
+	data = LIB.Storage.last_values(['TIME', 'FREQUENCY', 'Vp', 'Vm', 'Vp_STDDEV', 'Vm_STDDEV', 'XNOISE', 'YNOISE', 'XNOISE_STDDEV', 'YNOISE_STDDEV', 'NOISE', 'NOISE_STDDEV'])
 
 	number_of_points = 1000
 
@@ -315,10 +321,12 @@ while not SIGTERM:
 				sFuncGen.cmd("FREQ {_f}".format(_f=freq))
 				time.sleep(sleep_time_frequency_step + 2./freq)
 			
-			meas_time_start = time.time()
-			data_LockIn = LockInNoiseObj.acquire(freq, npoints=number_of_points, sleep=lock_in_sleeping_factor*lock_in_time_constant)
-			data_PowerBox = get_osci_mean_data(sOsci, samples=20)
-			meas_time_stop = time.time()
+			# read the battery status from the oscilloscope while the lock-in buffer fills
+			records = ParallelAcquisition.acquire_parallel({
+				'LockIn': (LockInNoiseObj.acquire, (freq,), {'npoints': number_of_points, 'sleep': lock_in_sleeping_factor*lock_in_time_constant if lock_in_sleeping_factor else None}),
+				'PowerBox': (get_osci_mean_data, (sOsci,), {'samples': 20})})
+			data_LockIn, data_PowerBox = records['LockIn']['DATA'], records['PowerBox']['DATA']
+			meas_time_start, meas_time_stop = records['TIME_START'], records['TIME_STOP']
 			meas_time = int((meas_time_stop+meas_time_start)/2.-starttime)
 
 			noise_tuple = LockInNoise.calculate_noise(data_LockIn['X'], data_LockIn['Y'])
@@ -330,6 +338,7 @@ while not SIGTERM:
 			data['FREQUENCY'].append(freq)
 			for key in data_PowerBox.keys(): data[key].append(data_PowerBox[key])
 			for key in data_Noise.keys(): data[key].append(data_Noise[key])
+			storage.append({key: data[key][-1] for key in data.keys()})
 
 			handle.write("{_t}\t{_f}\t".format(_t=meas_time, _f=frequencies_list[_count]))
 			handle.write("{_PowerVp}\t{_PowerVp_STDDEV}\t{_PowerVm}\t{_PowerVm_STDDEV}\t".format(_PowerVp=data_PowerBox['Vp'],
@@ -357,14 +366,10 @@ while not SIGTERM:
 						1E+3*data_Noise['NOISE'], 1E+3*data_Noise['NOISE_STDDEV'])
 				handle.flush()
 				os.fsync(handle.fileno())
-		except (LIB.Exceptions.SocketException, LIB.Exceptions.USBException):
-			logger.error("(socket.error, USBError): trying to reconnect to our devices if necessary...")
-			if args.external and not sFuncGen.is_open():
-				sFuncGen.connect()
-			if not sLockIn.is_open():
-				sLockIn.connect()
-			if not sOsci.is_open():
-				sOsci.connect()
+		except (LIB.Exceptions.SocketException, LIB.Exceptions.USBException, LIB.Exceptions.InstrumentUnavailable):
+			logger.error("(socket.error, USBError): waiting for our devices to be reconnected...")
+			for name in (['FUNCGEN'] if args.external else []) + ['LOCKIN', 'OSCI']:
+				manager.wait(name, sleep_time_frequency_step)
 			continue
 		except KeyboardInterrupt:
 			SIGTERM = True
@@ -382,9 +387,7 @@ while not SIGTERM:
 		print "wrote data to '" + data_directory + filename + ".gz'"
 	else:
 		print "wrote data to '" + data_directory + filename + "'"
-	# If ROOT libraries have been loaded -> create a root file with tree
-	if HAS_ROOT_LIB:
-		LIB.ROOT_IO.ROOT_IO.write_data(data_directory + filename, "PowerBox_Characterize", data)
-		print "created ROOT file from data ('" + data_directory + filename + ".root')"
+	# Binary storage of the data (e.g. the ROOT tree)
+	storage.close()
 #end while-not-SIGTERM
 logger.info("#### END OF PROGRAM ####")
@@ -6,8 +6,9 @@ HAS_ROOT_LIB = True
 import LIB.File
 import LIB.Compression
 import LIB.Exceptions
-from LIB.USBTMCInstrument import USBTMCObject, USBInstruments
+import LIB.InstrumentManager as InstrumentManager
 import LIB.OsciUSB as OsciUSB
+import LIB.Storage
 try: import LIB.ROOT_IO
 except ImportError: HAS_ROOT_LIB = False
 
@@ -33,6 +34,8 @@ parser.add_argument("-l", "--log", help="file to write log to (default '" + LOG_
 parser.add_argument("-s", "--service", help="script run as service? disables all I/O from std(in|out).", action="store_true")
 parser.add_argument("--stepsleep", type=float, help="sleep how long (minimum/offset) after setting a new frequency", default=1.0)
 parser.add_argument("--compress", help="compress data files after they have been written", action="store_true")
+parser.add_argument("--storage", help="binary storage besides the text file: root, npy (memory mappable columns, no ROOT needed) or none (default: root if PyROOT is available, else npy)",
+	choices=sorted(LIB.Storage.Storages.keys()), default='root' if HAS_ROOT_LIB else 'npy')
 # parse
 args = parser.parse_args()
 if args.log:
@@ -79,8 +82,9 @@ def get_osci_mean_data(instrument, samples=10, sleep=0):
 	meanVp, meanVm = np.empty(samples), np.empty(samples)
 	instrument.cmd("*WAI")
 	while count < samples:
-		meanVp[count] = float(instrument.cmd_and_return("MEASU:MEAS1:VAL?").strip().replace('"', ''))
-		meanVm[count] = float(instrument.cmd_and_return("MEASU:MEAS2:VAL?").strip().replace('"', ''))
+		r = instrument.ask_many(["MEAS1:VAL", "MEAS2:VAL"], prefix="MEASU:")
+		meanVp[count] = float(r["MEAS1:VAL"])
+		meanVm[count] = float(r["MEAS2:VAL"])
 		count += 1
 		time.sleep(sleep)
 	return {'Vp': np.mean(meanVp), 'Vm': np.mean(meanVm), 'Vp_STDDEV': np.std(meanVp), 'Vm_STDDEV': np.std(meanVm)}
@@ -115,10 +119,12 @@ if args.stepsleep and args.stepsleep >= 0:
 """
 	Initialize oscilloscope for battery measurement
 """
+manager = InstrumentManager.InstrumentManager()
+manager.register('OSCI', InstrumentManager.usbtmc('HALLE'))
 while True:
 	try:
 		print "\n", "initializing USB instrument..."
-		sOsci = USBTMCObject(USBInstruments['HALLE']['vendorID'], USBInstruments['HALLE']['productID'], USBInstruments['HALLE']['serialNo'])
+		sOsci = manager.open('OSCI')
 		print "\tInstrument: " + str(sOsci.cmd_and_return("*IDN?"))
 		OsciUSB.setup_measurement_mean(sOsci, channels=[1, 2], statistics=False, statistics_samples=-1)
 		break
@@ -143,13 +149,7 @@ while not SIGTERM:
 	starttime, offsettime, meas_time_start, meas_time_stop = time.time(), 0, 0, 0
 	_count = 0
 
-	i = 1
-	while True:
-		files = [True for f in os.listdir(data_directory) if re.match(r'' + filename_pattern_begin+("%0*d" % (4, i)) + '.*', f)]
-		if len(files) == 0:
-			break
-		i += 1
-	filename = filename_pattern_begin + ("%0*d" % (4, i)) + '_' + strftime + ".dat"
+	filename = LIB.File.get_filename_filecount(data_directory, filename_pattern_begin, '_' + strftime + ".dat")
 
 	handle = open(data_directory + filename, 'w')
 	logger.info("File opened: '" + data_directory + filename + "'")
@@ -157,7 +157,8 @@ while not SIGTERM:
 	try:
 		handle.write("#Osci_CH1==" + OsciUSB.dict2string(OsciUSB.get_values_channel(sOsci, 1, OsciUSB.queriesChannelInfo)) + '\n')
 		handle.write("#Osci_CH2==" + OsciUSB.dict2string(OsciUSB.get_values_channel(sOsci, 2, OsciUSB.queriesChannelInfo)) + '\n')
-	except LIB.Exceptions.USBException:
+	except (LIB.Exceptions.USBException, LIB.Exceptions.InstrumentUnavailable):
+		manager.wait('OSCI', sleep_time_frequency_step)
 		handle.close()
 		os.remove(data_directory + filename)
 		continue
@@ -165,7 +166,12 @@ while not SIGTERM:
 	handle.write("#TIMESTAMP==" + strftime + '\n')
 	handle.write("#Keys==TIME\tPowerBox_Vp_MEAN\tPowerBox_Vp_STDDEV\tPowerBox_Vm_MEAN\tPowerBox_Vm_STDDEV\n")
 
-	data = {'TIME': [], 'Vp': [], 'Vm': [], 'Vp_STDDEV': [], 'Vm_STDDEV': []}
+	storage = LIB.Storage.open_storage(args.storage, data_directory + filename, "PowerBox_Discharge", {'TIMESTAMP': strftime})
+
+	"""
+	DATA STORAGE IN RAM: only the last row, the rows are written by the storage
+	"""
+	data = LIB.Storage.last_values(['TIME', 'Vp', 'Vm', 'Vp_STDDEV', 'Vm_STDDEV'])
 
 	while not SIGTERM:
 		try:
@@ -175,6 +181,7 @@ while not SIGTERM:
 
 			data['TIME'].append(int((meas_time_stop+meas_time_start)/2.-starttime))
 			for key in data_PowerBox.keys(): data[key].append(data_PowerBox[key])
+			storage.append({key: data[key][-1] for key in data.keys()})
 
 			handle.write("{_t}\t".format(_t=int((meas_time_stop+meas_time_start)/2.-starttime)))
 			handle.write("{_PowerVp}\t{_PowerVp_STDDEV}\t{_PowerVm}\t{_PowerVm_STDDEV}\n".format(_PowerVp=data_PowerBox['Vp'],
@@ -193,10 +200,9 @@ while not SIGTERM:
 				handle.flush()
 				os.fsync(handle.fileno())
 
-		except LIB.Exceptions.USBException:
-			logger.error("(USBError): trying to reconnect to our devices if necessary...")
-			if not sOsci.is_open():
-				sOsci.connect()
+		except (LIB.Exceptions.USBException, LIB.Exceptions.InstrumentUnavailable):
+			logger.error("(USBError): waiting for the oscilloscope to be reconnected...")
+			manager.wait('OSCI', sleep_time_frequency_step)
 			continue
 		except KeyboardInterrupt:
 			SIGTERM = True
@@ -210,8 +216,8 @@ while not SIGTERM:
 		print "wrote data to '" + data_directory + filename + ".gz'"
 	else:
 		print "wrote data to '" + data_directory + filename + "'"
-	if HAS_ROOT_LIB:
-		LIB.ROOT_IO.ROOT_IO.write_data(data_directory + filename, "PowerBox_Characterize", data)
+	# Binary storage of the data (e.g. the ROOT tree)
+	storage.close()
 #end while-not-SIGTERM
 logger.info("#### END OF PROGRAM ####")
 __author__ = 'Christian Velten'
@@ -2,29 +2,34 @@
 # -*- coding: utf-8 -*-
 __author__ = 'cvelten'
 
-from LIB.ROOT_IO import read_root_discharge, COLORSET_DARK
+import LIB.Storage
+
 import argparse
 import numpy as np
 import os
 import sys
 
+HAS_ROOT_LIB = True
 try:
-	from LIB.ROOT_IO import ROOT_IO
+	from LIB.ROOT_IO import read_root_discharge, COLORSET_DARK
 	import ROOT
 except ImportError:
-	print "Couldn't find ROOT framework! Install it or set the appropriate flags!"
-	sys.exit(1)
+	HAS_ROOT_LIB = False
 
 parser = argparse.ArgumentParser(description="")
-parser.add_argument("files", nargs="+", help="filenames to print")
+parser.add_argument("files", nargs="+", help="filenames to print (.root or .npy storages)")
 parser.add_argument("-i", "--interactive", action="store_true")
 args = parser.parse_args()
 
 file_list = []
 if args.files:
 	for filename in args.files:
-		if os.path.isfile(filename) and filename[-4:] == 'root':
+		if os.path.isfile(filename) and filename[-4:] == 'root' and HAS_ROOT_LIB:
+			file_list.append(os.path.abspath(str(filename).strip()))
+		elif LIB.Storage.is_npy(filename):  # --storage npy of the loggers, no ROOT needed
 			file_list.append(os.path.abspath(str(filename).strip()))
+		elif os.path.isfile(filename) and filename[-4:] == 'root':
+			print "Couldn't find ROOT framework, '" + filename + "' can't be read (.npy storages can)!"
 		else:
 			print "This is not a valid file: '" + filename + "'"
 	if len(file_list) == 0:
@@ -34,6 +39,17 @@ else:
 	print "Need valid filename(s) to proceed!"
 	sys.exit(1)
 
+data = [LIB.Storage.read_npy_discharge(filename) if LIB.Storage.is_npy(filename) else read_root_discharge(filename, tree=None, verbose=True, raise_errors=False)
+	for filename in file_list]
+
+if not HAS_ROOT_LIB:
+	for filename, data_set in zip(file_list, data):
+		if not data_set['n']: continue
+		print "{0}: {1} points | {2} s .. {3} s | Vp {4:.3f} .. {5:.3f} V | Vm {6:.3f} .. {7:.3f} V".format(filename, data_set['n'],
+			data_set['t'].min(), data_set['t'].max(), data_set['Vp'].min(), data_set['Vp'].max(), data_set['Vm'].min(), data_set['Vm'].max())
+	print "Couldn't find ROOT framework, nothing plotted!"
+	sys.exit(0)
+
 """
 	ROOT CONFIGURATION
 """
@@ -49,8 +65,6 @@ print "\n\nTODO: SET GRID STYLE / SIZE / COLOR\n\n"
 gMultiDischarge = ROOT.TMultiGraph()
 gMultiDischarge.SetTitle(";time [s];voltage [V]")
 
-data = [read_root_discharge(filename, tree=None, verbose=True, raise_errors=False) for filename in file_list]
-
 count = 0
 for data_set in data:
 	n, t, VpVm, VpuVmu, Vp, Vpu, Vm, Vmu = data_set['n'], data_set['t'], data_set['VpVm'], data_set['VpuVmu'], data_set['Vp'], data_set['Vpu'], data_set['Vm'], data_set['Vmu']
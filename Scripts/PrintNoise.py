@@ -2,20 +2,21 @@
 # -*- coding: utf-8 -*-
 __author__ = 'Christian Velten'
 
-from LIB.ROOT_IO import read_root_noise, COLORSET_DARK
+import LIB.Storage
+
 import argparse
 import numpy as np
 import os
 import sys
 
+HAS_ROOT_LIB = True
 try:
-	from LIB.ROOT_IO import ROOT_IO
+	from LIB.ROOT_IO import read_root_noise, COLORSET_DARK
 	import ROOT
 except ImportError:
-	print "Couldn't find ROOT framework! Install it or set the appropriate envars (e.g. PYTHONPATH)!"
-	sys.exit(1)
+	HAS_ROOT_LIB = False
 
-parser = argparse.ArgumentParser(description="Python script to print one/several ROOT files containing noise data.")
+parser = argparse.ArgumentParser(description="Python script to print one/several ROOT files (or .npy storages) containing noise data.")
 parser.add_argument("files", nargs="+", help="filename to convert")
 parser.add_argument("-i", "--interactive", action="store_true")
 args = parser.parse_args()
@@ -23,8 +24,12 @@ args = parser.parse_args()
 file_list = []
 if args.files:
 	for filename in args.files:
-		if os.path.isfile(filename) and filename[-4:] == 'root':
+		if os.path.isfile(filename) and filename[-4:] == 'root' and HAS_ROOT_LIB:
+			file_list.append(os.path.abspath(str(filename).strip()))
+		elif LIB.Storage.is_npy(filename):  # --storage npy of the loggers, no ROOT needed
 			file_list.append(os.path.abspath(str(filename).strip()))
+		elif os.path.isfile(filename) and filename[-4:] == 'root':
+			print "Couldn't find ROOT framework, '" + filename + "' can't be read (.npy storages can)!"
 		else:
 			print "This is not a valid file: '" + filename + "'"
 	if len(file_list) == 0:
@@ -34,6 +39,17 @@ else:
 	print "Need valid filename(s) to proceed!"
 	sys.exit(1)
 
+data = [LIB.Storage.read_npy_noise(filename) if LIB.Storage.is_npy(filename) else read_root_noise(filename, tree=None, verbose=True, raise_errors=False)
+	for filename in file_list]
+
+if not HAS_ROOT_LIB:
+	for filename, data_set in zip(file_list, data):
+		if not data_set['n']: continue
+		print "{0}: {1} points | {2} Hz .. {3} Hz | noise {4:.4g} .. {5:.4g} uV/sqrt(Hz)".format(filename, data_set['n'],
+			data_set['f'].min(), data_set['f'].max(), 1E+6*data_set['N'].min(), 1E+6*data_set['N'].max())
+	print "Couldn't find ROOT framework, nothing plotted!"
+	sys.exit(0)
+
 """
 	ROOT CONFIGURATION
 """
@@ -53,8 +69,6 @@ print "\n\nTODO: SET GRID STYLE / SIZE / COLOR\n\n"
 gMultiNoise = ROOT.TMultiGraph()
 gMultiNoise.SetTitle(";frequency [Hz];noise [\xb5V/#sqrt{Hz}]")
 
-data = [read_root_noise(filename, tree=None, verbose=True, raise_errors=False) for filename in file_list]
-
 count = 0
 for data_set in data:
 	n, f, N, Nu = data_set['n'], data_set['f'], data_set['N'], data_set['Nu']
@@ -2,34 +2,23 @@
 # -*- coding: utf-8 -*-
 __author__ = 'Christian Velten'
 
-import LIB.ROOT_IO
+HAS_ROOT_LIB = True
+
+import LIB.AllanDeviation
+import LIB.Storage
+try:
+	import LIB.ROOT_IO
+	import ROOT
+except ImportError: HAS_ROOT_LIB = False
 
 import argparse
-import itertools
 import numpy as np
 import os
-import ROOT
 import sys
 
 
-def robust_reshape(arr, group):
-	output = np.zeros(len(arr)/group)
-	for i in range( int(len(arr)/group) ):
-		for j in range(group):
-			output[i] += arr[i*group+j] / float(group)
-	return output
-
-
-def allen_data(xin, yin):
-	group = np.arange(1, 1+len(xin)/2, 5, dtype=int)
-	std = np.empty(len(group))
-	for i in range(len(group)):
-		std[i] = robust_reshape(yin, int(group[i])).std()
-	return group, std
-
-
 parser = argparse.ArgumentParser()
-parser.add_argument("ifile")
+parser.add_argument("ifile", help="text file of the logger, its .root file or its .npy storage (read without ROOT)")
 parser.add_argument("-i", "--interactive", action="store_true")
 parser.add_argument("--sweep", action="store_true")
 parser.add_argument("--stability", action="store_true")
@@ -40,13 +29,16 @@ if not (args.stability or args.sweep): args.sweep = True
 keys = ['TIME', 'TIME_OFFSET', 'LDC_I', 'LDC_T', 'PID_PROP', 'PID_INTG', 'PID_MEAS', 'PID_MEASu', 'PID_PXER', 'PID_PXERu', 'PID_OUTP', 'PID_OUTPu', 'DIFF', 'DIFFu', 'MODU', 'MODUu', 'TEMP', 'TEMPu', 'OSC3', 'OSC3u']
 data = {key: [] for key in keys}
 
-if not os.path.isfile(args.ifile):
+if not os.path.isfile(args.ifile) and not LIB.Storage.is_npy(args.ifile):
 	print "File does not exist!"
 	sys.exit(1)
 
 treename = "PI_Stability" if args.stability else "PI_Sweep"
 
-if not args.ifile[-4:] == 'root':
+if LIB.Storage.is_npy(args.ifile):
+	metadata, data = LIB.Storage.read_npy(args.ifile)
+	keys = data.keys()
+elif not args.ifile[-4:] == 'root':
 	handle = open(args.ifile, 'r')
 	lines = handle.readlines()
 	handle.close()
@@ -56,23 +48,15 @@ if not args.ifile[-4:] == 'root':
 		tmp = line.strip().split('\t')
 		for i in range(len(keys)):
 			data[keys[i]].append(float(tmp[i].strip()))
-	if not os.path.isfile(args.ifile+'.root'):
+	if not os.path.isfile(args.ifile+'.root') and HAS_ROOT_LIB:
 		LIB.ROOT_IO.ROOT_IO.write_data(args.ifile, treename, data)
+elif not HAS_ROOT_LIB:
+	print "Couldn't find ROOT framework, use the text file or the .npy storage!"
+	sys.exit(1)
 else:
 	TFile, T = LIB.ROOT_IO.ROOT_IO.get_tree(args.ifile, treename)
-	keys = []
-	for branch in T.GetListOfBranches():
-		keys.append(str(branch.GetName()))
-	leaves = {key: np.zeros(1) for key in keys}
-	for key in keys:
-		T.SetBranchAddress(key, leaves[key])
-	n = T.GetEntries()
-	data = {key: np.empty(n) for key in keys}
-	for i in range(n):
-		T.GetEntry(i)
-		for key in keys:
-			data[key][i] = leaves[key]
-	pass
+	data = LIB.ROOT_IO.read_tree(T)
+	keys = data.keys()
 
 
 t, TEMP, TEMPu = np.array(data['TIME']), np.array(data['TEMP']), np.array(data['TEMPu'])
@@ -87,6 +71,9 @@ ER = np.absolute(PXER/P)
 ERu = PXERu
 
 print "MEAS-Mean/STD =", MEAS.mean(), MEAS.std()
+if not HAS_ROOT_LIB:
+	print "Couldn't find ROOT framework, nothing plotted!"
+	sys.exit(0)
 
 """
 	ROOT SETTINGS
@@ -232,16 +219,16 @@ elif args.stability:
 	canvas.Print("PIStability.pdf")
 
 	if args.diff:
-		"""
 		canvasDIFF = ROOT.TCanvas("cDiff", "cDiff", 1366, 768)
 		canvasDIFF.Draw()
-		t_A, DIFF_A = allen_data(t, DIFF)
-		TG_DIFF_ALLEN = ROOT.TGraph(len(t_A), t_A/1.0, DIFF_A)
-		TG_DIFF_ALLEN.SetTitle(";bin size; std-dev")
-		TG_DIFF_ALLEN.SetLineWidth(1)
-		TG_DIFF_ALLEN.SetFillStyle(3001)
-		TG_DIFF_ALLEN.Draw("AP")
-		"""
+		canvasDIFF.SetLogx()
+		canvasDIFF.SetLogy()
+		tau_A, DIFF_A, DIFF_Au = LIB.AllanDeviation.oadev(DIFF, rate=1./np.median(np.diff(t)))
+		TG_DIFF_ALLAN = ROOT.TGraphErrors(len(tau_A), tau_A, DIFF_A, np.zeros(len(tau_A)), DIFF_Au)
+		TG_DIFF_ALLAN.SetTitle(";averaging time [s];overlapping Allan deviation [V]")
+		TG_DIFF_ALLAN.SetLineWidth(1)
+		TG_DIFF_ALLAN.SetFillStyle(3001)
+		TG_DIFF_ALLAN.Draw("APL")
 		ROOT.gPad.Update()
 
 		TG_DIFF = ROOT.TGraphErrors(len(t), t, DIFF, np.zeros(len(t)), DIFFu)
@@ -1,12 +1,16 @@
 #!/usr/bin/env python
 __author__ = 'Christian Velten'
 
+import LIB.Compression as Compression
 import LIB.File
+import LIB.OsciUSB as OsciUSB
+import LIB.ParallelAcquisition as ParallelAcquisition
+import LIB.SoftwareLockIn as SoftwareLockIn
+import LIB.WaveformBIN as WaveformBIN
 from LIB.USBTMCInstrument import USBTMCObject, USBInstruments
 
 from datetime import datetime
 import argparse
-import gzip
 import logging, logging.handlers, signal
 import numpy as np
 import os, re, sys, time
@@ -19,11 +23,21 @@ parser.add_argument('-l', '--log', help="file to write log to")
 parser.add_argument("-s", "--service", help="script run as service? disables all I/O from std(in|out).", action="store_true")
 parser.add_argument("-v", "--verbose", help="set if you want to save more data to file / output", action="store_true")
 parser.add_argument("-c", "--compress", action="store_true")
+parser.add_argument("--processes", type=int, help="processes compressing blocks of the records in parallel (default: number of CPUs)")
 parser.add_argument('--precision', type=int, default=4)
 parser.add_argument('--start', type=int, default=0)
 parser.add_argument('-n', '--ndata', type=int, default=10000)
 parser.add_argument('--xunit', default='S', choices=['S'])
 parser.add_argument('--scale', type=float, default=1E+0, choices=[1E-3, 2E-3, 4E-3, 10E-3, 20E-3, 40E-3, 100E-3, 200E-3, 400E-3, 1E+0, 2E+0, 4E+0, 10E+0])
+parser.add_argument('--raw', help="write the digitizer levels (i2) instead of volts, see LIB.WaveformBIN", action="store_true")
+parser.add_argument('--legacy', help="write the legacy layout without chunk table (for the C++ tools of FFT-LockIn)", action="store_true")
+parser.add_argument('-w', '--workers', type=int, default=2, help="threads scaling, writing and compressing the records (default 2)")
+parser.add_argument('--depth', type=int, default=2, help="transferred records waiting for a worker before the acquisition blocks (default 2)")
+parser.add_argument('--lockin', type=float, help="demodulate the records while they are acquired at this reference frequency in Hz (software lock-in)")
+parser.add_argument('--timeconstant', type=float, default=0.1, help="time constant of the software lock-in in s (default 0.1)")
+parser.add_argument('--slope', type=int, default=24, choices=SoftwareLockIn.SLOPES, help="filter slope of the software lock-in in dB/oct (default 24)")
+parser.add_argument('--phase', type=float, default=0., help="reference phase of the software lock-in in degrees (default 0)")
+parser.add_argument('--lockin-rate', type=float, default=10., help="output rate of the software lock-in in Hz (default 10)")
 args = parser.parse_args()
 #
 LOG_FILENAME = "/tmp/RecordWaveformBIN.log" if args.log is None else args.log
@@ -127,61 +141,129 @@ sOsci.cmd("*WAI")
 
 time.sleep(1)
 
+
+def write_record(item, d_volt):
+	"""
+	Scale a transferred record into the preallocated d_volt (unless raw) and write it, compressed while streaming if requested.
+	Runs in the worker threads of the pipeline.
+	:param item: (output filename, datetime of the record, raw CURVE? response)
+	"""
+	ofile, today, buf = item
+	data = OsciUSB.decode_curve(buf, '<i2')
+	if not args.raw:
+		data = OsciUSB.scale_curve(data, d_volt, yoffs, ymult, yzero)
+
+	if args.compress: ofile += '.gz'
+	handle = compressor.open(ofile) if args.compress else open(ofile, 'wb')
+	try:
+		if args.legacy:
+			WaveformBIN.write_legacy_header(handle, today, precision, len(data), xzero, xincr, yzero, yoffs, ymult, xunit+yunit)
+			handle.write(data.data)
+		else:
+			WaveformBIN.write(handle, today, precision, data, xzero, xincr, yzero, yoffs, ymult, xunit+yunit)
+	finally:
+		handle.close()
+	print ofile
+
+
+def open_lockin_file(day):
+	"""
+	Close the lock-in file of the previous day (if any) and open a new one, named like the records of this day.
+	"""
+	global lockin_handle, lockin_day
+	if not lockin_handle is None:
+		lockin_handle.close()
+	lockin_filename = odir + '/' + LIB.File.get_filename_filecount(odir, 'LockIn_', day.strftime('_%Y-%m-%d') + '.dat')
+	lockin_handle, lockin_day = open(lockin_filename, 'w'), day.date()
+	lockin_handle.write("#LOCKIN==FREQUENCY:{0},TIMECONSTANT:{1},SLOPE:{2},PHASE:{3},RATE:{4},SETTLE:{5}\n".format(
+		args.lockin, args.timeconstant, args.slope, args.phase, args.lockin_rate, lockin.settle_time()))
+	lockin_handle.write("#TIMESTAMP==" + day.strftime("%Y-%m-%d_%H%M%Z") + "\n")
+	lockin_handle.write("#Keys==TIME\tX\tY\tR\tTHETA\tSETTLED\n")
+	print "lock-in output: '" + lockin_filename + "'"
+
+
+def demodulate_record(item, unused):
+	"""
+	Demodulate a transferred record with the software lock-in and append its outputs to the lock-in file of its day.
+	Runs in the single worker thread of the lock-in pipeline, i.e. in the order of acquisition.
+	Every record is a separate trigger: the reference is anchored to the trigger (phase 2 pi f (XZERO + i XINCR)) and
+	the filter starts from zero, so the outputs are not continuous across records and only SETTLED (1) after the
+	settle time from the start of the record.
+	"""
+	ofile, today, buf = item
+	if today.date() != lockin_day:
+		open_lockin_file(today)
+	data = OsciUSB.decode_curve(buf, '<i2')
+	volts = OsciUSB.scale_curve(data, np.empty(len(data)), yoffs, ymult, yzero)
+	lockin.reset(xzero)
+	out = lockin.add(volts)
+	epoch = time.mktime(today.timetuple()) + today.microsecond * 1E-6 + xzero
+	for i in range(len(out['INDEX'])):
+		lockin_handle.write("{0:.6f}\t{1}\t{2}\t{3}\t{4}\t{5:d}\n".format(epoch + out['INDEX'][i] * xincr,
+			out['X'][i], out['Y'][i], out['R'][i], out['THETA'][i], int(out['SETTLED'][i])))
+	lockin_handle.flush()
+	if np.any(out['SETTLED']):
+		last = np.flatnonzero(out['SETTLED'])[-1]
+		print "lock-in: R = {0:.6g} V | THETA = {1:.2f} deg".format(out['R'][last], out['THETA'][last])
+
+
 # While True
 today, lastday = None, datetime.today()
 counter = 0
 
-data = np.empty(wvfm_stop-wvfm_start, dtype=np.dtype('i2'))
-d_volt, d_time = np.empty(wvfm_stop-wvfm_start, dtype=np.dtype('f'+precision)), np.empty(wvfm_stop-wvfm_start, dtype=np.dtype('f'+precision))
-N = 0
+# the pool has to be started before the worker threads
+compressor = Compression.Compressor(args.processes) if args.compress else None
+
+# the acquisition loop only transfers, the workers scale and write into a ring of preallocated buffers
+if args.raw:
+	precision, ring = WaveformBIN.PRECISION_RAW, None
+else:
+	ring = ParallelAcquisition.BufferRing(args.workers, wvfm_stop-wvfm_start, np.dtype('f'+precision))
+pipeline = ParallelAcquisition.Pipeline(write_record, workers=args.workers, depth=args.depth, ring=ring)
+
+# software lock-in: one worker keeps the records in order
+lockin_pipeline, lockin_handle, lockin_day = None, None, None
+if args.lockin:
+	lockin = SoftwareLockIn.StreamingLockIn(1. / xincr, args.lockin, args.timeconstant, args.slope, args.lockin_rate, args.phase)
+	if lockin.settle_time() >= (wvfm_stop - wvfm_start) * xincr:
+		print "WARNING: the lock-in settles in {0} s, longer than a record ({1} s), no output will be SETTLED".format(
+			lockin.settle_time(), (wvfm_stop - wvfm_start) * xincr)
+	open_lockin_file(lastday)
+	lockin_pipeline = ParallelAcquisition.Pipeline(demodulate_record, workers=1, depth=args.depth)
+
+# the closes run even if the acquisition or a worker failed (submit and close re-raise worker exceptions)
+try:
+	while not SIGINT and not SIGTERM:
+		try:
+			today = datetime.today()
+			if (today.date() > lastday.date()):
+				lastday = today
+				counter = 0
+			else: counter += 1
+			ofile = odir + '/' + fileprefix + today.strftime('%Y-%m-%d_') + "{:0>4}".format(counter) + ".bin"
+
+			while int(sOsci.ask("ACQ:STATE?")) != 0:
+				time.sleep(0.1)
+			sOsci.instrument().write('CURVE?\n')
+			buf = sOsci.instrument().read_raw()
+			# start new acquisition
+			sOsci.cmd("ACQ:STATE ON")
 
-while not SIGINT and not SIGTERM:
+			pipeline.submit((ofile, today, buf))
+			if not lockin_pipeline is None:
+				lockin_pipeline.submit((ofile, today, buf))
+		except KeyboardInterrupt:
+			SIGINT = True
+			continue
+finally:
 	try:
-		today = datetime.today()
-		if (today.date() > lastday.date()):
-			lastday = today
-			counter = 0
-		else: counter += 1
-		ofile = odir + '/' + fileprefix + today.strftime('%Y-%m-%d_') + "{:0>4}".format(counter) + ".bin"
-
-		while int(sOsci.ask("ACQ:STATE?")) != 0:
-			time.sleep(0.1)
-		sOsci.instrument().write('CURVE?\n')
-		buf = sOsci.instrument().read_raw()
-		# start new acquisition
-		sOsci.cmd("ACQ:STATE ON")
-
-		""" buf[] = 
-		0 = #
-		1 = N
-		2..2+N-1 = n-data-bytes
-		2+N..len(buf)-1 = data
-		"""
-		N = int(buf[1])
-		data = np.frombuffer(buf[2+N:-1], np.dtype('i2'))
-		
-		np.copyto(d_volt, data, casting='unsafe')
-		d_volt -= yoffs
-		d_volt *= ymult
-		d_volt += yzero
-
-		with open(ofile, 'wb') as handle:
-			#handle.write(today.strftime('%Y-%m-%d_%H:%M:%S').encode())
-			np.array([today.strftime('%Y,%m,%d,%H,%M,%S').split(',')], dtype=np.dtype('i4')).tofile(handle)
-			np.array([precision], dtype=np.dtype('u1')).tofile(handle)
-			np.array([len(d_volt)], dtype=np.dtype('u4')).tofile(handle)
-			np.array([xzero, xincr, yzero, yoffs, ymult], dtype=np.dtype('f'+precision)).tofile(handle)
-			handle.write((xunit+yunit).encode())
-			d_volt.tofile(handle)
-			print ofile
-		if args.compress:
-			with open(ofile, 'rb') as handle:
-				f_out = gzip.open(ofile.replace('.bin','.bin.gz'), 'wb')
-				f_out.writelines(handle)
-				f_out.close()
-				print ofile.replace('.bin','.bin.gz')
-				os.remove(ofile)
-
-	except KeyboardInterrupt:
-		SIGINT = True
-		continue
+		pipeline.close()
+	finally:
+		try:
+			if not lockin_pipeline is None:
+				lockin_pipeline.close()
+		finally:
+			if not lockin_handle is None:
+				lockin_handle.close()
+			if not compressor is None:
+				compressor.close()
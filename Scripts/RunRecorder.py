@@ -3,6 +3,8 @@ __author__ = 'Christian Velten'
 
 try: from LIB.USBTMCInstrument import USBTMCObject, USBInstruments
 except ImportError: FORCE_DRAW = True
+import LIB.OsciUSB as OsciUSB
+import LIB.WaveformBIN as WaveformBIN
 
 from datetime import datetime
 import gzip
@@ -72,7 +74,7 @@ while not SIGINT:
 			lastday = today
 			counter = 0
 		else: counter += 1
-		ofile = fileprefix + "{:0>4}".format(counter) + ".bin"
+		ofile = os.path.join(odir, fileprefix + today.strftime('%Y-%m-%d_') + "{:0>4}".format(counter) + ".bin")
 
 		while int(sOsci.ask("ACQ:STATE?")) != 0:
 			time.sleep(0.1)
@@ -82,27 +84,13 @@ while not SIGINT:
 		# start new acquisition
 		sOsci.cmd("ACQ:STATE ON")
 
-		""" buf[] = 
-		0 = #
-		1 = N
-		2..2+N-1 = n-data-bytes
-		2+N..len(buf)-1 = data
-		"""
-		N = int(buf[1])
-		data = np.frombuffer(buf[2+N:-1], np.dtype('i2'))
-		
-		np.copyto(d_volt, data, casting='unsafe')
-		d_volt -= yoffs
-		d_volt *= ymult
-		d_volt += yzero
-		
+		data = OsciUSB.decode_curve(buf, '<i2')
+		volts = OsciUSB.scale_curve(data, d_volt[:len(data)], yoffs, ymult, yzero)
+
 		#d_time = np.arange(0, xincr * len(d_volt), xincr, dtype=np.dtype('f8'))
 
 		with open(ofile, 'wb') as handle:
-			np.array([len(d_volt)], dtype=np.dtype('u4')).tofile(handle)
-			np.array([xzero, xincr, yzero, yoffs, ymult], dtype=np.dtype('f8')).tofile(handle)
-			handle.write((xunit+yunit).encode())
-			d_volt.tofile(handle)
+			WaveformBIN.write(handle, today, 8, volts, xzero, xincr, yzero, yoffs, ymult, xunit+yunit)
 			print "created", ofile
 	except KeyboardInterrupt:
 		SIGINT = True
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+__author__ = 'Christian Velten'
+
+import LIB.Simulators as Simulators
+
+import argparse
+import time
+"""
+### --------------------------------------------------------------------------------------------------------------------
+"""
+parser = argparse.ArgumentParser(description="Serve simulated instruments on local TCP ports or pseudo terminals for offline tests and benchmarks.")
+parser.add_argument("instruments", nargs='+', help="instruments to simulate", choices=sorted(Simulators.Simulators.keys()))
+parser.add_argument("--host", help="address to listen on (default 127.0.0.1)", default='127.0.0.1')
+parser.add_argument("-p", "--port", type=int, help="first TCP port, further instruments use the following ports (default: any free port)", default=0)
+parser.add_argument("--pty", help="serve on pseudo terminals (for SerialObject) instead of TCP ports", action="store_true")
+parser.add_argument("--latency", type=float, help="delay of every response in s (default 0)", default=0.)
+parser.add_argument("--bandwidth", type=float, help="transfer rate of responses in bytes/s (default unlimited)")
+parser.add_argument("--noise", type=float, help="scale of the synthetic white noise (default 1E-3)", default=1E-3)
+parser.add_argument("--seed", type=int, help="seed of the random number generator")
+args = parser.parse_args()
+"""
+### --------------------------------------------------------------------------------------------------------------------
+"""
+servers = []
+for i, name in enumerate(args.instruments):
+	server = Simulators.start(name, pty=args.pty, host=args.host, port=args.port + i if args.port else 0,
+		latency=args.latency, bandwidth=args.bandwidth, noise=args.noise, seed=args.seed)
+	servers.append(server)
+	print "{0:>8}: {1}".format(name, server.address())
+
+try:
+	while True:
+		time.sleep(1.0)
+except KeyboardInterrupt:
+	pass
+for server in servers:
+	server.stop()
@@ -12,6 +12,7 @@ import LIB.OsciUSB as OsciUSB
 from LIB.SerialInstrument import SerialObject, SerialInstruments
 try: from LIB.USBTMCInstrument import USBTMCObject, USBInstruments
 except ImportError: FORCE_DEBUG = True
+import LIB.Storage
 try: import LIB.ROOT_IO
 except ImportError: HAS_ROOT_LIB = False
 
@@ -50,16 +51,14 @@ def exit(ser=None, code=0, e=None, usbtmc=None):
 
 def get_osc_measurements(s, three=False):
 	s.cmd("*WAI")
-	ch1  = float(s.ask("MEASU:MEAS1:MEAN?").strip().replace('"',''))
-	ch1u = float(s.ask("MEASU:MEAS1:STDDEV?").strip().replace('"',''))
-	ch2  = float(s.ask("MEASU:MEAS2:MEAN?").strip().replace('"',''))
-	ch2u = float(s.ask("MEASU:MEAS2:STDDEV?").strip().replace('"',''))
+	queries = ["MEAS1:MEAN", "MEAS1:STDDEV", "MEAS2:MEAN", "MEAS2:STDDEV"]
 	if three:
-		ch3  = float(s.ask("MEASU:MEAS3:MEAN?").strip().replace('"',''))
-		ch3u = float(s.ask("MEASU:MEAS3:STDDEV?").strip().replace('"',''))
-		return {'DIFF': ch1, 'DIFFu': ch1u, 'MODU': ch2, 'MODUu': ch2u, 'OSC3': ch3, 'OSC3u': ch3u}
+		queries += ["MEAS3:MEAN", "MEAS3:STDDEV"]
+	r = s.ask_many(queries, prefix="MEASU:")
+	if three:
+		return {'DIFF': float(r["MEAS1:MEAN"]), 'DIFFu': float(r["MEAS1:STDDEV"]), 'MODU': float(r["MEAS2:MEAN"]), 'MODUu': float(r["MEAS2:STDDEV"]), 'OSC3': float(r["MEAS3:MEAN"]), 'OSC3u': float(r["MEAS3:STDDEV"])}
 	else:
-		return {'DIFF': ch1, 'DIFFu': ch1u, 'MODU': ch2, 'MODUu': ch2u, 'OSC3': 0.0, 'OSC3u': 0.0}
+		return {'DIFF': float(r["MEAS1:MEAN"]), 'DIFFu': float(r["MEAS1:STDDEV"]), 'MODU': float(r["MEAS2:MEAN"]), 'MODUu': float(r["MEAS2:STDDEV"]), 'OSC3': 0.0, 'OSC3u': 0.0}
 
 
 def get_temperature(sensor):
@@ -69,6 +68,8 @@ def get_temperature(sensor):
 # SET-UP OF ARGUMENT PARSER
 parser = argparse.ArgumentParser(description="")
 parser.add_argument("-c", "--compress", help="", action="store_true")
+parser.add_argument("--storage", help="binary storage besides the text file: root, npy (memory mappable columns, no ROOT needed) or none (default: root if PyROOT is available, else npy)",
+	choices=sorted(LIB.Storage.Storages.keys()), default='root' if HAS_ROOT_LIB else 'npy')
 parser.add_argument("-l", "--log", help="file to write log to")
 parser.add_argument("-s", "--service", help="script run as service? disables all I/O from std(in|out).", action="store_true")
 parser.add_argument("-d", "--debug", help="just print the values", action="store_true")
@@ -188,7 +189,9 @@ if not args.debug:
 	handle = open(data_directory + filename, 'w')
 	logger.info("handle.open('"+data_directory+filename+"', 'w')")
 
-data = {key: [] for key in DATA_KEYS}
+# only the last row is kept in RAM, the rows are written by the storage
+data = LIB.Storage.last_values(DATA_KEYS)
+storage = LIB.Storage.open_storage(args.storage if not args.debug else 'none', data_directory + filename, "PI_Stability", {'TIMESTAMP': time.strftime("%Y-%m-%d_%H%M")})
 
 SIGTERM, SIGINT, count = False, False, 0
 starttime = time.time()
@@ -247,6 +250,7 @@ while not (SIGTERM or SIGINT):
 		data['PID_OUTPu'].append(_PID_OUTP.std())
 		for key in OSC_MEASU.keys(): data[key].append(OSC_MEASU[key])
 		for key in TEM_MEASU.keys(): data[key].append(TEM_MEASU[key])
+		storage.append({key: data[key][-1] for key in DATA_KEYS})
 
 		for key in DATA_KEYS:
 			handle.write("{0}\n".format(data[key][-1]) if key==DATA_KEYS[-1] else "{0}\t".format(data[key][-1]))
@@ -272,8 +276,7 @@ if not args.debug:
 if not args.debug and args.compress:
 	LIB.Compression.gzip_file(data_directory + filename)
 	os.remove(data_directory + filename)
-if not args.debug and HAS_ROOT_LIB:
-	LIB.ROOT_IO.ROOT_IO.write_data(data_directory + filename, "PI_Stability", data)
+storage.close()
 print "wrote data files to: " + data_directory + "\nwith filename-begin: " + filename
 print "### END OF PROGRAM REACHED ###"
 exit(LDC, 0, usbtmc=OSC)
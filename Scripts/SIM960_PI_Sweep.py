@@ -12,6 +12,7 @@ import LIB.OsciUSB as OsciUSB
 from LIB.SerialInstrument import SerialObject, SerialInstruments
 try: from LIB.USBTMCInstrument import USBTMCObject, USBInstruments
 except ImportError: FORCE_DEBUG = True
+import LIB.Storage
 try: import LIB.ROOT_IO
 except ImportError: HAS_ROOT_LIB = False
 
@@ -42,12 +43,10 @@ def exit(ser=None, code=0, e=None):
 
 
 def get_osc_measurements(s):
+	# MODU/MODUu are MEAS2 (mean and stddev); files without the #MODU header logged MEAS1:MEAN for both
 	s.cmd("*WAI")
-	ch1  = float(s.ask("MEASU:MEAS1:MEAN?").strip().replace('"',''))
-	ch1u = float(s.ask("MEASU:MEAS1:STDDEV?").strip().replace('"',''))
-	ch2  = float(s.ask("MEASU:MEAS1:MEAN?").strip().replace('"',''))
-	ch2u = float(s.ask("MEASU:MEAS1:MEAN?").strip().replace('"',''))
-	return {'DIFF': ch1, 'DIFFu': ch1u, 'MODU': ch2, 'MODUu': ch2u}
+	r = s.ask_many(["MEAS1:MEAN", "MEAS1:STDDEV", "MEAS2:MEAN", "MEAS2:STDDEV"], prefix="MEASU:")
+	return {'DIFF': float(r["MEAS1:MEAN"]), 'DIFFu': float(r["MEAS1:STDDEV"]), 'MODU': float(r["MEAS2:MEAN"]), 'MODUu': float(r["MEAS2:STDDEV"])}
 
 
 def get_temperature(sensor):
@@ -57,6 +56,8 @@ def get_temperature(sensor):
 # SET-UP OF ARGUMENT PARSER
 parser = argparse.ArgumentParser(description="")
 parser.add_argument("-c", "--compress", help="", action="store_true")
+parser.add_argument("--storage", help="binary storage besides the text file: root, npy (memory mappable columns, no ROOT needed) or none (default: root if PyROOT is available, else npy)",
+	choices=sorted(LIB.Storage.Storages.keys()), default='root' if HAS_ROOT_LIB else 'npy')
 parser.add_argument("-l", "--log", help="file to write log to")
 parser.add_argument("-s", "--service", help="script run as service? disables all I/O from std(in|out).", action="store_true")
 parser.add_argument("-d", "--debug", help="just print the values", action="store_true")
@@ -175,8 +176,11 @@ else:
 if not args.debug:
 	handle = open(data_directory + filename, 'w')
 	logger.info("handle.open('"+data_directory+filename+"', 'w')")
+	handle.write("#MODU==MEASU:MEAS2:MEAN,MEASU:MEAS2:STDDEV\n")
 
-data = {key: [] for key in DATA_KEYS}
+# only the last row is kept in RAM, the rows are written by the storage
+data = LIB.Storage.last_values(DATA_KEYS)
+storage = LIB.Storage.open_storage(args.storage if not args.debug else 'none', data_directory + filename, "PI_Sweep", {'TIMESTAMP': time.strftime("%Y-%m-%d_%H%M")})
 
 SIGTERM, count = False, 0
 starttime = time.time()
@@ -241,6 +245,7 @@ for PI in PID_MAP_PI:
 		data['PID_OUTPu'].append(_PID_OUTP.std())
 		for key in OSC_MEASU.keys(): data[key].append(OSC_MEASU[key])
 		for key in TEM_MEASU.keys(): data[key].append(TEM_MEASU[key])
+		storage.append({key: data[key][-1] for key in DATA_KEYS})
 
 		for key in DATA_KEYS:
 			handle.write("{0}\n".format(data[key][-1]) if key==DATA_KEYS[-1] else "{0}\t".format(data[key][-1]))
@@ -265,7 +270,6 @@ if not args.debug:
 if not args.debug and args.compress:
 	LIB.Compression.gzip_file(data_directory + filename)
 	os.remove(data_directory + filename)
-if not args.debug and HAS_ROOT_LIB:
-	LIB.ROOT_IO.ROOT_IO.write_data(data_directory + filename, "PI_Sweep", data)
+storage.close()
 print "wrote data files to: " + data_directory + "\nwith filename-begin: " + filename
 print "### END OF PROGRAM REACHED ###"
@@ -8,6 +8,7 @@ import LIB.Exceptions
 import LIB.File
 import LIB.Compression
 from LIB.GPIOSensor import GPIOSensor, GPIOSensors
+import LIB.Storage
 try: import LIB.ROOT_IO
 except ImportError: HAS_ROOT_LIB = False
 
@@ -32,6 +33,8 @@ parser.add_argument("-s", "--service", help="script run as service? disables all
 parser.add_argument("-v", "--verbose", help="set if you want to save more data to file / output", action="store_true")
 parser.add_argument("--stepsleep", type=float, help="sleep how long (minimum/offset) between acquire-sets", default=1.0)
 parser.add_argument("--compress", help="compress data files after they have been written", action="store_true")
+parser.add_argument("--storage", help="binary storage besides the text file: root, npy (memory mappable columns, no ROOT needed) or none (default: root if PyROOT is available, else npy)",
+	choices=sorted(LIB.Storage.Storages.keys()), default='root' if HAS_ROOT_LIB else 'npy')
 parser.add_argument("--sensor")
 # parse
 args = parser.parse_args()
@@ -145,13 +148,12 @@ while not SIGTERM:
 	handle.write("#TIMESTAMP==" + strftime + '\n')
 	handle.write("#Keys==TIME\tTC\tTCu" + '\n')
 
+	storage = LIB.Storage.open_storage(args.storage, data_directory + filename, "Lab_ReadContinuous", {'TIMESTAMP': strftime})
+
 	"""
-	DATA STORAGE IN RAM
+	DATA STORAGE IN RAM: only the last row, the rows are written by the storage
 	"""
-	data = {
-		'TIME': [],
-		'TC': [], 'TCu': []
-	}
+	data = LIB.Storage.last_values(['TIME', 'TC', 'TCu'])
 
 	while not SIGTERM:
 		try:
@@ -162,6 +164,7 @@ while not SIGTERM:
 
 			data['TIME'].append(meas_time)
 			for key in data_Temp.keys(): data[key].append(data_Temp[key])
+			storage.append({key: data[key][-1] for key in data.keys()})
 
 			handle.write("{_t}".format(_t=meas_time))
 			handle.write("\t{TC}\t{TCu}".format(TC=data['TC'][-1], TCu=data['TCu'][-1]))
@@ -197,10 +200,8 @@ while not SIGTERM:
 		print "wrote data to '" + data_directory + filename + ".gz'"
 	else:
 		print "wrote data to '" + data_directory + filename + "'"
-	# If ROOT libraries have been loaded -> create a root file with tree
-	if HAS_ROOT_LIB:
-		LIB.ROOT_IO.ROOT_IO.write_data(data_directory + filename, "Lab_ReadContinuous", data)
-		print "created ROOT file from data ('" + data_directory + filename + ".root')"
+	# Binary storage of the data (e.g. the ROOT tree)
+	storage.close()
 #end while-not-SIGTERM
 #
 logger.info("#### END OF PROGRAM ####")
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+__author__ = 'Christian Velten'
+
+import LIB.SegmentedFFT
+import LIB.WaveformBIN
+import LIB.Windows
+
+import argparse
+import os
+import sys
+
+parser = argparse.ArgumentParser(description="Python script to compute the averaged spectrum of waveform records (RecWvfm_*.bin[.gz]) "
+	"with windowed, overlapping segments. Writes the .bin.out files of the C++ SegmentizedFFT.")
+parser.add_argument("files", nargs='+', help="records to process")
+parser.add_argument("--fr", type=float, help="frequency resolution in Hz (default: one segment of the whole record)")
+parser.add_argument("--fs", type=float, help="sampling frequency in Hz (default: 1/XINCR of the record)")
+parser.add_argument("-w", "--window", help="window function (default HAMMING)", choices=LIB.Windows.WINDOW_TYPES, type=str.upper, default='HAMMING')
+parser.add_argument("--overlap", type=float, help="overlap of the segments (default: ideal overlap of the window)")
+parser.add_argument("--double", help="write the output as f8 instead of f4", action="store_true")
+parser.add_argument("-v", "--verbose", action="store_true")
+args = parser.parse_args()
+
+dtype = '<f8' if args.double else LIB.SegmentedFFT.OUTPUT_DTYPE
+for filename in args.files:
+	if not os.path.isfile(filename):
+		print "File does not exist: '" + filename + "'"
+		sys.exit(1)
+	record = LIB.WaveformBIN.Waveform(filename)
+	if args.fs:
+		record.xincr = 1. / args.fs
+	fft = LIB.SegmentedFFT.process_waveform(record, args.fr, args.window, args.overlap, verbose=args.verbose)
+	record.close()
+	ofile = fft.write(LIB.SegmentedFFT.output_filename(filename[:-3] if filename.endswith('.gz') else filename), dtype)
+	print "wrote spectrum of {0} segments to '{1}'".format(fft.count, ofile)
@@ -2,69 +2,45 @@
 # -*- coding: utf-8 -*-
 __author__ = 'Christian Velten'
 
-import LIB.ROOT_IO
+HAS_ROOT_LIB = True
+
+import LIB.Storage
+try: import LIB.ROOT_IO
+except ImportError: HAS_ROOT_LIB = False
 
 import argparse
-import itertools
 import numpy as np
 import os
-import ROOT
 import sys
 
 
-def robust_reshape(arr, group):
-	output = np.zeros(len(arr)/group)
-	for i in range( int(len(arr)/group) ):
-		for j in range(group):
-			output[i] += arr[i*group+j] / float(group)
-	return output
-
-
-def allen_data(xin, yin):
-	group = np.arange(1, len(xin)/2, 1, dtype=int)
-	std = np.empty(len(group))
-	for i in range(len(group)):
-		std[i] = robust_reshape(yin, group[i]).std()
-	return group, std
-
-
 parser = argparse.ArgumentParser()
-parser.add_argument("ifile")
+parser.add_argument("ifile", help=".root file or .npy storage (no ROOT needed), the cut is written next to it with '-cut'")
 parser.add_argument("--sweep", action="store_true")
 parser.add_argument("--stability", action="store_true")
 args = parser.parse_args()
 if not (args.stability or args.sweep): args.sweep = True
 
-if not os.path.isfile(args.ifile):
+if not os.path.isfile(args.ifile) and not LIB.Storage.is_npy(args.ifile):
 	print "File does not exist!"
 	sys.exit(1)
 
 treename = "PI_Stability" if args.stability else "PI_Sweep"
-
-TFile, T = LIB.ROOT_IO.ROOT_IO.get_tree(args.ifile, treename)
-keys = []
-for branch in T.GetListOfBranches():
-	keys.append(str(branch.GetName()))
-leaves = {key: np.zeros(1) for key in keys}
-for key in keys:
-	T.SetBranchAddress(key, leaves[key])
-n = T.GetEntries()
-data = {key: np.empty(n) for key in keys}
-for i in range(n):
-	T.GetEntry(i)
-	for key in keys:
-		data[key][i] = leaves[key]
-
-
-constraint = -1
-for i in range(n):
-	if data['TIME'][i] > 2200.0 * 60.:
-		constraint = i
-		break
-print constraint, data['TIME'][constraint]
-
-for key in keys:
-	data[key] = np.array(data[key][:constraint])
-
-LIB.ROOT_IO.ROOT_IO.write_data(args.ifile+'-cut', treename, data)
+time_window = (None, 2200.0 * 60.)
+
+if LIB.Storage.is_npy(args.ifile):
+	metadata, data = LIB.Storage.read_npy(args.ifile, time_window=time_window)
+	print len(data['TIME']), data['TIME'][-1]
+	base = os.path.normpath(args.ifile)
+	base = base[:-len(LIB.Storage.NPY_SUFFIX)] if base.endswith(LIB.Storage.NPY_SUFFIX) else base
+	LIB.Storage.write_npy(base+'-cut', metadata['NAME'], data, metadata['METADATA'])
+elif HAS_ROOT_LIB:
+	TFile, T = LIB.ROOT_IO.ROOT_IO.get_tree(args.ifile, treename)
+	data = LIB.ROOT_IO.read_tree(T, time_window=time_window)
+	print len(data['TIME']), data['TIME'][-1]
+
+	LIB.ROOT_IO.ROOT_IO.write_data(args.ifile+'-cut', treename, data)
+else:
+	print "Couldn't find ROOT framework, only .npy storages can be cut!"
+	sys.exit(1)
 